@@ -0,0 +1,26 @@
+import sys
+import os
+import time
+
+from src.database import WeatherRepository
+
+def backfill(db_path, location=None):
+    """Rebuild hourly/daily rollups from existing weather readings"""
+    repo = WeatherRepository(db_path)
+
+    target = location or "all locations"
+    print(f"Backfilling rollups for {target} in {db_path}...")
+
+    started = time.perf_counter()
+    count = repo.backfill_rollups(location)
+    elapsed = time.perf_counter() - started
+
+    print(f"Summarised {count} readings in {elapsed:.1f}s")
+    repo.close()
+
+if __name__ == "__main__":
+    # Use same database path as API by default
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(root_dir, "weather.db")
+    location = sys.argv[2] if len(sys.argv) > 2 else None
+    backfill(db_path, location)
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+
+from src.data_model import WeatherData
+from src.database import WeatherRepository
+from src.generator import WeatherGenerator
+
+ROWS = 10000
+ROUNDS = 5
+
+
+def best_of(func):
+    """Best wall time of several rounds, in seconds"""
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def legacy_fetch(db_path):
+    """Previous read path: sqlite3.Row -> dict(row) -> from_dict"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("""
+        SELECT w.timestamp, l.name AS location, w.temperature, w.humidity,
+               w.condition, w.wind_speed
+        FROM weather w JOIN locations l ON l.id = w.location_id
+        WHERE l.name = 'London'
+        ORDER BY w.ts DESC LIMIT ?
+    """, (ROWS,)).fetchall()
+    conn.close()
+    return [WeatherData.from_dict(dict(row)) for row in rows]
+
+
+def legacy_to_dict(weather):
+    """Previous to_dict: dataclasses.asdict plus ISO timestamp"""
+    data = asdict(weather)
+    data['timestamp'] = weather.timestamp.isoformat()
+    return data
+
+
+def run_benchmark(db_path):
+    """Compare per-row cost of loading and serialising get_historical(limit=10000)"""
+    # Query cache off, or repeated calls would time dict lookups
+    repo = WeatherRepository(db_path, cache_max_bytes=0)
+    repo.save_many(WeatherGenerator.generate_batch("London", ROWS))
+
+    weather_list = repo.get_historical("London", limit=ROWS)
+    assert weather_list == legacy_fetch(db_path)
+    assert [w.to_dict() for w in weather_list] == [legacy_to_dict(w) for w in weather_list]
+
+    results = [
+        ("fetch: Row -> dict -> from_dict", best_of(lambda: legacy_fetch(db_path))),
+        ("fetch: get_historical (from_row)", best_of(lambda: repo.get_historical("London", limit=ROWS))),
+        ("to_dict: asdict", best_of(lambda: [legacy_to_dict(w) for w in weather_list])),
+        ("to_dict: hand-written", best_of(lambda: [w.to_dict() for w in weather_list])),
+    ]
+
+    print(f"Per-row cost for {ROWS} rows (best of {ROUNDS}):")
+    for name, seconds in results:
+        print(f"  {name:<36} {seconds / ROWS * 1e6:6.2f} us/row")
+    print(f"Memory per WeatherData: {sys.getsizeof(weather_list[0])} bytes (slotted, no __dict__)")
+    repo.close()
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_benchmark(os.path.join(tmp_dir, "bench.db"))
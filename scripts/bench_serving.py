@@ -0,0 +1,135 @@
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import threading
+import time
+
+import requests
+
+# Server commands compared by default; {port} is filled in
+SERVERS = {
+    "gunicorn": "gunicorn -w 4 -b 127.0.0.1:{port} src.api:app",
+    "uvicorn": "uvicorn src.asgi:app --workers 4 --port {port} --log-level warning",
+}
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_up(base_url, timeout=30.0):
+    """Poll /health until the server answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start")
+
+
+def hold_streams(base_url, count, stop):
+    """Open idle SSE connections and keep them open until stop is set"""
+    responses = []
+    for _ in range(count):
+        try:
+            response = requests.get(f"{base_url}/weather/stream/London", stream=True, timeout=5)
+            responses.append(response)
+        except requests.RequestException:
+            # Server has no free worker left to accept the stream
+            break
+    stop.wait()
+    for response in responses:
+        response.close()
+    return len(responses)
+
+
+def client(base_url, path, deadline, latencies, errors):
+    """Issue requests back to back until the deadline"""
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            ok = session.get(base_url + path, timeout=5).status_code == 200
+        except requests.RequestException:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+def run_case(base_url, path, concurrency, duration, streams):
+    """Measure throughput of one endpoint while some streams stay open"""
+    stop = threading.Event()
+    opened = []
+    holder = threading.Thread(
+        target=lambda: opened.append(hold_streams(base_url, streams, stop)), daemon=True
+    )
+    holder.start()
+    # Give the streams time to occupy their workers
+    time.sleep(1.0 if streams else 0)
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(base_url, path, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    holder.join()
+
+    latencies.sort()
+    return {
+        "streams": opened[0] if opened else 0,
+        "requests_per_sec": len(latencies) / duration,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        "errors": len(errors),
+    }
+
+
+def bench_server(name, command, port, args):
+    """Start one server, seed it and run every case against it"""
+    base_url = f"http://127.0.0.1:{port}"
+    # Servers use the API's default weather.db, like scripts/schedule.py
+    process = subprocess.Popen(
+        shlex.split(command.format(port=port)), cwd=root_dir,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_up(base_url)
+        requests.post(f"{base_url}/weather/seed/London/1000", timeout=30)
+        for streams in args.streams:
+            result = run_case(base_url, args.path, args.concurrency, args.duration, streams)
+            p50 = f"{result['p50_ms']:.1f}" if result["p50_ms"] is not None else "-"
+            p99 = f"{result['p99_ms']:.1f}" if result["p99_ms"] is not None else "-"
+            print(f"{name:<10} streams={result['streams']}/{streams:<3} "
+                  f"{result['requests_per_sec']:8.0f} req/s  p50 {p50:>7} ms  "
+                  f"p99 {p99:>7} ms  errors {result['errors']}", flush=True)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare request throughput of the WSGI and ASGI serving modes"
+    )
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument("--path", default="/weather/current/London", help="Endpoint to load")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per case")
+    parser.add_argument("--streams", type=int, nargs="+", default=[0, 4, 64],
+                        help="Idle SSE connections held open during each case")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for name in args.servers:
+        bench_server(name, SERVERS[name], args.port, args)
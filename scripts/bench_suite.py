@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from src.database import WeatherRepository
+from src.generator import WeatherGenerator
+
+# Named dataset sizes accepted by --sizes
+SIZES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+# Spacing of generated readings within each location, and the newest one
+READING_INTERVAL = timedelta(minutes=1)
+DATASET_END = datetime(2024, 1, 1)
+
+# Write benchmarks only touch this location, so the data read by the
+# other cases stays the same however often the suite runs
+WRITE_LOCATION = "Bench"
+
+# Rows generated per bulk_load batch while building a dataset
+BUILD_BATCH_SIZE = 500_000
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_baseline = os.path.join(root_dir, "scripts", "bench_baseline.json")
+
+
+def build_database(db_path, rows):
+    """Bulk-load rows readings spread evenly over the built-in locations"""
+    locations = WeatherGenerator.LOCATIONS
+    per_location = rows // len(locations)
+
+    def batches():
+        for seed, location in enumerate(locations):
+            for first in range(0, per_location, BUILD_BATCH_SIZE):
+                count = min(BUILD_BATCH_SIZE, per_location - first)
+                yield WeatherGenerator.generate_columns(
+                    count, [location], seed=seed * 1000 + first,
+                    end=DATASET_END - READING_INTERVAL * first, interval=READING_INTERVAL
+                )
+
+    started = time.perf_counter()
+    repo = WeatherRepository(db_path)
+    loaded = repo.bulk_load(batches())
+    repo.close()
+    print(f"  built {loaded:,} rows in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+def open_dataset(data_dir, name):
+    """Reuse a dataset from an earlier run, building it if missing"""
+    db_path = os.path.join(data_dir, f"bench-{name}.db")
+    rows = SIZES[name]
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        existing = conn.execute("SELECT COALESCE(SUM(reading_count), 0) FROM locations").fetchone()[0]
+        conn.close()
+        # Earlier runs add a few rows through the write benchmarks
+        if existing >= rows - rows % len(WeatherGenerator.LOCATIONS):
+            return db_path
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    print(f"Building {name} dataset in {db_path}", flush=True)
+    build_database(db_path, rows)
+    return db_path
+
+
+def measure(func, min_time, min_rounds=5, max_rounds=10000):
+    """Time func repeatedly; returns summary statistics in microseconds"""
+    func()  # Warm up caches and lazy connections
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_rounds or (
+            time.perf_counter() < deadline and len(timings) < max_rounds):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "median_us": round(statistics.median(timings), 2),
+        "p95_us": round(timings[int(len(timings) * 0.95)], 2),
+        "min_us": round(timings[0], 2),
+        "rounds": len(timings),
+    }
+
+
+def first_reading(rows):
+    """Timestamp of the oldest reading of each location in a dataset"""
+    per_location = rows // len(WeatherGenerator.LOCATIONS)
+    return DATASET_END - READING_INTERVAL * (per_location - 1)
+
+
+def repository_cases(repo, rows):
+    """Repository and generator operations to time, by name"""
+    oldest = first_reading(rows)
+    live = WeatherGenerator.generate(WRITE_LOCATION)
+    batch = WeatherGenerator.generate_batch(WRITE_LOCATION, 1000)
+
+    return {
+        "generator.generate_batch(1000)": lambda: WeatherGenerator.generate_batch("London", 1000),
+        "repo.get_latest": lambda: repo.get_latest("London"),
+        "repo.get_latest_many(all)": lambda: repo.get_latest_many(),
+        "repo.get_historical(limit=10)": lambda: repo.get_historical(
+            "London", end=DATASET_END, limit=10
+        ),
+        "repo.get_historical(limit=1000)": lambda: repo.get_historical(
+            "London", end=DATASET_END, limit=1000
+        ),
+        "repo.get_historical(last day, limit=1000)": lambda: repo.get_historical(
+            "London", start=DATASET_END - timedelta(days=1), end=DATASET_END, limit=1000
+        ),
+        # The oldest hour: a seek deep into the history
+        "repo.get_historical(first hour, limit=100)": lambda: repo.get_historical(
+            "London", start=oldest, end=oldest + timedelta(hours=1), limit=100
+        ),
+        "repo.get_all_locations": lambda: repo.get_all_locations(),
+        "repo.get_location_stats": lambda: repo.get_location_stats(),
+        "repo.get_aggregates(day)": lambda: repo.get_aggregates("London", "day"),
+        # Writes last, so they never change what the reads above see
+        "repo.save": lambda: repo.save(live),
+        "repo.save_many(1000)": lambda: repo.save_many(batch),
+    }
+
+
+def api_cases(client):
+    """Flask routes to time through the test client, by name"""
+    # Reads stop at DATASET_END, ignoring rows added by the write cases
+    end = DATASET_END.isoformat()
+    day_ago = (DATASET_END - timedelta(days=1)).isoformat()
+    everywhere = ",".join(WeatherGenerator.LOCATIONS)
+    ndjson = "".join(
+        json.dumps(w.to_dict()) + "\n" for w in WeatherGenerator.generate_batch(WRITE_LOCATION, 100)
+    )
+
+    def get(path):
+        def call():
+            response = client.get(path)
+            response.get_data()  # Drain streamed bodies
+            assert response.status_code == 200, (path, response.status_code)
+        return call
+
+    def post(path, data=None, status=201):
+        def call():
+            response = client.post(path, data=data)
+            assert response.status_code in (200, status), (path, response.status_code)
+        return call
+
+    return {
+        "GET /weather/current/<location>": get("/weather/current/London"),
+        "GET /weather/current?locations=(12)": get(f"/weather/current?locations={everywhere}"),
+        "GET /weather/historical/<location>?limit=100": get(
+            f"/weather/historical/London?end={end}&limit=100"
+        ),
+        "GET /weather/historical/<location>?limit=1000": get(
+            f"/weather/historical/London?end={end}&limit=1000"
+        ),
+        "GET /weather/historical/<location>?start=(1 day)": get(
+            f"/weather/historical/London?start={day_ago}&end={end}&limit=1000"
+        ),
+        "GET /weather/export/<location>?format=csv&start=(1 day)": get(
+            f"/weather/export/London?format=csv&start={day_ago}&end={end}"
+        ),
+        "GET /weather/aggregate/<location>?granularity=day": get(
+            "/weather/aggregate/London?granularity=day"
+        ),
+        "GET /weather/locations": get("/weather/locations"),
+        "GET /weather/locations?details=true": get("/weather/locations?details=true"),
+        "GET /health": get("/health"),
+        # Writes last; /weather/random stores readings at random built-in
+        # locations, but only with current timestamps, after DATASET_END
+        "GET /weather/live/<location>": get(f"/weather/live/{WRITE_LOCATION}"),
+        "GET /weather/random": get("/weather/random"),
+        "POST /weather/seed/<location>/100": post(f"/weather/seed/{WRITE_LOCATION}/100"),
+        "POST /weather/ingest (100 ndjson)": post("/weather/ingest?format=ndjson", ndjson, 200),
+    }
+
+
+def use_repository(api, repo):
+    """Point the Flask app's module-level dependencies at repo"""
+    repo.query_observer = api.repository.query_observer
+    api.repository = repo
+    api.broker.repository = repo
+    api.jobs.repository = repo
+
+
+def run_size(name, data_dir, args, api):
+    """Time every case against one dataset size"""
+    db_path = open_dataset(data_dir, name)
+    results = {}
+
+    # Query cache off, so reads measure SQLite and decoding, not dict lookups
+    repo = WeatherRepository(db_path, cache_max_bytes=0)
+    if not args.skip_repository:
+        for case, func in repository_cases(repo, SIZES[name]).items():
+            results[case] = measure(func, args.min_time)
+            print(f"  {name:>4} {case:<56} {results[case]['median_us']:>10.1f} us", flush=True)
+
+    if not args.skip_api:
+        use_repository(api, repo)
+        client = api.app.test_client()
+        for case, func in api_cases(client).items():
+            results[case] = measure(func, args.min_time)
+            print(f"  {name:>4} {case:<56} {results[case]['median_us']:>10.1f} us", flush=True)
+
+    repo.close()
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_us):
+    """List cases whose median got slower than the baseline allows"""
+    regressions = []
+    for size, cases in results.items():
+        for case, stats in cases.items():
+            old = baseline.get(size, {}).get(case)
+            if old is None:
+                continue
+            new_us, old_us = stats["median_us"], old["median_us"]
+            if new_us > old_us * (1 + tolerance) and new_us - old_us > min_delta_us:
+                regressions.append((size, case, old_us, new_us))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time repository calls and API routes at realistic database sizes"
+    )
+    parser.add_argument("--sizes", nargs="+", default=["10k"], choices=list(SIZES),
+                        help="Datasets to run against (built on first use)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "weather-bench"),
+                        help="Where datasets are built and kept between runs")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds spent timing each case")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", default=default_baseline,
+                        help="Results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Merge these results into the baseline file instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="Allowed slowdown of a median, as a fraction")
+    parser.add_argument("--min-delta-us", type=float, default=10.0,
+                        help="Slowdowns smaller than this many microseconds are ignored")
+    parser.add_argument("--skip-repository", action="store_true")
+    parser.add_argument("--skip-api", action="store_true")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    # Keep the API's own database, metrics and profiles out of the repo
+    os.environ.setdefault("WEATHER_DB_PATH", os.path.join(args.data_dir, "api.db"))
+    from src import api
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "min_time": args.min_time,
+        },
+        "results": {},
+    }
+    for name in args.sizes:
+        report["results"][name] = run_size(name, args.data_dir, args, api)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {"meta": report["meta"], "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline["results"] = json.load(f)["results"]
+        baseline["results"].update(report["results"])
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(report["results"], baseline, args.tolerance, args.min_delta_us)
+        if regressions:
+            print(f"\nREGRESSIONS against {args.baseline}:")
+            for size, case, old_us, new_us in regressions:
+                print(f"  {size:>4} {case:<56} {old_us:>10.1f} -> {new_us:>10.1f} us "
+                      f"({new_us / old_us:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
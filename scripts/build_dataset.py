@@ -0,0 +1,103 @@
+import argparse
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+from src.database import WeatherRepository
+from src.generator import WeatherGenerator
+
+# Use same database path as API by default
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_db_path = os.path.join(root_dir, "weather.db")
+
+
+def location_names(count):
+    """Built-in locations first, then numbered stations"""
+    names = list(WeatherGenerator.LOCATIONS[:count])
+    names += [f"Station {i}" for i in range(len(names) + 1, count + 1)]
+    return names
+
+
+def plan_tasks(locations, start, per_location, interval, batch_size, seed):
+    """Split every location's history into generation tasks"""
+    tasks = []
+    for location in locations:
+        for first in range(0, per_location, batch_size):
+            count = min(batch_size, per_location - first)
+            # Timestamp of the last reading in this task
+            end = start + interval * (first + count - 1)
+            tasks.append((location, count, end, interval, seed + len(tasks)))
+    return tasks
+
+
+def generate_task(task):
+    """Worker process: generate one batch of backdated readings"""
+    location, count, end, interval, seed = task
+    return WeatherGenerator.generate_columns(
+        count, [location], seed=seed, end=end, interval=interval
+    )
+
+
+def generate_batches(pool, tasks, max_pending):
+    """Yield batches in task order, keeping a bounded number in flight"""
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(generate_task, (task,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def build_dataset(db_path, years, location_count, interval_seconds,
+                  workers, batch_size, seed):
+    """Generate and bulk-load a synthetic weather history"""
+    interval = timedelta(seconds=interval_seconds)
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=365.25 * years)
+    per_location = int((end - start) / interval) + 1
+
+    locations = location_names(location_count)
+    tasks = plan_tasks(locations, start, per_location, interval, batch_size, seed)
+    total = per_location * len(locations)
+
+    print(f"Building {total:,} readings ({len(locations)} locations x "
+          f"{per_location:,} readings every {interval_seconds}s) in {db_path}")
+    print(f"{len(tasks)} batches of up to {batch_size:,} rows on {workers} workers")
+
+    repo = WeatherRepository(db_path)
+    started = time.perf_counter()
+
+    def report(loaded):
+        elapsed = time.perf_counter() - started
+        print(f"  {loaded:,}/{total:,} rows  {loaded / elapsed:,.0f} rows/sec", flush=True)
+
+    with Pool(workers) as pool:
+        batches = generate_batches(pool, tasks, max_pending=workers * 2)
+        loaded = repo.bulk_load(batches, on_batch=report)
+
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {loaded:,} rows in {elapsed:.1f}s ({loaded / elapsed:,.0f} rows/sec, "
+          f"including index rebuild)")
+    repo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a large synthetic weather database")
+    parser.add_argument("--db", default=default_db_path, help="SQLite database path")
+    parser.add_argument("--years", type=float, default=1.0, help="Years of history per location")
+    parser.add_argument("--locations", type=int, default=12, help="Number of locations")
+    parser.add_argument("--interval", type=int, default=600, help="Seconds between readings")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Generator processes")
+    parser.add_argument("--batch-size", type=int, default=500000, help="Rows per batch")
+    parser.add_argument("--seed", type=int, default=0, help="Base random seed")
+    args = parser.parse_args()
+
+    if args.years <= 0 or args.locations < 1 or args.interval < 1 or args.batch_size < 1:
+        parser.error("--years, --locations, --interval and --batch-size must be positive")
+
+    build_dataset(args.db, args.years, args.locations, args.interval,
+                  args.workers, args.batch_size, args.seed)
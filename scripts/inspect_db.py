@@ -8,8 +8,9 @@ def inspect_database(db_path='weather.db'):
         cursor = conn.cursor()
         
         # Get table info
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [t[0] for t in cursor.fetchall()]
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table'")
+        table_sql = dict(cursor.fetchall())
+        tables = list(table_sql)
         print(f"Tables: {tables}")
         
         for table in tables:
@@ -28,7 +29,14 @@ def inspect_database(db_path='weather.db'):
             print(f"\nTotal records: {count}")
             
             # Show sample data
-            cursor.execute(f"SELECT * FROM {table} ORDER BY timestamp DESC LIMIT 5")
+            # Not every table has a timestamp column; order by rowid, or by
+            # the primary key for WITHOUT ROWID tables (the rollups)
+            if "WITHOUT ROWID" in (table_sql[table] or "").upper():
+                key = [col for col in columns if col[5]]
+                order = ", ".join(f"{col[1]} DESC" for col in sorted(key, key=lambda col: col[5]))
+            else:
+                order = "rowid DESC"
+            cursor.execute(f"SELECT * FROM {table} ORDER BY {order} LIMIT 5")
             rows = cursor.fetchall()
             print("\nLatest 5 records:")
             for row in rows:
@@ -0,0 +1,258 @@
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+# Endpoint name -> (method, path template); {location} is filled in per request
+ENDPOINTS = {
+    "live": ("GET", "/weather/live/{location}"),
+    "current": ("GET", "/weather/current/{location}"),
+    "historical": ("GET", "/weather/historical/{location}?limit=100"),
+    "locations": ("GET", "/weather/locations"),
+    "seed": ("POST", "/weather/seed/{location}/10"),
+}
+
+# Relative request weights: mostly reads, with some writes
+DEFAULT_MIX = "live=2,current=10,historical=5,locations=2,seed=1"
+
+DEFAULT_LOCATIONS = ["London", "Paris", "Tokyo", "New York", "Sydney"]
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(text):
+    """Parse name=weight,... into a dict, rejecting unknown endpoints"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(
+                f"unknown endpoint {name!r} (choose from {', '.join(ENDPOINTS)})"
+            )
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("at least one endpoint needs a positive weight")
+    return mix
+
+
+class Recorder:
+    """Thread-safe collection of per-endpoint samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # Includes queueing in open-loop mode
+        self.service_times = defaultdict(list)  # Send to response only
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, latency, service_time, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.service_times[endpoint].append(service_time)
+            self.statuses[endpoint][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[endpoint] += 1
+
+
+def send(session, base_url, endpoint, location, timeout):
+    """Issue one request; returns its status code or the error's class name"""
+    method, path = ENDPOINTS[endpoint]
+    try:
+        url = base_url + path.format(location=location)
+        response = session.request(method, url, timeout=timeout)
+        response.content  # Read the whole body, as a real client would
+        return response.status_code
+    except requests.RequestException as e:
+        return type(e).__name__
+
+
+def closed_loop(args, mix, recorder):
+    """Each thread sends its next request as soon as the previous one finishes"""
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            location = rng.choice(args.locations)
+            status = send(session, args.base_url, endpoint, location, args.timeout)
+            elapsed = time.perf_counter() - started
+            recorder.record(endpoint, elapsed, elapsed, status)
+
+    threads = [
+        threading.Thread(target=worker, args=(args.seed + i,), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return args.duration
+
+
+def open_loop(args, mix, recorder):
+    """
+    Send requests on a fixed schedule, whether or not earlier ones finished.
+
+    Latency is measured from when each request was due, not from when a
+    free thread got around to sending it, so a stalled server shows up as
+    high latency for every request that had to wait (no coordinated
+    omission).
+    """
+    rng = random.Random(args.seed)
+    names, weights = list(mix), list(mix.values())
+    due = queue.Queue()
+    stop = object()
+
+    def worker():
+        session = requests.Session()
+        while True:
+            item = due.get()
+            if item is stop:
+                return
+            scheduled, endpoint, location = item
+            started = time.perf_counter()
+            status = send(session, args.base_url, endpoint, location, args.timeout)
+            finished = time.perf_counter()
+            recorder.record(endpoint, finished - scheduled, finished - started, status)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    total = int(args.rate * args.duration)
+    for i in range(total):
+        scheduled = start + i / args.rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        due.put((scheduled, rng.choices(names, weights)[0], rng.choice(args.locations)))
+
+    for _ in threads:
+        due.put(stop)
+    for thread in threads:
+        thread.join()
+    # Requests still queued at the end keep the run going; count that time
+    return max(time.perf_counter() - start, args.duration)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    index = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize(recorder, elapsed):
+    """Per-endpoint and overall throughput, error rate and latency percentiles"""
+    summary = {}
+    endpoints = [name for name in ENDPOINTS if name in recorder.latencies]
+    for endpoint in endpoints + ["total"]:
+        if endpoint == "total":
+            latencies = sorted(v for values in recorder.latencies.values() for v in values)
+            service = sorted(v for values in recorder.service_times.values() for v in values)
+            errors = sum(recorder.errors.values())
+            statuses = sum(recorder.statuses.values(), Counter())
+        else:
+            latencies = sorted(recorder.latencies[endpoint])
+            service = sorted(recorder.service_times[endpoint])
+            errors = recorder.errors[endpoint]
+            statuses = recorder.statuses[endpoint]
+
+        count = len(latencies)
+        stats = {
+            "requests": count,
+            "requests_per_sec": round(count / elapsed, 1),
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0.0,
+            "statuses": {str(status): n for status, n in statuses.items()},
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+        }
+        for pct in PERCENTILES:
+            value = percentile(latencies, pct)
+            stats[f"p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+            value = percentile(service, pct)
+            stats[f"service_p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+        summary[endpoint] = stats
+    return summary
+
+
+def print_summary(summary, open_loop_mode):
+    """Print a table of the summary"""
+    header = f"{'endpoint':<12}{'reqs':>8}{'req/s':>9}{'err %':>8}"
+    header += "".join(f"{f'p{pct} ms':>10}" for pct in PERCENTILES) + f"{'max ms':>10}"
+    if open_loop_mode:
+        header += f"{'svc p99':>10}"
+    print(header)
+
+    def cell(value):
+        return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+    for endpoint, stats in summary.items():
+        line = (f"{endpoint:<12}{stats['requests']:>8}{stats['requests_per_sec']:>9.1f}"
+                f"{stats['error_rate'] * 100:>8.2f}")
+        line += "".join(cell(stats[f"p{pct}_ms"]) for pct in PERCENTILES) + cell(stats["max_ms"])
+        if open_loop_mode:
+            line += cell(stats["service_p99_ms"])
+        print(line)
+
+    failures = {
+        status: n for status, n in summary["total"]["statuses"].items()
+        if not status.isdigit() or int(status) >= 400
+    }
+    if failures:
+        print(f"Failures: {failures}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay a mix of API requests against a running server and report latency"
+    )
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--rate", type=float,
+                        help="Open loop: requests per second, sent on schedule "
+                             "(default: closed loop at --concurrency)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Client threads; in open-loop mode, the most requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
+    parser.add_argument("--locations", nargs="+", default=DEFAULT_LOCATIONS)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the request sequence")
+    parser.add_argument("--output", help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.concurrency < 1 or args.duration <= 0 or (args.rate is not None and args.rate <= 0):
+        parser.error("--concurrency, --duration and --rate must be positive")
+
+    # Fail fast instead of reporting a run of connection errors
+    requests.get(f"{args.base_url}/health", timeout=args.timeout).raise_for_status()
+
+    recorder = Recorder()
+    mode = f"open loop at {args.rate:g} req/s" if args.rate else "closed loop"
+    print(f"Load testing {args.base_url} for {args.duration:g}s, {mode}, "
+          f"{args.concurrency} threads", flush=True)
+    if args.rate:
+        elapsed = open_loop(args, args.mix, recorder)
+    else:
+        elapsed = closed_loop(args, args.mix, recorder)
+
+    summary = summarize(recorder, elapsed)
+    print_summary(summary, bool(args.rate))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mode": "open" if args.rate else "closed", "rate": args.rate,
+                       "concurrency": args.concurrency, "duration": elapsed,
+                       "endpoints": summary}, f, indent=2)
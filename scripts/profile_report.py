@@ -0,0 +1,31 @@
+import argparse
+import os
+
+from src.profiling import load_profiles
+
+# Same default directory as the API (WEATHER_PROFILE_DIR overrides it)
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_dir = os.environ.get('WEATHER_PROFILE_DIR', os.path.join(root_dir, "weather.db-profiles"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize request profiles stored by the API"
+    )
+    parser.add_argument("route", nargs="?",
+                        help="Route directory, e.g. GET_weather_historical_location (default: all)")
+    parser.add_argument("--dir", default=default_dir, help="Profile directory")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key")
+    parser.add_argument("--limit", type=int, default=25, help="Functions to print")
+    parser.add_argument("--output", help="Also write the merged profile here (for snakeviz/flameprof)")
+    args = parser.parse_args()
+
+    if args.route is None and os.path.isdir(args.dir):
+        print("Routes:", ", ".join(sorted(os.listdir(args.dir))))
+
+    stats = load_profiles(args.dir, args.route)
+    if stats is None:
+        raise SystemExit(f"No profiles found in {args.dir}")
+    if args.output:
+        stats.dump_stats(args.output)
+    stats.strip_dirs().sort_stats(args.sort).print_stats(args.limit)
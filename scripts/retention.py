@@ -0,0 +1,43 @@
+import argparse
+import json
+import os
+
+from src.database import WeatherRepository
+from src.retention import RetentionManager, parse_policies
+
+# Use same database path as API by default
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+default_db_path = os.path.join(root_dir, "weather.db")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Apply retention policies once and compact the database"
+    )
+    parser.add_argument("policies", nargs="?",
+                        default=os.environ.get("WEATHER_RETENTION", ""),
+                        help='Policy spec, e.g. "*=30d,London=365d,Paris=100000rows" '
+                             "(default: WEATHER_RETENTION)")
+    parser.add_argument("--db", default=default_db_path, help="SQLite database path")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="First convert an existing file to auto_vacuum=INCREMENTAL "
+                             "(rewrites the file; stop the API first)")
+    args = parser.parse_args()
+
+    repo = WeatherRepository(args.db)
+    if args.enable_incremental_vacuum:
+        converted = repo.enable_incremental_vacuum()
+        print("Converted to incremental auto_vacuum" if converted
+              else "Already using incremental auto_vacuum")
+
+    if args.policies:
+        try:
+            policies = parse_policies(args.policies)
+        except ValueError as e:
+            parser.error(str(e))
+        manager = RetentionManager(repo, policies)
+        manager.run_once()
+        print(json.dumps(manager.stats(), indent=2))
+    elif not args.enable_incremental_vacuum:
+        parser.error("no retention policy given")
+    repo.close()
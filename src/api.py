@@ -3,11 +3,30 @@ Weather API - REST endpoints for weather data access.
 
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from datetime import datetime
+from functools import wraps
+from itertools import islice
+from urllib.parse import quote
+from werkzeug.http import is_resource_modified
+import atexit
+import csv
+import io
 import os
+import re
+import time
+import unicodedata
 from .generator import WeatherGenerator
-from .database import WeatherRepository
+from .database import (
+    DEFAULT_CACHE_MAX_BYTES, DEFAULT_CACHE_TTL, InvalidCursorError, WeatherRepository
+)
+from .events import ReadingBroker
+from .jobs import JobManager
+from .metrics import CONTENT_TYPE, MetricsRegistry
+from .profiling import RequestProfiler
+from .retention import create_retention_from_env
+from .ingest import INGEST_BATCH_SIZE, INGEST_PARSERS, create_buffer_from_env, ingest_records
+from .serializers import get_serializer
 
 # Initialize Flask application
 
@@ -15,10 +34,222 @@ app = Flask(__name__)
 
 # Initialize dependencies with shared database path
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-db_path = os.path.join(root_dir, "weather.db")
+db_path = os.environ.get('WEATHER_DB_PATH', os.path.join(root_dir, "weather.db"))
 
 generator = WeatherGenerator()
-repository = WeatherRepository(db_path)
+# Query result cache budget and lifetime (WEATHER_CACHE_MAX_BYTES=0 disables it).
+# WEATHER_SLOW_QUERY_MS logs slower repository calls with their query plans
+slow_query_ms = os.environ.get('WEATHER_SLOW_QUERY_MS')
+repository = WeatherRepository(
+    db_path,
+    cache_max_bytes=int(os.environ.get('WEATHER_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)),
+    cache_ttl=float(os.environ.get('WEATHER_CACHE_TTL', DEFAULT_CACHE_TTL)),
+    slow_query_ms=float(slow_query_ms) if slow_query_ms else None
+)
+
+# JSON encoder for all weather responses (orjson when installed)
+serializer = get_serializer()
+
+
+def json_response(payload) -> Response:
+    """Encode a response payload with the configured serializer.
+
+    Payloads may hold WeatherData/WeatherAggregate objects directly;
+    they are encoded without building intermediate dicts where the
+    serializer supports it.
+    """
+    return Response(serializer.dumps(payload), mimetype='application/json')
+
+
+# Most location names accepted by one /weather/current?locations= request
+MAX_CURRENT_LOCATIONS = 500
+
+# Largest batch_size accepted by /weather/ingest
+MAX_INGEST_BATCH_SIZE = 50000
+
+# Bytes read from the request body at a time by /weather/ingest
+INGEST_READ_SIZE = 256 * 1024
+
+# Readings per chunk written to streaming export responses
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FIELDS = ['timestamp', 'location', 'temperature', 'humidity', 'condition', 'wind_speed']
+
+# Optional write-behind buffer (enabled with WEATHER_WRITE_BEHIND=1)
+write_buffer = create_buffer_from_env(repository)
+
+# Live fan-out of new readings to /weather/stream clients.
+# The poll interval bounds how late other workers' writes show up
+broker = ReadingBroker(
+    repository,
+    poll_interval=float(os.environ.get('WEATHER_STREAM_POLL_INTERVAL', 1.0))
+)
+
+# Background runner for large seeds; state is shared by all workers
+# through the database
+jobs = JobManager(repository, workers=int(os.environ.get('WEATHER_JOB_WORKERS', 2)))
+# Cancel running jobs instead of dying mid-chunk on shutdown
+atexit.register(jobs.close)
+
+# Optional retention policies (e.g. WEATHER_RETENTION="*=30d,London=365d"),
+# enforced with small chunked deletes from a background thread. Started
+# on each worker's first request (see start_retention), not here: under
+# gunicorn --preload this module is imported by the master only
+retention = create_retention_from_env(repository)
+if retention is not None:
+    atexit.register(retention.close)
+
+# Prometheus metrics; every worker writes a snapshot to this shared
+# directory so any of them can answer a scrape with the totals
+metrics = MetricsRegistry(os.environ.get('WEATHER_METRICS_DIR', db_path + '-metrics'))
+
+
+def observe_query(method: str, seconds: float, rows: int) -> None:
+    """Record one repository call (installed as its query_observer)."""
+    labels = (('method', method),)
+    metrics.observe('weather_db_query_duration_seconds', labels, seconds)
+    metrics.inc('weather_db_query_rows_total', labels, rows)
+
+
+repository.query_observer = observe_query
+
+
+def _route_labels():
+    """Metric labels for the current request: route pattern and method."""
+    # The rule, not the path, so /weather/current/<location> is one series
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    return (('method', request.method), ('route', route))
+
+
+@app.before_request
+def start_retention():
+    if retention is not None:
+        retention.start()
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.metrics_labels = _route_labels()
+    metrics.add('weather_http_requests_in_progress', g.metrics_labels, 1)
+
+
+@app.after_request
+def record_request_metrics(response):
+    labels = g.metrics_labels
+    metrics.observe(
+        'weather_http_request_duration_seconds', labels,
+        time.perf_counter() - g.metrics_started
+    )
+    metrics.inc('weather_http_requests_total', labels + (('status', str(response.status_code)),))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    labels = g.pop('metrics_labels', None)
+    if labels is not None:
+        metrics.add('weather_http_requests_in_progress', labels, -1)
+
+
+# Opt-in cProfile of single requests: those sending WEATHER_PROFILE_TOKEN in the
+# X-Weather-Profile header, or picked at WEATHER_PROFILE_SAMPLE_RATE
+PROFILE_HEADER = 'X-Weather-Profile'
+profiler = RequestProfiler(
+    os.environ.get('WEATHER_PROFILE_DIR', db_path + '-profiles'),
+    token=os.environ.get('WEATHER_PROFILE_TOKEN') or None,
+    sample_rate=float(os.environ.get('WEATHER_PROFILE_SAMPLE_RATE', 0))
+)
+
+
+@app.before_request
+def start_profile():
+    if profiler.enabled and profiler.wants(request.headers.get(PROFILE_HEADER)):
+        g.profile = profiler.start()
+
+
+@app.after_request
+def save_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        path = profiler.save(profile, request.method, route)
+        # Tell the caller which file holds its profile
+        response.headers[PROFILE_HEADER + '-File'] = os.path.relpath(path, profiler.directory)
+    return response
+
+
+@app.teardown_request
+def stop_profile(exc=None):
+    # Only still set if the request failed before after_request ran
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+
+
+# Seeds up to this size run inside the request; larger ones become jobs
+SEED_SYNC_LIMIT = 1000
+
+# Largest seed accepted at all
+MAX_SEED_COUNT = 10_000_000
+
+# Seconds between keep-alive comments on idle streams; also how quickly
+# a disconnected client is noticed
+STREAM_KEEPALIVE = 15.0
+
+# Readings buffered per stream client before it is dropped as too slow
+STREAM_MAX_QUEUED = 1000
+
+# Most missed readings replayed to a client reconnecting with Last-Event-ID
+STREAM_REPLAY_LIMIT = 1000
+
+# Fixed Server-Sent Events messages
+SSE_RETRY = b'retry: 3000\n\n'  # Ask browsers to reconnect quickly after a drop
+SSE_KEEPALIVE = b': keepalive\n\n'
+SSE_DROPPED = b'event: dropped\ndata: {"reason":"slow consumer"}\n\n'
+
+
+def store_reading(weather) -> None:
+    """Persist a reading generated on the request path.
+
+    Uses the write-behind buffer when enabled and falls back to a
+    synchronous save when the buffer is full (backpressure).
+    """
+    if write_buffer is None or not write_buffer.submit(weather):
+        repository.save(weather)
+
+
+def conditional_get(view):
+    """Add ETag/Last-Modified validators to a read endpoint.
+
+    The validators come from the repository's per-location data version
+    (all locations when the route has no location), so a client whose
+    If-None-Match / If-Modified-Since is still current gets a 304
+    before the view queries or serializes anything.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version = repository.get_data_version(kwargs.get('location'))
+        except Exception:
+            # Let the view report database errors as usual
+            version = None
+
+        if version is not None:
+            etag, modified = version
+            if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+                response = Response(status=304)
+                response.set_etag(etag)
+                response.last_modified = modified
+                return response
+
+        response = app.make_response(view(*args, **kwargs))
+        if version is not None and response.status_code == 200:
+            response.set_etag(etag)
+            response.last_modified = modified
+        return response
+
+    return wrapper
 
 
 @app.route('/weather/live/<location>', methods=['GET'])
@@ -37,25 +268,26 @@ def get_live_weather(location: str):
         weather = generator.generate(location)
 
         # Save to database for historical record
-
-        repository.save(weather)
+        # (queued for a batched write in write-behind mode)
+        store_reading(weather)
 
         # Return as JSON
 
-        return jsonify({
+        return json_response({
             'status': 'success',
-            'data': weather.to_dict()
+            'data': weather
         }), 200
 
     except Exception as e:
         # Handle any errors gracefully
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
 
 
 @app.route('/weather/current/<location>', methods=['GET'])
+@conditional_get
 def get_current_weather(location: str):
     """
     Get most recent weather data from database.
@@ -70,24 +302,71 @@ def get_current_weather(location: str):
         # Handle case where no data exists
 
         if weather is None:
-            return jsonify({
+            return json_response({
                 'status': 'error',
                 'message': f'No weather data found for {location}'
             }), 404
 
-        return jsonify({
+        return json_response({
+            'status': 'success',
+            'data': weather
+        }), 200
+
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/weather/current', methods=['GET'])
+@conditional_get
+def get_current_weather_many():
+    """
+    Get most recent weather data for several locations in one request.
+
+    Query params:
+        locations: Comma-separated location names, or "all"
+
+    Example: GET /weather/current?locations=London,Paris,Tokyo
+    """
+    try:
+        names = request.args.get('locations', '').strip()
+        if not names:
+            return json_response({
+                'status': 'error',
+                'message': 'locations parameter is required (comma-separated names or "all")'
+            }), 400
+
+        if names.lower() == 'all':
+            latest = repository.get_latest_many()
+            missing = []
+        else:
+            requested = [name.strip() for name in names.split(',') if name.strip()]
+            if len(requested) > MAX_CURRENT_LOCATIONS:
+                return json_response({
+                    'status': 'error',
+                    'message': f'At most {MAX_CURRENT_LOCATIONS} locations per request'
+                }), 400
+            latest = repository.get_latest_many(requested)
+            missing = [name for name in dict.fromkeys(requested) if name not in latest]
+
+        return json_response({
             'status': 'success',
-            'data': weather.to_dict()
+            'count': len(latest),
+            'data': list(latest.values()),
+            'missing': missing
         }), 200
 
     except Exception as e:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
 
 
 @app.route('/weather/historical/<location>', methods=['GET'])
+@conditional_get
 def get_historical_weather(location: str):
     """
     Get historical weather data for a location.
@@ -96,6 +375,7 @@ def get_historical_weather(location: str):
     - start: Start date (ISO format, optional)
     - end: End date (ISO format, optional)
     - limit: Max records to return (default: 100)
+    - cursor: next_cursor from the previous page (optional)
 
     Example: GET /weather/historical/London?start=2024-01-01&limit=50
     """
@@ -105,6 +385,7 @@ def get_historical_weather(location: str):
         start_str = request.args.get('start')
         end_str = request.args.get('end')
         limit = request.args.get('limit', 100, type=int)
+        cursor = request.args.get('cursor')
 
         # Convert date strings to datetime objects
 
@@ -113,59 +394,321 @@ def get_historical_weather(location: str):
 
         # Query database for historical data
 
-        weather_list = repository.get_historical(location, start, end, limit)
+        weather_list, next_cursor = repository.get_historical_page(
+            location, start, end, limit, cursor
+        )
 
         # Handle empty results
         # Inform user if no data matches their query
         if not weather_list:
-            return jsonify({
+            return json_response({
                 'status': 'success',
                 'message': f'No historical data found for {location}',
-                'data': []
+                'data': [],
+                'next_cursor': None
             }), 200
 
         # Convert all WeatherData objects to dicts
-        return jsonify({
+        # Pass next_cursor back as ?cursor= to fetch the following page
+        return json_response({
             'status': 'success',
             'count': len(weather_list),
-            'data': [w.to_dict() for w in weather_list]
+            'data': weather_list,
+            'next_cursor': next_cursor
         }), 200
 
+    except InvalidCursorError as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
+    except ValueError as e:
+        # Handle invalid date format
+
+        return json_response({
+            'status': 'error',
+            'message': f'Invalid date format: {str(e)}'
+        }), 400
+
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+def _export_ndjson(weather_iter):
+    """Yield chunks of newline-delimited JSON, one reading per line."""
+    while True:
+        chunk = list(islice(weather_iter, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        yield b''.join(serializer.dumps(w) + b'\n' for w in chunk)
+
+
+def _export_csv(weather_iter):
+    """Yield chunks of CSV, starting with a header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    while True:
+        chunk = list(islice(weather_iter, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+        for w in chunk:
+            writer.writerow([
+                w.timestamp.isoformat(), w.location, w.temperature,
+                w.humidity, w.condition, w.wind_speed
+            ])
+        yield buffer.getvalue()
+        # Reuse the buffer for the next chunk
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Header only, when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _attachment_header(location: str, extension: str) -> str:
+    """Content-Disposition for an export file named after a location.
+
+    Any location name is safe: the plain filename is an ASCII
+    approximation, and names it can't represent exactly are also sent
+    percent-encoded as filename* (RFC 6266).
+    """
+    stem = unicodedata.normalize('NFKD', location).encode('ascii', 'ignore').decode('ascii')
+    stem = re.sub(r'[^\w. -]+', '_', stem, flags=re.ASCII).strip('_ .') or 'export'
+    # The stem has no quotes or backslashes left, so it can be quoted as is
+    header = f'attachment; filename="{stem}.{extension}"'
+    if stem != location:
+        header += "; filename*=UTF-8''" + quote(f'{location}.{extension}', safe='')
+    return header
+
+
+EXPORT_FORMATS = {
+    'ndjson': (_export_ndjson, 'application/x-ndjson'),
+    'csv': (_export_csv, 'text/csv'),
+}
+
+
+@app.route('/weather/export/<location>', methods=['GET'])
+def export_weather(location: str):
+    """
+    Stream all historical weather data for a location.
+
+    Rows go straight from the database cursor to the client in chunks,
+    so exports of any size use constant memory.
+
+    Query Parameters:
+    - format: "ndjson" or "csv" (default: ndjson)
+    - start: Start date (ISO format, optional)
+    - end: End date (ISO format, optional)
+
+    Example: GET /weather/export/London?format=csv&start=2024-01-01
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return json_response({
+                'status': 'error',
+                'message': 'format must be ndjson or csv'
+            }), 400
+
+        start_str = request.args.get('start')
+        end_str = request.args.get('end')
+
+        start = datetime.fromisoformat(start_str) if start_str else None
+        end = datetime.fromisoformat(end_str) if end_str else None
+
+        encode, mimetype = EXPORT_FORMATS[export_format]
+        weather_iter = repository.iter_historical(location, start, end)
+
+        return Response(
+            stream_with_context(encode(weather_iter)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': _attachment_header(location, export_format)}
+        )
+
     except ValueError as e:
         # Handle invalid date format
 
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': f'Invalid date format: {str(e)}'
         }), 400
 
     except Exception as e:
-        return jsonify({
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+def sse_event(event) -> bytes:
+    """Format a (rowid, WeatherData) event as a Server-Sent Event."""
+    event_id, weather = event
+    return b'id: %d\nevent: reading\ndata: %s\n\n' % (event_id, serializer.dumps(weather))
+
+
+def _stream_events(subscription, last_event_id):
+    """Yield SSE messages for a subscription until the client goes away."""
+    yield SSE_RETRY
+
+    # Readings missed since the client's last event, up to the point
+    # where the live subscription took over
+    if last_event_id is not None and last_event_id < subscription.start_id:
+        missed = repository.get_readings_since(
+            last_event_id, subscription.location, limit=STREAM_REPLAY_LIMIT
+        )
+        for event in missed:
+            if event[0] <= subscription.start_id:
+                yield sse_event(event)
+
+    while True:
+        event = subscription.get(STREAM_KEEPALIVE)
+        if event is not None:
+            yield sse_event(event)
+        elif subscription.dropped:
+            # Buffer overflowed; the client reconnects with Last-Event-ID
+            yield SSE_DROPPED
+            return
+        else:
+            yield SSE_KEEPALIVE
+
+
+@app.route('/weather/stream', methods=['GET'])
+@app.route('/weather/stream/<location>', methods=['GET'])
+def stream_weather(location: str = None):
+    """
+    Push new readings to the client as Server-Sent Events.
+
+    Streams readings for one location, or all locations without one.
+    Each event's id is the reading's position in the database, so a
+    reconnecting client's Last-Event-ID resumes where it left off.
+
+    Example: GET /weather/stream/London (Accept: text/event-stream)
+    """
+    try:
+        last_event_id = request.headers.get('Last-Event-ID')
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return json_response({
+            'status': 'error',
+            'message': 'Last-Event-ID must be an integer'
+        }), 400
+
+    try:
+        subscription = broker.subscribe(location, max_queued=STREAM_MAX_QUEUED)
+    except Exception as e:
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
 
+    response = Response(
+        _stream_events(subscription, last_event_id),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # The server closes the response when the client disconnects, even
+    # if the body was never iterated (a generator's finally would not run)
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
+
 
 @app.route('/weather/locations', methods=['GET'])
+@conditional_get
 def get_locations():
     """
     Get list of all available locations.
 
-    Example: GET /weather/locations
+    Query Parameters:
+    - details: Include reading counts and first/last-seen times (optional)
+
+    Example: GET /weather/locations?details=true
     """
     try:
         # Get all unique locations from database
 
         locations = repository.get_all_locations()
 
-        return jsonify({
+        response = {
             'status': 'success',
             'count': len(locations),
             'data': locations
+        }
+
+        # Per-location statistics are maintained on insert, so this
+        # is still a read of the small locations table
+        if request.args.get('details', '').lower() in ('1', 'true', 'yes'):
+            response['details'] = repository.get_location_stats()
+
+        return json_response(response), 200
+
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/weather/aggregate/<location>', methods=['GET'])
+@conditional_get
+def get_aggregate_weather(location: str):
+    """
+    Get hourly or daily weather summaries for a location.
+
+    Served from precomputed rollups, so long ranges stay cheap.
+
+    Query Parameters:
+    - granularity: "hour" or "day" (default: hour)
+    - start: Start date (ISO format, optional)
+    - end: End date (ISO format, optional)
+    - limit: Max buckets to return (default: 1000)
+
+    Example: GET /weather/aggregate/London?granularity=day&start=2024-01-01
+    """
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in ('hour', 'day'):
+            return json_response({
+                'status': 'error',
+                'message': 'granularity must be hour or day'
+            }), 400
+
+        start_str = request.args.get('start')
+        end_str = request.args.get('end')
+        limit = request.args.get('limit', 1000, type=int)
+
+        start = datetime.fromisoformat(start_str) if start_str else None
+        end = datetime.fromisoformat(end_str) if end_str else None
+
+        aggregates = repository.get_aggregates(location, granularity, start, end, limit)
+
+        return json_response({
+            'status': 'success',
+            'granularity': granularity,
+            'count': len(aggregates),
+            'data': aggregates
         }), 200
 
+    except ValueError as e:
+        # Handle invalid date format
+
+        return json_response({
+            'status': 'error',
+            'message': f'Invalid date format: {str(e)}'
+        }), 400
+
     except Exception as e:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
@@ -179,52 +722,134 @@ def get_random_weather():
     """
     try:
         weather = generator.generate_random()
-        repository.save(weather)
+        store_reading(weather)
         
-        return jsonify({
+        return json_response({
             'status': 'success',
-            'data': weather.to_dict()
+            'data': weather
         }), 200
         
     except Exception as e:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
 
 
+@app.route('/weather/ingest', methods=['POST'])
+def ingest_weather():
+    """
+    Store readings pushed by external stations.
+
+    The body is parsed line by line as it arrives and committed in
+    batches, so uploads of any size use bounded memory. Invalid records
+    are skipped and reported with their line numbers.
+
+    Query params:
+        format: ndjson or csv (default: from Content-Type, else ndjson)
+        batch_size: Records per transaction (default: 5000, max 50000)
+
+    Example: POST /weather/ingest?format=csv (body: CSV with header row)
+    """
+    committed = []
+    try:
+        data_format = request.args.get('format')
+        if data_format is None:
+            data_format = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        if data_format not in INGEST_PARSERS:
+            return json_response({
+                'status': 'error',
+                'message': f'Invalid format: {data_format} (use ndjson or csv)'
+            }), 400
+
+        batch_size = int(request.args.get('batch_size', INGEST_BATCH_SIZE))
+        if not 1 <= batch_size <= MAX_INGEST_BATCH_SIZE:
+            return json_response({
+                'status': 'error',
+                'message': f'batch_size must be between 1 and {MAX_INGEST_BATCH_SIZE}'
+            }), 400
+
+        # request.stream is unbuffered, so line iteration would read it a
+        # byte at a time; a BufferedReader pulls the body in large blocks
+        # while still never holding more than one block in memory
+        body = io.BufferedReader(request.stream, INGEST_READ_SIZE)
+        records = INGEST_PARSERS[data_format](body)
+        result = ingest_records(repository, records, batch_size, on_batch=committed.append)
+
+        return json_response({
+            'status': 'success',
+            **result
+        }), 200
+
+    except ValueError as e:
+        # Bad CSV header, undecodable body or bad batch_size
+        return json_response({
+            'status': 'error',
+            'message': str(e),
+            'accepted': sum(batch['accepted'] for batch in committed),
+            'batches': committed
+        }), 400
+
+    except Exception as e:
+        # Batches committed before the failure stay stored
+        return json_response({
+            'status': 'error',
+            'message': str(e),
+            'accepted': sum(batch['accepted'] for batch in committed),
+            'batches': committed
+        }), 500
+
+
+def _seed_job_response(location, count):
+    """Queue a seed job and answer 202 with where to follow it."""
+    job = jobs.submit_seed(location, count)
+    response = json_response({
+        'status': 'accepted',
+        'message': f'Generating {count} readings in background job {job["id"]}',
+        'job': job
+    })
+    response.status_code = 202
+    response.headers['Location'] = f'/weather/jobs/{job["id"]}'
+    return response
+
+
 @app.route('/weather/seed/<location>/<int:count>', methods=['POST'])
 def seed_data(location: str, count: int):
     """Generate and save multiple weather readings.
     Populate database with test/historical data quickly.
 
+    Seeds larger than SEED_SYNC_LIMIT run as a background job; the
+    response is 202 with the job to poll at /weather/jobs/<id>.
+
     Example: POST /weather/seed/London/100
     """
     try:
         # Validate count
 
-        if count > 1000:
-            return jsonify({
+        if count > MAX_SEED_COUNT:
+            return json_response({
                 'status': 'error',
-                'message': 'Count cannot exceed 1000'
+                'message': f'Count cannot exceed {MAX_SEED_COUNT}'
             }), 400
 
+        if count > SEED_SYNC_LIMIT:
+            return _seed_job_response(location, count)
+
         # Generate batch of weather data
 
         weather_list = generator.generate_batch(location, count)
 
-        # Save all to database
+        # Save all to database in one transaction
         # Persist for historical queries
-        for weather in weather_list:
-            repository.save(weather)
+        repository.save_many(weather_list)
 
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': f'Generated {count} weather readings for {location}'
         }), 201
 
     except Exception as e:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
@@ -233,28 +858,107 @@ def seed_data(location: str, count: int):
 @app.route('/weather/seed/random/<int:count>', methods=['POST'])
 def seed_random_data(count: int):
     """Generate and save random weather readings for random locations.
-    
+
+    Seeds larger than SEED_SYNC_LIMIT run as a background job.
+
     Example: POST /weather/seed/random/50
     """
     try:
-        if count > 1000:
-            return jsonify({
+        if count > MAX_SEED_COUNT:
+            return json_response({
                 'status': 'error',
-                'message': 'Count cannot exceed 1000'
+                'message': f'Count cannot exceed {MAX_SEED_COUNT}'
             }), 400
-            
+
+        if count > SEED_SYNC_LIMIT:
+            return _seed_job_response(None, count)
+
         weather_list = generator.generate_random_batch(count)
         
-        for weather in weather_list:
-            repository.save(weather)
+        repository.save_many(weather_list)
             
-        return jsonify({
+        return json_response({
             'status': 'success',
             'message': f'Generated {count} random weather readings'
         }), 201
         
     except Exception as e:
-        return jsonify({
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/weather/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """
+    Report a background job's progress and throughput.
+
+    Example: GET /weather/jobs/3f2a...
+    """
+    try:
+        job = jobs.get(job_id)
+        if job is None:
+            return json_response({
+                'status': 'error',
+                'message': f'Job {job_id} not found'
+            }), 404
+
+        return json_response({
+            'status': 'success',
+            'job': job
+        }), 200
+
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+@app.route('/weather/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job; it stops after its current chunk.
+
+    Readings saved by finished chunks are kept.
+
+    Example: DELETE /weather/jobs/3f2a...
+    """
+    try:
+        job = jobs.cancel(job_id)
+        if job is None:
+            return json_response({
+                'status': 'error',
+                'message': f'Job {job_id} not found'
+            }), 404
+
+        return json_response({
+            'status': 'success',
+            'job': job
+        }), 200
+
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+
+# Prometheus scrape endpoint
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and query metrics of all workers in Prometheus text format.
+
+    Other workers' values are read from their latest snapshots, so they
+    may lag by up to a second.
+
+    Example: GET /metrics
+    """
+    try:
+        return Response(metrics.render(), content_type=CONTENT_TYPE)
+    except Exception as e:
+        return json_response({
             'status': 'error',
             'message': str(e)
         }), 500
@@ -268,10 +972,24 @@ def health_check():
 
     Example: GET /health
     """
-    return jsonify({
+    response = {
         'status': 'healthy',
         'service': 'weather-api'
-    }), 200
+    }
+
+    # Cache counters show whether reads are actually being absorbed
+    response['cache'] = repository.cache_stats()
+    response['streams'] = broker.stats()
+
+    # Rows removed and pages reclaimed by retention, plus file size
+    if retention is not None:
+        response['retention'] = retention.stats()
+
+    # Report queue depth so a growing write backlog is visible
+    if write_buffer is not None:
+        response['write_behind'] = write_buffer.stats()
+
+    return jsonify(response), 200
 
 
 if __name__ == '__main__':
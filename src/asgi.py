@@ -0,0 +1,342 @@
+"""
+ASGI serving mode for the weather API.
+
+Run with an ASGI server, e.g.:
+
+    uvicorn src.asgi:app --workers 4
+
+Regular routes run the unchanged Flask app on a bounded thread pool, so
+every route keeps its URL and JSON contract. Live streams are served
+natively on the event loop, so idle /weather/stream clients hold no
+thread at all.
+"""
+
+import asyncio
+import contextvars
+import io
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from .api import (
+    SSE_DROPPED, SSE_KEEPALIVE, SSE_RETRY, STREAM_KEEPALIVE, STREAM_MAX_QUEUED,
+    STREAM_REPLAY_LIMIT, app as flask_app, broker, repository, serializer, sse_event
+)
+
+
+# Flask requests handled at once per process; more wait in the pool's queue
+DEFAULT_MAX_THREADS = 32
+
+# Bytes of request body buffered per read by the Flask side
+BODY_READ_SIZE = 64 * 1024
+
+# Routes served on the event loop instead of the thread pool
+STREAM_ROUTE = re.compile(r"^/weather/stream(?:/(?P<location>[^/]+))?/?$")
+
+
+class _RequestBody(io.RawIOBase):
+    """
+    Blocking file object over an ASGI request body, for wsgi.input.
+
+    Read from a pool thread; each read waits for the next body chunk
+    from the event loop, so uploads stream without being buffered whole.
+    """
+
+    def __init__(self, receive, loop: asyncio.AbstractEventLoop):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = b""
+        self._more = True
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._more = False
+                break
+            self._chunk = message.get("body", b"")
+            self._more = message.get("more_body", False)
+
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+
+class AsgiAdapter:
+    """
+    ASGI application wrapping the Flask WSGI app.
+
+    Each request is handed to a bounded ThreadPoolExecutor. Responses with
+    a Content-Length (all JSON responses) are produced entirely in the
+    pool thread; streaming responses (exports) are pulled one chunk per
+    pool hop, so a slow client only holds a thread while a chunk is being
+    produced, not while it is being sent. Consecutive chunks may run on
+    different threads, so streamed bodies must not rely on thread-local
+    state (exports read through their own connection).
+    """
+
+    def __init__(self, wsgi_app, max_threads: int = DEFAULT_MAX_THREADS):
+        """
+        Initialize adapter.
+
+        Args:
+            wsgi_app: WSGI application to serve
+            max_threads: Size of the thread pool running wsgi_app
+        """
+        self.wsgi_app = wsgi_app
+        self.max_threads = max_threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool, created in the serving process on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_threads, thread_name_prefix="weather-asgi")
+        return self._executor
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        match = STREAM_ROUTE.match(scope["path"])
+        if match and scope["method"] == "GET":
+            # scope["path"] is already percent-decoded
+            await self._stream(scope, receive, send, match.group("location"))
+        else:
+            await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        """Answer lifespan events; release the thread pool on shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _environ(self, scope, body: _RequestBody) -> dict:
+        """
+        Build a WSGI environ from an ASGI HTTP scope.
+        """
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+            "PATH_INFO": scope["path"].encode().decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "REMOTE_ADDR": client[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BufferedReader(body, BODY_READ_SIZE),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE" or name == "CONTENT_LENGTH":
+                environ[name] = value
+                continue
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        if "CONTENT_LENGTH" not in environ:
+            # Lets Werkzeug read a chunked body until it ends
+            environ["wsgi.input_terminated"] = True
+        return environ
+
+    async def _wsgi(self, scope, receive, send) -> None:
+        """
+        Run one request through the WSGI app on the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        environ = self._environ(scope, _RequestBody(receive, loop))
+        started = {}
+
+        # Every step runs in one context, whichever pool thread takes it:
+        # streamed responses keep Flask's request context in a context
+        # variable between chunks (stream_with_context)
+        context = contextvars.copy_context()
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in headers
+            ]
+
+        def begin():
+            # Call the app and, for fixed-length responses, produce the
+            # whole body without returning to the event loop
+            iterable = self.wsgi_app(environ, start_response)
+            iterator = iter(iterable)
+            if any(name == b"content-length" for name, _ in started["headers"]):
+                try:
+                    return b"".join(iterator), None
+                finally:
+                    _close(iterable)
+            return b"", (iterable, iterator)
+
+        body, stream = await loop.run_in_executor(self.executor, context.run, begin)
+        await send({
+            "type": "http.response.start",
+            "status": started["status"],
+            "headers": started["headers"],
+        })
+        if stream is None:
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        iterable, iterator = stream
+        try:
+            while True:
+                chunk = await loop.run_in_executor(
+                    self.executor, context.run, next, iterator, None
+                )
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            await loop.run_in_executor(self.executor, context.run, _close, iterable)
+
+    async def _stream(self, scope, receive, send, location: Optional[str]) -> None:
+        """
+        Serve /weather/stream on the event loop.
+
+        Same events as the Flask route, but waiting for the next reading
+        uses an asyncio event set from the broker thread instead of a
+        blocked thread.
+        """
+        loop = asyncio.get_running_loop()
+        headers = dict(scope["headers"])
+        try:
+            last_event_id = headers.get(b"last-event-id")
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            await _send_json(send, 400, {
+                'status': 'error',
+                'message': 'Last-Event-ID must be an integer'
+            })
+            return
+
+        try:
+            subscription = await loop.run_in_executor(
+                self.executor, broker.subscribe, location, STREAM_MAX_QUEUED
+            )
+        except Exception as e:
+            await _send_json(send, 500, {'status': 'error', 'message': str(e)})
+            return
+
+        ready = asyncio.Event()
+        subscription.on_event = lambda: loop.call_soon_threadsafe(ready.set)
+        disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            })
+            await _send_chunk(send, SSE_RETRY)
+
+            if last_event_id is not None and last_event_id < subscription.start_id:
+                missed = await loop.run_in_executor(
+                    self.executor, repository.get_readings_since,
+                    last_event_id, location, STREAM_REPLAY_LIMIT
+                )
+                events = [event for event in missed if event[0] <= subscription.start_id]
+                if events:
+                    await _send_chunk(send, b"".join(sse_event(event) for event in events))
+
+            while not disconnected.done():
+                # Clear before draining so a reading published meanwhile
+                # sets the event again
+                ready.clear()
+                chunk = []
+                while True:
+                    event = subscription.get(0)
+                    if event is None:
+                        break
+                    chunk.append(sse_event(event))
+                if chunk:
+                    await _send_chunk(send, b"".join(chunk))
+                    continue
+                if subscription.dropped:
+                    await _send_chunk(send, SSE_DROPPED)
+                    break
+
+                waiter = asyncio.ensure_future(ready.wait())
+                finished, _ = await asyncio.wait(
+                    {waiter, disconnected}, timeout=STREAM_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if not finished:
+                    await _send_chunk(send, SSE_KEEPALIVE)
+
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            subscription.on_event = None
+            broker.unsubscribe(subscription)
+
+
+def _close(iterable) -> None:
+    """Close a WSGI response iterable, running its cleanup callbacks."""
+    if hasattr(iterable, "close"):
+        iterable.close()
+
+
+async def _wait_for_disconnect(receive) -> None:
+    """Return once the client has gone away."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_chunk(send, body: bytes) -> None:
+    """Send part of a streaming response body."""
+    await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+async def _send_json(send, status: int, payload: dict) -> None:
+    """Send a complete JSON response."""
+    body = serializer.dumps(payload)
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = AsgiAdapter(
+    flask_app,
+    max_threads=int(os.environ.get('WEATHER_ASGI_THREADS', DEFAULT_MAX_THREADS))
+)
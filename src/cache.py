@@ -0,0 +1,221 @@
+"""
+In-process query result cache.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Roughly estimate the memory held by a cached query result.
+
+    Handles the shapes WeatherRepository returns: model objects, lists
+    of them, lists of strings/dicts, tuples and None.
+
+    Args:
+        value: Cached value
+
+    Returns:
+        Approximate size in bytes
+    """
+    if value is None:
+        return sys.getsizeof(value)
+    if isinstance(value, list):
+        # Readings in one result share the same shape, so size the first
+        # item and scale instead of walking every element
+        if not value:
+            return sys.getsizeof(value)
+        return sys.getsizeof(value) + len(value) * estimate_size(value[0])
+    if isinstance(value, tuple):
+        # Tuples pair unrelated parts, e.g. (readings, next cursor)
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items()
+        )
+    if hasattr(value, "__slots__"):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(getattr(value, name)) for name in value.__slots__
+        )
+    return sys.getsizeof(value)
+
+
+def copy_result(value: Any) -> Any:
+    """
+    Copy the containers of a cached result.
+
+    Lists, tuples and dicts are copied (recursively) so a caller that
+    sorts or extends a result can't change what later callers get.
+    Model objects inside them are shared; copying thousands of readings
+    on every hit would cost as much as the query.
+
+    Args:
+        value: Cached value
+
+    Returns:
+        Value with fresh containers
+    """
+    if isinstance(value, list):
+        if value and not isinstance(value[0], (list, tuple, dict)):
+            return list(value)
+        return [copy_result(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(copy_result(item) for item in value)
+    if isinstance(value, dict):
+        return {key: copy_result(item) for key, item in value.items()}
+    return value
+
+
+class QueryCache:
+    """
+    LRU cache with a TTL and a memory budget in bytes.
+
+    Each entry is tagged with the location it was read for (None for
+    results spanning all locations) so writes can invalidate just the
+    affected entries.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, ttl: float = 60.0):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_bytes: Memory budget; least recently used entries are
+                evicted beyond it (0 disables caching)
+            ttl: Seconds an entry stays valid
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (value, size, expires_at, location)
+        self._entries: OrderedDict = OrderedDict()
+        self._by_location: Dict[Optional[str], Set[Hashable]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # Counters for monitoring
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all."""
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a cached value.
+
+        Args:
+            key: Normalized query key
+            default: Returned on a miss
+
+        Returns:
+            Cached value (with copied containers, see copy_result()), or
+            default if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[0]
+        return copy_result(value)
+
+    def put(self, key: Hashable, value: Any, location: Optional[str]) -> None:
+        """
+        Store a value, evicting least recently used entries if needed.
+
+        Args:
+            key: Normalized query key
+            value: Result to cache (model objects in it are shared by hits)
+            location: Location the result depends on (None for all)
+        """
+        if not self.enabled:
+            return
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            # Never let one huge result flush the whole cache
+            return
+
+        # The caller keeps using its own copy of the result
+        value = copy_result(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, location)
+            self._by_location.setdefault(location, set()).add(key)
+            self._size += size
+
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, location: Optional[str] = None) -> None:
+        """
+        Drop entries affected by a write to a location.
+
+        Results spanning all locations are always dropped too.
+
+        Args:
+            location: Written location (optional, defaults to everything)
+        """
+        with self._lock:
+            if location is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._by_location.clear()
+                self._size = 0
+                return
+
+            for tag in (location, None):
+                for key in list(self._by_location.get(tag, ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Get cache counters for monitoring.
+
+        Returns:
+            Dictionary with size, entry count and hit/miss/eviction counters
+        """
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        """Remove one entry; caller holds the lock."""
+        _, size, _, location = self._entries.pop(key)
+        self._size -= size
+        keys = self._by_location.get(location)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_location[location]
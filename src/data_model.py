@@ -3,13 +3,17 @@ Data models for the weather data
 """
 #TODO Add rain, snow, and foggy details
 
-from dataclasses import dataclass, asdict
-from datetime import datetime
+from dataclasses import dataclass, asdict, field
+from datetime import datetime, timedelta
+from sys import intern
+from typing import Any, List, Sequence
 
 
-@dataclass
+@dataclass(slots=True)
 class WeatherData:
     """Represents a single weather reading.
+
+    Slotted to keep per-object memory low when many readings are loaded.
     """
     timestamp: datetime  # When reading was taken
     location: str  # City or region name
@@ -22,10 +26,15 @@ class WeatherData:
         """
         Convert to dictionary for JSON serialization.
         """
-        data = asdict(self)
-        # Convert datetime to ISO string for JSON compatibility
-        data['timestamp'] = self.timestamp.isoformat()
-        return data
+        # Built directly instead of asdict(), which deep-copies every field
+        return {
+            'timestamp': self.timestamp.isoformat(),  # ISO string for JSON
+            'location': self.location,
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'condition': self.condition,
+            'wind_speed': self.wind_speed
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'WeatherData':
@@ -36,4 +45,98 @@ class WeatherData:
         # Database stores as string, we need datetime object
         if isinstance(data['timestamp'], str):
             data['timestamp'] = datetime.fromisoformat(data['timestamp'])
+        data['condition'] = intern(data['condition'])
         return cls(**data)
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> 'WeatherData':
+        """
+        Create WeatherData from a database row.
+
+        Args:
+            row: (timestamp, location, temperature, humidity, condition,
+                wind_speed) with timestamp as an ISO string; extra
+                trailing columns are ignored
+
+        Returns:
+            WeatherData object
+        """
+        # Interning shares one string object per condition across rows
+        return cls(
+            datetime.fromisoformat(row[0]),
+            row[1],
+            row[2],
+            row[3],
+            intern(row[4]),
+            row[5]
+        )
+
+
+@dataclass
+class WeatherAggregate:
+    """Summary of the readings for one location in one time bucket.
+    """
+    location: str  # City or region name
+    granularity: str  # Bucket size ("hour" or "day")
+    bucket_start: datetime  # Start of the bucket
+    count: int  # Number of readings in the bucket
+    temperature_min: float  # Celsius
+    temperature_max: float
+    temperature_mean: float
+    humidity_min: float  # Percentage (0-100)
+    humidity_max: float
+    humidity_mean: float
+    wind_speed_min: float  # km/h
+    wind_speed_max: float
+    wind_speed_mean: float
+    conditions: dict = field(default_factory=dict)  # Condition -> reading count
+
+    def to_dict(self) -> dict:
+        """
+        Convert to dictionary for JSON serialization.
+        """
+        data = asdict(self)
+        data['bucket_start'] = self.bucket_start.isoformat()
+        return data
+
+
+@dataclass
+class WeatherColumns:
+    """Column-oriented batch of weather readings.
+
+    Each measurement is a NumPy array with one entry per reading, so large
+    synthetic batches never become per-row Python objects. Locations and
+    conditions are stored as integer codes into the name lists.
+    """
+    ts: Any  # int64 epoch milliseconds (naive time treated as UTC)
+    location_codes: Any  # Index into locations
+    condition_codes: Any  # Index into conditions
+    temperature: Any  # Celsius
+    humidity: Any  # Percentage (0-100)
+    wind_speed: Any  # km/h
+    locations: List[str]  # Location names referenced by location_codes
+    conditions: List[str]  # Condition names referenced by condition_codes
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def to_weather_list(self) -> List[WeatherData]:
+        """
+        Convert to WeatherData objects (only sensible for small batches).
+        """
+        epoch = datetime(1970, 1, 1)
+        return [
+            WeatherData(
+                timestamp=epoch + timedelta(milliseconds=ts),
+                location=self.locations[location],
+                temperature=temperature,
+                humidity=humidity,
+                condition=self.conditions[condition],
+                wind_speed=wind_speed
+            )
+            for ts, location, condition, temperature, humidity, wind_speed in zip(
+                self.ts.tolist(), self.location_codes.tolist(),
+                self.condition_codes.tolist(), self.temperature.tolist(),
+                self.humidity.tolist(), self.wind_speed.tolist()
+            )
+        ]
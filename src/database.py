@@ -2,10 +2,228 @@
 Weather data storing in databases
 """
 
+import base64
+import binascii
+import json
+import logging
+import os
 import sqlite3
-from datetime import datetime
-from typing import List, Optional
-from .data_model import WeatherData
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .cache import QueryCache
+from .data_model import WeatherAggregate, WeatherColumns, WeatherData
+
+try:
+    import fcntl
+except ImportError:  # Windows: migrations run without a cross-process lock
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Pragmas applied to every pooled connection.
+# WAL lets readers run concurrently with the single writer, and
+# synchronous=NORMAL is durable in WAL mode without an fsync per commit
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # Negative value is KiB, i.e. ~16 MB page cache
+    "temp_store": "MEMORY",
+    "mmap_size": 268435456,  # 256 MB memory-mapped I/O
+    "busy_timeout": 5000,  # Wait up to 5s for a lock instead of failing
+}
+
+# Rows handed to each executemany call by save_many
+DEFAULT_CHUNK_SIZE = 1000
+
+# Rows fetched from SQLite per fetchmany call when streaming exports
+EXPORT_FETCH_SIZE = 1000
+
+# Smallest batch worth saving with triggers suspended (save_many(bulk=True))
+BULK_SAVE_MIN_ROWS = 1000
+
+# Rows updated per transaction while migrating existing data
+MIGRATION_BATCH_SIZE = 50000
+
+# Readings deleted per transaction when enforcing retention
+RETENTION_CHUNK_SIZE = 5000
+
+# Rows sampled per index by ANALYZE; full ANALYZE reads whole indexes
+ANALYZE_LIMIT = 1000
+
+# PRAGMA auto_vacuum values
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# Memory budget and lifetime of the query result cache
+DEFAULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_CACHE_TTL = 60.0
+
+# Statements recorded per call for slow-query logging; bulk writes run
+# one statement per row and only the first few are worth a plan
+SLOW_QUERY_MAX_STATEMENTS = 10
+
+# Columns in WeatherData field order, as expected by WeatherData.from_row.
+# Facts only store location_id, so the location name is bound through the
+# placeholder, which must be the query's first parameter
+WEATHER_COLUMNS = "timestamp, ? AS location, temperature, humidity, condition, wind_speed"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+ONE_MS = timedelta(milliseconds=1)
+
+# Rollup bucket sizes in milliseconds, by granularity name
+ROLLUP_GRANULARITIES = {
+    "hour": 3600000,
+    "day": 86400000,
+}
+
+# Width of each rollup backfill transaction (whole days, so hourly
+# and daily buckets never straddle two transactions)
+BACKFILL_WINDOW_MS = 7 * 86400000
+
+# Current wall-clock time as epoch milliseconds, in SQL
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+# Measurements summarised in rollups
+ROLLUP_MEASURES = ("temperature", "humidity", "wind_speed")
+
+INSERT_WEATHER_SQL = """
+    INSERT INTO weather 
+    (timestamp, ts, location_id, temperature, humidity, condition, wind_speed)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+def encode_cursor(ts: int, rowid: int) -> str:
+    """
+    Encode the position after a row as an opaque pagination token.
+
+    Args:
+        ts: Epoch-millisecond timestamp of the last returned row
+        rowid: rowid of the last returned row
+
+    Returns:
+        URL-safe cursor string
+    """
+    raw = f"{ts}:{rowid}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Decode a token produced by encode_cursor.
+
+    Args:
+        cursor: Cursor string from a previous page
+
+    Returns:
+        (ts, rowid) of the last row of the previous page
+
+    Raises:
+        InvalidCursorError: If the token is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, rowid = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return int(ts), int(rowid)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from None
+
+
+def weather_row_factory(cursor: sqlite3.Cursor, row: tuple) -> WeatherData:
+    """
+    Row factory building WeatherData straight from WEATHER_COLUMNS rows.
+    """
+    return WeatherData.from_row(row)
+
+
+def _count_rows(result: Any) -> int:
+    """
+    Rows represented by a repository method's return value.
+    """
+    if result is None:
+        return 0
+    if isinstance(result, int):
+        # save_many and friends return the number of rows written
+        return result
+    if isinstance(result, (list, dict)):
+        return len(result)
+    return 1
+
+
+def timed(rows: Callable[[Any], int] = _count_rows):
+    """
+    Report a repository method's duration and row count to query_observer,
+    and log it with query plans when it exceeds slow_query_ms.
+
+    Costs two attribute checks per call while neither is set.
+
+    Args:
+        rows: Maps the method's return value to a row count
+    """
+    def decorator(method):
+        name = method.__name__
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            observer = self.query_observer
+            if observer is None and self.slow_query_ms is None:
+                return method(self, *args, **kwargs)
+            with self._trace_statements() as statements:
+                started = time.perf_counter()
+                result = method(self, *args, **kwargs)
+                seconds = time.perf_counter() - started
+            if observer is not None:
+                observer(name, seconds, rows(result))
+            if statements is not None and seconds * 1000 >= self.slow_query_ms:
+                self._log_slow_query(name, seconds, statements)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """
+    Convert a datetime to integer epoch milliseconds.
+
+    Naive datetimes are treated as UTC wall-clock time so stored readings
+    keep the same ordering as their ISO strings.
+
+    Args:
+        value: Datetime to convert
+
+    Returns:
+        Milliseconds since 1970-01-01T00:00:00
+    """
+    # Integer timedelta division avoids float rounding; subtracting from
+    # a naive epoch skips building an aware copy of every timestamp
+    if value.tzinfo is None:
+        return (value - NAIVE_EPOCH) // ONE_MS
+    return (value - EPOCH) // ONE_MS
+
+
+def from_epoch_ms(value: int) -> datetime:
+    """
+    Convert integer epoch milliseconds back to a naive datetime.
+
+    Args:
+        value: Milliseconds since 1970-01-01T00:00:00
+
+    Returns:
+        Naive datetime in the same wall-clock time as to_epoch_ms input
+    """
+    return datetime(1970, 1, 1) + timedelta(milliseconds=value)
 
 
 class WeatherRepository:
@@ -13,27 +231,285 @@ class WeatherRepository:
     Handles all database operations for weather data.
     """
 
-    def __init__(self, db_path: str = "weather.db"):
+    def __init__(
+            self,
+            db_path: str = "weather.db",
+            cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+            cache_ttl: float = DEFAULT_CACHE_TTL,
+            slow_query_ms: Optional[float] = None
+    ):
         """
         Initialize repository with database connection.
 
         Args:
             db_path: Path to SQLite database file
+            cache_max_bytes: Memory budget for cached query results
+                (0 disables the cache)
+            cache_ttl: Seconds a cached query result stays valid
+            slow_query_ms: Log calls slower than this many milliseconds
+                with the query plans of their statements (None disables)
         """
         # Store database path as instance variable
         self.db_path = db_path
 
+        # One long-lived connection per thread, created lazily.
+        # All connections are tracked so close() can release them
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+        # Read-through caches of query results and data versions by
+        # location (None = all locations).
+        # Cleared per location when this process writes, or when another
+        # connection commits and changes that location's version
+        self._query_cache = QueryCache(cache_max_bytes, cache_ttl)
+        self._version_cache: Dict[Optional[str], Tuple[str, datetime]] = {}
+        self._known_versions: Optional[Dict[str, int]] = None
+        self._cache_generation = 0
+
+        # Location name -> locations.id; ids never change once assigned
+        self._location_ids: Dict[str, int] = {}
+
+        # Callbacks run after every committed write (e.g. live streams)
+        self._write_listeners: List[Callable[[], None]] = []
+
+        # Called as observer(method, seconds, rows) after each timed call
+        self.query_observer: Optional[Callable[[str, float, int], None]] = None
+        self.slow_query_ms = slow_query_ms
+
         # Initialize database schema
         # Ensure table exists before any operations
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a new connection with WAL mode and tuned pragmas.
+
+        Returns:
+            Configured SQLite connection
+        """
+        # check_same_thread is disabled only so close() can run from any
+        # thread; each connection is otherwise used by its owner thread
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+
+        # Lets retention return freed pages to the OS. Only takes effect
+        # on a new file (before journal_mode writes its header); existing
+        # files need enable_incremental_vacuum() once
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+        # journal_mode is persistent in the database file, but setting it
+        # per connection is cheap and covers freshly created files
+        conn.execute("PRAGMA journal_mode=WAL")
+        for name, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Get the calling thread's connection, creating it on first use.
+
+        Returns:
+            Reusable SQLite connection owned by the current thread
+        """
+        # SQLite handles must not be shared across fork().
+        # A gunicorn worker forked from a preloaded master starts over
+        # with fresh connections and leaves the inherited ones alone
+        if os.getpid() != self._pid:
+            self._reset_after_fork()
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_after_fork(self) -> None:
+        """
+        Drop connection state inherited from the parent process.
+        """
+        # Keep references to the parent's handles so they are never
+        # closed (and their locks released) from inside the child
+        self._inherited = self._connections
+        self._connections = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._query_cache = QueryCache(self._query_cache.max_bytes, self._query_cache.ttl)
+        self._version_cache = {}
+        self._known_versions = None
+        self._location_ids = {}
+
+    def close(self) -> None:
+        """
+        Close every pooled connection opened by this repository.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    @contextmanager
+    def _trace_statements(self):
+        """
+        Record the SQL run on this thread's connection, for slow-query logs.
+
+        Yields:
+            List filling with expanded SQL statements, or None when slow
+            query logging is off or an outer call is already recording
+        """
+        if self.slow_query_ms is None or getattr(self._local, "tracing", False):
+            yield None
+            return
+
+        statements: List[str] = []
+
+        def trace(sql: str) -> None:
+            # Statements run by triggers are reported as "-- comments"
+            if (len(statements) < SLOW_QUERY_MAX_STATEMENTS and not sql.startswith("--")
+                    and sql not in statements):
+                statements.append(sql)
+
+        conn = self._get_connection()
+        conn.set_trace_callback(trace)
+        self._local.tracing = True
+        try:
+            yield statements
+        finally:
+            self._local.tracing = False
+            conn.set_trace_callback(None)
+
+    def _log_slow_query(self, method: str, seconds: float, statements: List[str]) -> None:
+        """
+        Log a slow call with EXPLAIN QUERY PLAN output for its statements.
+
+        Args:
+            method: Repository method name
+            seconds: Call duration
+            statements: Expanded SQL recorded during the call
+        """
+        conn = self._get_connection()
+        lines = [f"Slow query: {method} took {seconds * 1000:.1f} ms"]
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+                continue
+            lines.append("  " + " ".join(sql.split()))
+            try:
+                plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+            except sqlite3.Error as e:
+                lines.append(f"    (no plan: {e})")
+                continue
+            # Rows are (id, parent, notused, detail); indent by depth
+            depth = {0: 0}
+            for row in plan:
+                depth[row[0]] = depth.get(row[1], 0) + 1
+                lines.append("    " + "  " * depth[row[0]] + row[3])
+        logger.warning("\n".join(lines))
+
     def _init_db(self) -> None:
         """
-        Create weather table if it doesn't exist.
+        Create or upgrade the schema to the latest version.
+
+        The schema version is stored in PRAGMA user_version. Migrations
+        run under a cross-process lock so gunicorn workers starting at the
+        same time upgrade the file once, and each one is idempotent so an
+        interrupted upgrade can resume.
+        """
+        migrations = self._migrations()
+
+        # Use a short-lived connection so nothing is left open in a
+        # gunicorn master that imports the app before forking workers
+        conn = self._connect()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+            # Fast path: schema already current, no lock needed
+            if version >= len(migrations) and not self._has_pending_ddl(conn):
+                return
+
+            with self._schema_lock():
+                # Another process may have upgraded while we waited
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+                for target, migration in enumerate(migrations, start=1):
+                    if version >= target:
+                        continue
+                    migration(conn)
+                    # Record progress so an interrupted upgrade resumes here
+                    with conn:
+                        conn.execute(f"PRAGMA user_version = {target}")
+                    version = target
+
+                if self._has_pending_ddl(conn):
+                    logger.warning("Restoring weather indexes and triggers left over by an interrupted bulk load")
+                    with conn:
+                        conn.execute("BEGIN IMMEDIATE")
+                        self._restore_pending_ddl(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _has_pending_ddl(conn: sqlite3.Connection) -> bool:
+        """
+        Check whether a bulk load dropped schema objects without restoring them.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pending_ddl'"
+        ).fetchone()
+        return exists is not None and conn.execute("SELECT 1 FROM pending_ddl LIMIT 1").fetchone() is not None
+
+    @staticmethod
+    def _restore_pending_ddl(conn: sqlite3.Connection) -> None:
+        """
+        Recreate the objects recorded in pending_ddl and clear the record.
+
+        Args:
+            conn: Connection holding a write transaction
+        """
+        for (sql,) in conn.execute("SELECT sql FROM pending_ddl ORDER BY rowid").fetchall():
+            conn.execute(sql)
+        conn.execute("DELETE FROM pending_ddl")
+
+    @contextmanager
+    def _schema_lock(self):
+        """
+        Hold an exclusive lock file next to the database during migrations.
+        """
+        if fcntl is None:
+            yield
+            return
 
+        with open(f"{self.db_path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _migrations(self) -> list:
+        """
+        Get schema migrations in order; index + 1 is the resulting version.
         """
+        return [
+            self._migrate_create_weather,
+            self._migrate_epoch_timestamp,
+            self._migrate_latest_table,
+            self._migrate_locations_table,
+            self._migrate_rollup_tables,
+            self._migrate_location_versions,
+            self._migrate_jobs_table,
+            self._migrate_autoincrement_ids,
+        ]
 
-        with sqlite3.connect(self.db_path) as conn:
+    def _migrate_create_weather(self, conn: sqlite3.Connection) -> None:
+        """
+        Version 1: create weather table if it doesn't exist.
+        """
+        with conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS weather (
                     timestamp TEXT NOT NULL,
@@ -49,124 +525,1984 @@ class WeatherRepository:
                 CREATE INDEX IF NOT EXISTS idx_location 
                 ON weather(location)
             """)
-            conn.commit()
 
-    def save(self, weather: WeatherData) -> None:
+    def _migrate_epoch_timestamp(self, conn: sqlite3.Connection) -> None:
         """
-        Save weather data to database.
+        Version 2: add integer epoch-millisecond ts column and (location, ts) index.
 
-        Args:
-            weather: WeatherData object to save
+        Existing rows are backfilled in rowid batches with one commit per
+        batch, so large databases never hold a long write lock.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            # Use parameterized query to prevent SQL injection
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(weather)")]
+        if "ts" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE weather ADD COLUMN ts INTEGER")
+
+        # Reuse the Python conversion so backfilled values match new inserts
+        conn.create_function(
+            "epoch_ms", 1,
+            lambda text: to_epoch_ms(datetime.fromisoformat(text)),
+            deterministic=True
+        )
+
+        low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM weather").fetchone()
+        if low is not None:
+            for first in range(low, high + 1, MIGRATION_BATCH_SIZE):
+                with conn:
+                    conn.execute("""
+                        UPDATE weather SET ts = epoch_ms(timestamp)
+                        WHERE rowid >= ? AND rowid < ? AND ts IS NULL
+                    """, (first, first + MIGRATION_BATCH_SIZE))
+
+        # Composite index turns latest/range lookups into index seeks.
+        # SQLite scans it backwards for newest-first queries, and it also
+        # serves plain location lookups, so idx_location is redundant
+        with conn:
             conn.execute("""
-                INSERT INTO weather 
-                (timestamp, location, temperature, humidity, condition, wind_speed)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                weather.timestamp.isoformat(),  # Convert datetime to string
-                weather.location,
-                weather.temperature,
-                weather.humidity,
-                weather.condition,
-                weather.wind_speed
-            ))
-            conn.commit()
+                CREATE INDEX IF NOT EXISTS idx_location_ts
+                ON weather(location, ts)
+            """)
+            conn.execute("DROP INDEX IF EXISTS idx_location")
 
-    def get_latest(self, location: str) -> Optional[WeatherData]:
+    def _migrate_latest_table(self, conn: sqlite3.Connection) -> None:
         """
-        Get most recent weather reading for a location.
+        Version 3: add weather_latest table holding one row per location.
 
-        Args:
-            location: City or region name
+        An insert trigger keeps it current for every writer, including
+        save, save_many and external bulk loaders.
+        """
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_latest (
+                    location TEXT PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    temperature REAL NOT NULL,
+                    humidity REAL NOT NULL,
+                    condition TEXT NOT NULL,
+                    wind_speed REAL NOT NULL
+                )
+            """)
+            # Only replace the stored reading with a newer (or equal) one,
+            # so backdated inserts don't overwrite the latest reading
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_weather_latest
+                AFTER INSERT ON weather
+                BEGIN
+                    INSERT INTO weather_latest
+                    (location, timestamp, ts, temperature, humidity, condition, wind_speed)
+                    VALUES (NEW.location, NEW.timestamp, NEW.ts, NEW.temperature,
+                            NEW.humidity, NEW.condition, NEW.wind_speed)
+                    ON CONFLICT(location) DO UPDATE SET
+                        timestamp = excluded.timestamp,
+                        ts = excluded.ts,
+                        temperature = excluded.temperature,
+                        humidity = excluded.humidity,
+                        condition = excluded.condition,
+                        wind_speed = excluded.wind_speed
+                    WHERE excluded.ts >= weather_latest.ts;
+                END
+            """)
+            # Backfill from existing history; with MAX() SQLite takes the
+            # other columns from the row holding the maximum ts
+            conn.execute("""
+                INSERT OR REPLACE INTO weather_latest
+                (location, timestamp, ts, temperature, humidity, condition, wind_speed)
+                SELECT location, timestamp, MAX(ts), temperature, humidity,
+                       condition, wind_speed
+                FROM weather
+                GROUP BY location
+            """)
 
-        Returns:
-            Most recent WeatherData or None if no data exists
+    def _migrate_locations_table(self, conn: sqlite3.Connection) -> None:
         """
-        with sqlite3.connect(self.db_path) as conn:
-            # Set row factory to return dict instead of tuple
-            conn.row_factory = sqlite3.Row
+        Version 4: move location names into a locations dimension table.
 
-            cursor = conn.execute("""
-                SELECT * FROM weather 
-                WHERE location = ?
-                ORDER BY timestamp DESC
-                LIMIT 1
-            """, (location,))
+        The weather table is rebuilt to store an integer location_id
+        (rowids are preserved) and copied in rowid batches. The locations
+        table keeps reading counts and first/last-seen times, maintained
+        incrementally by the insert trigger.
+        """
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS locations (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    reading_count INTEGER NOT NULL DEFAULT 0,
+                    first_ts INTEGER,
+                    last_ts INTEGER
+                )
+            """)
 
-            row = cursor.fetchone()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(weather)")]
+        if "location" in columns:
+            # Seed dimension rows with totals from the existing history
+            with conn:
+                conn.execute("""
+                    INSERT OR IGNORE INTO locations (name, reading_count, first_ts, last_ts)
+                    SELECT location, COUNT(*), MIN(ts), MAX(ts)
+                    FROM weather
+                    GROUP BY location
+                """)
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS weather_new (
+                        timestamp TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        location_id INTEGER NOT NULL REFERENCES locations(id),
+                        temperature REAL NOT NULL,
+                        humidity REAL NOT NULL,
+                        condition TEXT NOT NULL,
+                        wind_speed REAL NOT NULL
+                    )
+                """)
 
-            # Return None if no data found
-            # Handling of missing data
-            if row is None:
-                return None
+            # OR IGNORE skips rows already copied by an interrupted run
+            low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM weather").fetchone()
+            if low is not None:
+                for first in range(low, high + 1, MIGRATION_BATCH_SIZE):
+                    with conn:
+                        conn.execute("""
+                            INSERT OR IGNORE INTO weather_new
+                            (rowid, timestamp, ts, location_id, temperature,
+                             humidity, condition, wind_speed)
+                            SELECT w.rowid, w.timestamp, w.ts, l.id, w.temperature,
+                                   w.humidity, w.condition, w.wind_speed
+                            FROM weather w JOIN locations l ON l.name = w.location
+                            WHERE w.rowid >= ? AND w.rowid < ?
+                        """, (first, first + MIGRATION_BATCH_SIZE))
 
-            # Convert database row to WeatherData object
+            # Swap tables; dropping weather also drops its old trigger
+            with conn:
+                conn.execute("DROP TABLE weather")
+                conn.execute("ALTER TABLE weather_new RENAME TO weather")
 
-            return WeatherData.from_dict(dict(row))
+        with conn:
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_location_ts
+                ON weather(location_id, ts)
+            """)
 
-    def get_historical(
-            self,
-            location: str,
-            start: Optional[datetime] = None,
-            end: Optional[datetime] = None,
-            limit: int = 100
-    ) -> List[WeatherData]:
+            # Rebuild weather_latest keyed by location_id
+            conn.execute("DROP TRIGGER IF EXISTS trg_weather_latest")
+            conn.execute("DROP TABLE IF EXISTS weather_latest")
+            conn.execute("""
+                CREATE TABLE weather_latest (
+                    location_id INTEGER PRIMARY KEY REFERENCES locations(id),
+                    timestamp TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    temperature REAL NOT NULL,
+                    humidity REAL NOT NULL,
+                    condition TEXT NOT NULL,
+                    wind_speed REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                INSERT INTO weather_latest
+                (location_id, timestamp, ts, temperature, humidity, condition, wind_speed)
+                SELECT location_id, timestamp, MAX(ts), temperature, humidity,
+                       condition, wind_speed
+                FROM weather
+                GROUP BY location_id
+            """)
+
+            # One trigger maintains both the latest reading and the
+            # per-location statistics for every insert
+            conn.execute("""
+                CREATE TRIGGER trg_weather_latest
+                AFTER INSERT ON weather
+                BEGIN
+                    UPDATE locations SET
+                        reading_count = reading_count + 1,
+                        first_ts = MIN(COALESCE(first_ts, NEW.ts), NEW.ts),
+                        last_ts = MAX(COALESCE(last_ts, NEW.ts), NEW.ts)
+                    WHERE id = NEW.location_id;
+
+                    INSERT INTO weather_latest
+                    (location_id, timestamp, ts, temperature, humidity, condition, wind_speed)
+                    VALUES (NEW.location_id, NEW.timestamp, NEW.ts, NEW.temperature,
+                            NEW.humidity, NEW.condition, NEW.wind_speed)
+                    ON CONFLICT(location_id) DO UPDATE SET
+                        timestamp = excluded.timestamp,
+                        ts = excluded.ts,
+                        temperature = excluded.temperature,
+                        humidity = excluded.humidity,
+                        condition = excluded.condition,
+                        wind_speed = excluded.wind_speed
+                    WHERE excluded.ts >= weather_latest.ts;
+                END
+            """)
+
+    def _migrate_rollup_tables(self, conn: sqlite3.Connection) -> None:
         """
-        Get historical weather readings for a location.
+        Version 5: add hourly/daily rollup tables maintained on insert.
+
+        Existing history is not summarised here because that can take a
+        long time on large files; run backfill_rollups() (or
+        scripts/backfill_rollups.py) once after upgrading.
+        """
+        measure_columns = ",\n".join(
+            f"{name}_min REAL NOT NULL, {name}_max REAL NOT NULL, {name}_sum REAL NOT NULL"
+            for name in ROLLUP_MEASURES
+        )
+        with conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS weather_rollup (
+                    location_id INTEGER NOT NULL REFERENCES locations(id),
+                    granularity TEXT NOT NULL,
+                    bucket_ts INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    {measure_columns},
+                    PRIMARY KEY (location_id, granularity, bucket_ts)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_rollup_condition (
+                    location_id INTEGER NOT NULL REFERENCES locations(id),
+                    granularity TEXT NOT NULL,
+                    bucket_ts INTEGER NOT NULL,
+                    condition TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (location_id, granularity, bucket_ts, condition)
+                ) WITHOUT ROWID
+            """)
+
+            # One upsert per granularity into each table
+            statements = []
+            for granularity, size in ROLLUP_GRANULARITIES.items():
+                bucket = f"NEW.ts - NEW.ts % {size}"
+                names = ", ".join(
+                    f"{name}_min, {name}_max, {name}_sum" for name in ROLLUP_MEASURES
+                )
+                values = ", ".join(
+                    f"NEW.{name}, NEW.{name}, NEW.{name}" for name in ROLLUP_MEASURES
+                )
+                updates = ",\n".join(
+                    f"{name}_min = MIN({name}_min, excluded.{name}_min), "
+                    f"{name}_max = MAX({name}_max, excluded.{name}_max), "
+                    f"{name}_sum = {name}_sum + excluded.{name}_sum"
+                    for name in ROLLUP_MEASURES
+                )
+                statements.append(f"""
+                    INSERT INTO weather_rollup
+                    (location_id, granularity, bucket_ts, count, {names})
+                    VALUES (NEW.location_id, '{granularity}', {bucket}, 1, {values})
+                    ON CONFLICT(location_id, granularity, bucket_ts) DO UPDATE SET
+                        count = count + 1,
+                        {updates};
+                """)
+                statements.append(f"""
+                    INSERT INTO weather_rollup_condition
+                    (location_id, granularity, bucket_ts, condition, count)
+                    VALUES (NEW.location_id, '{granularity}', {bucket}, NEW.condition, 1)
+                    ON CONFLICT(location_id, granularity, bucket_ts, condition)
+                    DO UPDATE SET count = count + 1;
+                """)
+
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_weather_rollup
+                AFTER INSERT ON weather
+                BEGIN
+                    {"".join(statements)}
+                END
+            """)
+
+    def _migrate_location_versions(self, conn: sqlite3.Connection) -> None:
+        """
+        Version 6: add a per-location data version and modification time.
+
+        Every insert bumps version and sets modified_ms (wall-clock epoch
+        milliseconds, UTC), which back HTTP ETag/Last-Modified validators.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(locations)")]
+        with conn:
+            if "version" not in columns:
+                conn.execute(
+                    "ALTER TABLE locations ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+                )
+            if "modified_ms" not in columns:
+                conn.execute("ALTER TABLE locations ADD COLUMN modified_ms INTEGER")
+                conn.execute(f"UPDATE locations SET modified_ms = {NOW_MS_SQL}")
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_weather_version
+                AFTER INSERT ON weather
+                BEGIN
+                    UPDATE locations SET
+                        version = version + 1,
+                        modified_ms = {NOW_MS_SQL}
+                    WHERE id = NEW.location_id;
+                END
+            """)
+
+    def _migrate_jobs_table(self, conn: sqlite3.Connection) -> None:
+        """
+        Version 7: add jobs table tracking background work.
+
+        Job state lives in the database rather than in memory so any
+        gunicorn worker can report on or cancel a job running in another.
+        Times are epoch milliseconds (UTC).
+        """
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_ms INTEGER NOT NULL,
+                    started_ms INTEGER,
+                    finished_ms INTEGER
+                )
+            """)
+
+    def _migrate_autoincrement_ids(self, conn: sqlite3.Connection) -> None:
+        """
+        Version 8: never reuse the rowid of a deleted reading.
+
+        Without AUTOINCREMENT SQLite hands out MAX(rowid) + 1, so once
+        retention deletes the newest reading its rowid comes back, and
+        SSE clients resuming from Last-Event-ID would skip the new
+        reading. The weather table is rebuilt with an AUTOINCREMENT id
+        (an alias for rowid, so rowids are preserved) and copied in rowid
+        batches; its indexes and triggers are recreated on the new table.
+        """
+        table_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'weather'"
+        ).fetchone()[0]
+        if "AUTOINCREMENT" in table_sql.upper():
+            return
+
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_new (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    location_id INTEGER NOT NULL REFERENCES locations(id),
+                    temperature REAL NOT NULL,
+                    humidity REAL NOT NULL,
+                    condition TEXT NOT NULL,
+                    wind_speed REAL NOT NULL
+                )
+            """)
+
+        copy_sql = """
+            INSERT OR IGNORE INTO weather_new
+            (id, timestamp, ts, location_id, temperature, humidity, condition, wind_speed)
+            SELECT rowid, timestamp, ts, location_id, temperature, humidity,
+                   condition, wind_speed
+            FROM weather WHERE rowid >= ?
+        """
+        # OR IGNORE skips rows already copied by an interrupted run
+        low, high = conn.execute("SELECT MIN(rowid), MAX(rowid) FROM weather").fetchone()
+        if low is not None:
+            for first in range(low, high + 1, MIGRATION_BATCH_SIZE):
+                with conn:
+                    conn.execute(copy_sql + " AND rowid < ?", (first, first + MIGRATION_BATCH_SIZE))
+
+        # Swap tables in one transaction, picking up readings written
+        # during the copy; dropping weather also drops its indexes and
+        # triggers, so they are recreated from their saved definitions
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(copy_sql, ((high or 0) + 1,))
+            objects = [row[0] for row in conn.execute("""
+                SELECT sql FROM sqlite_master
+                WHERE type IN ('index', 'trigger') AND tbl_name = 'weather' AND sql IS NOT NULL
+                ORDER BY type
+            """)]
+            conn.execute("DROP TABLE weather")
+            conn.execute("ALTER TABLE weather_new RENAME TO weather")
+            for sql in objects:
+                conn.execute(sql)
+
+    @timed()
+    def backfill_rollups(self, location: Optional[str] = None) -> int:
+        """
+        Recompute rollups from the weather table.
+
+        Buckets are rebuilt one BACKFILL_WINDOW_MS window at a time, each in
+        its own transaction, so ingestion keeps running during a backfill
+        of a large database. Safe to run repeatedly.
 
         Args:
-            location: City or region name
-            start: Start datetime (optional)
-            end: End datetime (optional)
-            limit: Maximum number of records to return
+            location: Only rebuild this location (optional, defaults to all)
 
         Returns:
-            List of WeatherData objects, newest first
+            Number of readings summarised
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        conn = self._get_connection()
 
-            # Build query dynamically based on parameters
+        query = "SELECT id, name, first_ts, last_ts FROM locations WHERE reading_count > 0"
+        params = []
+        if location is not None:
+            query += " AND name = ?"
+            params.append(location)
+        ranges = conn.execute(query, params).fetchall()
 
-            query = "SELECT * FROM weather WHERE location = ?"
-            params = [location]
+        aggregates = ", ".join(
+            f"MIN({name}), MAX({name}), SUM({name})" for name in ROLLUP_MEASURES
+        )
+        names = ", ".join(
+            f"{name}_min, {name}_max, {name}_sum" for name in ROLLUP_MEASURES
+        )
 
-            # Add date filters if provided
+        summarised = 0
+        for location_id, name, first_ts, last_ts in ranges:
+            day = ROLLUP_GRANULARITIES["day"]
+            window_start = first_ts - first_ts % day
+            while window_start <= last_ts:
+                window = (location_id, window_start, window_start + BACKFILL_WINDOW_MS)
+                with conn:
+                    # Replace whatever the trigger produced in this window
+                    for table in ("weather_rollup", "weather_rollup_condition"):
+                        conn.execute(f"""
+                            DELETE FROM {table}
+                            WHERE location_id = ? AND bucket_ts >= ? AND bucket_ts < ?
+                        """, window)
 
-            if start:
-                query += " AND timestamp >= ?"
-                params.append(start.isoformat())
+                    for granularity, size in ROLLUP_GRANULARITIES.items():
+                        conn.execute(f"""
+                            INSERT INTO weather_rollup
+                            (location_id, granularity, bucket_ts, count, {names})
+                            SELECT location_id, ?, ts - ts % {size}, COUNT(*), {aggregates}
+                            FROM weather
+                            WHERE location_id = ? AND ts >= ? AND ts < ?
+                            GROUP BY ts - ts % {size}
+                        """, (granularity, *window))
+                        conn.execute(f"""
+                            INSERT INTO weather_rollup_condition
+                            (location_id, granularity, bucket_ts, condition, count)
+                            SELECT location_id, ?, ts - ts % {size}, condition, COUNT(*)
+                            FROM weather
+                            WHERE location_id = ? AND ts >= ? AND ts < ?
+                            GROUP BY ts - ts % {size}, condition
+                        """, (granularity, *window))
 
-            if end:
-                query += " AND timestamp <= ?"
-                params.append(end.isoformat())
+                    summarised += conn.execute("""
+                        SELECT COUNT(*) FROM weather
+                        WHERE location_id = ? AND ts >= ? AND ts < ?
+                    """, window).fetchone()[0]
 
-            # Order by newest first and limit results
+                    # Aggregates changed, so ETags and cached results are stale
+                    conn.execute(f"""
+                        UPDATE locations
+                        SET version = version + 1, modified_ms = {NOW_MS_SQL}
+                        WHERE id = ?
+                    """, (location_id,))
+                self._invalidate_cached(name)
+                window_start += BACKFILL_WINDOW_MS
+        return summarised
 
-            query += " ORDER BY timestamp DESC LIMIT ?"
-            params.append(limit)
+    @staticmethod
+    def _trim_rollups(conn: sqlite3.Connection, location_id: int, oldest_ts: int) -> None:
+        """
+        Fix a location's rollups after deleting every reading before oldest_ts.
 
-            cursor = conn.execute(query, params)
-            rows = cursor.fetchall()
+        Buckets that end before oldest_ts are now empty and are dropped.
+        The hourly bucket holding oldest_ts is recomputed from its
+        remaining readings, and coarser buckets from the hourly ones, so
+        the cost doesn't grow with how many readings a day holds. Must run
+        inside a write transaction.
 
-            # Convert all rows to WeatherData objects
+        Args:
+            conn: Connection holding the write transaction
+            location_id: Location whose readings were deleted
+            oldest_ts: ts of the newest deleted reading; nothing older remains
+        """
+        hour = ROLLUP_GRANULARITIES["hour"]
+        hour_start = oldest_ts - oldest_ts % hour
+        names = ", ".join(
+            f"{name}_min, {name}_max, {name}_sum" for name in ROLLUP_MEASURES
+        )
+        aggregates = ", ".join(
+            f"MIN({name}), MAX({name}), SUM({name})" for name in ROLLUP_MEASURES
+        )
+        rollups = ", ".join(
+            f"MIN({name}_min), MAX({name}_max), SUM({name}_sum)" for name in ROLLUP_MEASURES
+        )
 
-            return [WeatherData.from_dict(dict(row)) for row in rows]
+        for granularity, size in ROLLUP_GRANULARITIES.items():
+            bucket_start = oldest_ts - oldest_ts % size
+            for table in ("weather_rollup", "weather_rollup_condition"):
+                conn.execute(f"""
+                    DELETE FROM {table}
+                    WHERE location_id = ? AND granularity = ? AND bucket_ts <= ?
+                """, (location_id, granularity, bucket_start))
 
-    def get_all_locations(self) -> List[str]:
+            if granularity == "hour":
+                window = (location_id, hour_start, hour_start + hour)
+                conn.execute(f"""
+                    INSERT INTO weather_rollup
+                    (location_id, granularity, bucket_ts, count, {names})
+                    SELECT location_id, 'hour', ?, COUNT(*), {aggregates}
+                    FROM weather
+                    WHERE location_id = ? AND ts >= ? AND ts < ?
+                    GROUP BY location_id
+                """, (hour_start, *window))
+                conn.execute("""
+                    INSERT INTO weather_rollup_condition
+                    (location_id, granularity, bucket_ts, condition, count)
+                    SELECT location_id, 'hour', ?, condition, COUNT(*)
+                    FROM weather
+                    WHERE location_id = ? AND ts >= ? AND ts < ?
+                    GROUP BY condition
+                """, (hour_start, *window))
+                continue
+
+            # Hourly buckets are already fixed; roll them up
+            window = (location_id, bucket_start, bucket_start + size)
+            conn.execute(f"""
+                INSERT INTO weather_rollup
+                (location_id, granularity, bucket_ts, count, {names})
+                SELECT location_id, ?, ?, SUM(count), {rollups}
+                FROM weather_rollup
+                WHERE location_id = ? AND granularity = 'hour'
+                  AND bucket_ts >= ? AND bucket_ts < ?
+                GROUP BY location_id
+            """, (granularity, bucket_start, *window))
+            conn.execute("""
+                INSERT INTO weather_rollup_condition
+                (location_id, granularity, bucket_ts, condition, count)
+                SELECT location_id, ?, ?, condition, SUM(count)
+                FROM weather_rollup_condition
+                WHERE location_id = ? AND granularity = 'hour'
+                  AND bucket_ts >= ? AND bucket_ts < ?
+                GROUP BY condition
+            """, (granularity, bucket_start, *window))
+
+    @contextmanager
+    def _bulk_load(self, conn: sqlite3.Connection):
         """
-        Get list of all locations with weather data.
+        Suspend weather insert triggers and apply their effects set-based.
 
-        Returns:
-            List of unique location names
+        Must be used inside an open write transaction. Per-row triggers
+        cost several upserts per reading; for large loads it is much faster
+        to drop them, insert, then update locations, weather_latest and the
+        rollups with one grouped statement each. Dropping the triggers is
+        part of the same transaction, so other connections never see them
+        missing.
+
+        Args:
+            conn: Connection holding the write transaction
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                SELECT DISTINCT location FROM weather
-                ORDER BY location
-            """)
-            # Extract first column from each row
+        after_rowid = self._max_rowid(conn)
+        triggers = self._drop_weather_objects(conn, "trigger")
+
+        yield
+
+        self._apply_derived(conn, after_rowid, self._max_rowid(conn))
+        for sql in triggers:
+            conn.execute(sql)
 
-            return [row[0] for row in cursor.fetchall()]
+    @staticmethod
+    def _max_rowid(conn: sqlite3.Connection) -> int:
+        """
+        Get the largest rowid in weather (0 when empty).
+        """
+        return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM weather").fetchone()[0]
+
+    @staticmethod
+    def _drop_weather_objects(conn: sqlite3.Connection, kind: str) -> List[str]:
+        """
+        Drop the weather table's triggers or indexes.
+
+        Args:
+            conn: Connection holding a write transaction
+            kind: "trigger" or "index"
+
+        Returns:
+            CREATE statements that restore the dropped objects
+        """
+        # Automatic indexes (e.g. for UNIQUE constraints) have no SQL
+        objects = conn.execute("""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = ? AND tbl_name = 'weather' AND sql IS NOT NULL
+        """, (kind,)).fetchall()
+        for name, _ in objects:
+            conn.execute(f"DROP {kind.upper()} {name}")
+        return [sql for _, sql in objects]
+
+    @timed()
+    def bulk_load(
+            self,
+            batches: Iterable[WeatherColumns],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            on_batch: Optional[Callable[[int], None]] = None
+    ) -> int:
+        """
+        Load many column batches into the database as fast as possible.
+
+        Intended for building large synthetic databases while no API or
+        scheduler is writing. Indexes and insert triggers on weather are
+        dropped for the duration, each batch is committed separately with
+        synchronous=OFF, derived tables are updated set-based per batch,
+        and the indexes and triggers are rebuilt at the end, also when the
+        load raises. Their CREATE statements are recorded in pending_ddl
+        in the same transaction that drops them, so if the process is
+        killed mid-load the next repository opened on the file rebuilds
+        them. The schema lock is held throughout so that rebuild can't
+        happen under a load that is still running.
+
+        Args:
+            batches: WeatherColumns batches, e.g. from a process pool
+            chunk_size: Number of rows passed to each executemany call
+            on_batch: Called with the running row total after each commit
+
+        Returns:
+            Number of rows loaded
+        """
+        loaded = 0
+
+        # Dedicated connection: pragma changes don't leak into the pool
+        conn = self._connect()
+        conn.execute("PRAGMA synchronous=OFF")
+        try:
+            with self._schema_lock():
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    indexes = self._drop_weather_objects(conn, "index")
+                    triggers = self._drop_weather_objects(conn, "trigger")
+                    # Durable record of what to rebuild if we never get to it
+                    conn.execute("CREATE TABLE IF NOT EXISTS pending_ddl (sql TEXT NOT NULL)")
+                    conn.executemany(
+                        "INSERT INTO pending_ddl (sql) VALUES (?)",
+                        [(sql,) for sql in indexes + triggers]
+                    )
+
+                try:
+                    for columns in batches:
+                        with conn:
+                            conn.execute("BEGIN IMMEDIATE")
+                            location_ids = [
+                                self._get_location_id(conn, name) for name in columns.locations
+                            ]
+                            after_rowid = self._max_rowid(conn)
+                            self._insert_columns(conn, columns, location_ids, chunk_size)
+                            self._apply_derived(conn, after_rowid, self._max_rowid(conn))
+                        loaded += len(columns)
+                        if on_batch is not None:
+                            on_batch(loaded)
+                finally:
+                    # Rebuilding the index once is much cheaper than
+                    # maintaining it row by row during the load
+                    with conn:
+                        conn.execute("BEGIN IMMEDIATE")
+                        self._restore_pending_ddl(conn)
+        except Exception:
+            # New location ids may have been rolled back with a batch
+            self._location_ids.clear()
+            raise
+        finally:
+            conn.close()
+            self._invalidate_cached()
+        self._notify_write()
+        return loaded
+
+    def _apply_derived(
+            self,
+            conn: sqlite3.Connection,
+            after_rowid: int,
+            last_rowid: int
+    ) -> None:
+        """
+        Fold readings in a rowid range into the derived tables.
+
+        Equivalent to what the insert triggers would have done row by row.
+        New readings are scanned twice (into hourly summaries and hourly
+        condition counts); everything else is derived from those small
+        temp tables.
+
+        Args:
+            conn: Connection holding the write transaction
+            after_rowid: Readings with a larger rowid are new
+            last_rowid: rowid of the last new reading
+        """
+        hour = ROLLUP_GRANULARITIES["hour"]
+        names = ", ".join(
+            f"{name}_min, {name}_max, {name}_sum" for name in ROLLUP_MEASURES
+        )
+        aggregates = ", ".join(
+            f"MIN({name}) AS {name}_min, MAX({name}) AS {name}_max, SUM({name}) AS {name}_sum"
+            for name in ROLLUP_MEASURES
+        )
+        rollups = ", ".join(
+            f"MIN({name}_min), MAX({name}_max), SUM({name}_sum)" for name in ROLLUP_MEASURES
+        )
+        updates = ",\n".join(
+            f"{name}_min = MIN({name}_min, excluded.{name}_min), "
+            f"{name}_max = MAX({name}_max, excluded.{name}_max), "
+            f"{name}_sum = {name}_sum + excluded.{name}_sum"
+            for name in ROLLUP_MEASURES
+        )
+
+        conn.execute("DROP TABLE IF EXISTS temp.new_hourly")
+        conn.execute("DROP TABLE IF EXISTS temp.new_conditions")
+        conn.execute(f"""
+            CREATE TEMP TABLE new_hourly AS
+            SELECT location_id, ts - ts % {hour} AS bucket_ts, COUNT(*) AS count,
+                   MIN(ts) AS first_ts, MAX(ts) AS last_ts, {aggregates}
+            FROM weather WHERE rowid > ? AND rowid <= ?
+            GROUP BY location_id, ts - ts % {hour}
+        """, (after_rowid, last_rowid))
+        conn.execute(f"""
+            CREATE TEMP TABLE new_conditions AS
+            SELECT location_id, ts - ts % {hour} AS bucket_ts, condition, COUNT(*) AS count
+            FROM weather WHERE rowid > ? AND rowid <= ?
+            GROUP BY location_id, ts - ts % {hour}, condition
+        """, (after_rowid, last_rowid))
+
+        conn.execute(f"""
+            UPDATE locations SET
+                version = locations.version + 1,
+                modified_ms = {NOW_MS_SQL},
+                reading_count = locations.reading_count + new.count,
+                first_ts = MIN(COALESCE(locations.first_ts, new.first_ts), new.first_ts),
+                last_ts = MAX(COALESCE(locations.last_ts, new.last_ts), new.last_ts)
+            FROM (
+                SELECT location_id, SUM(count) AS count,
+                       MIN(first_ts) AS first_ts, MAX(last_ts) AS last_ts
+                FROM new_hourly
+                GROUP BY location_id
+            ) AS new
+            WHERE locations.id = new.location_id
+        """)
+
+        # Newest new reading per location: take the newest ts from the
+        # hourly summaries, then the last-inserted row with that ts
+        # (matching the trigger, where the last insert wins ties). Only the
+        # new rowid range is read, so this works without idx_location_ts
+        conn.execute("""
+            INSERT INTO weather_latest
+            (location_id, timestamp, ts, temperature, humidity, condition, wind_speed)
+            SELECT w.location_id, w.timestamp, w.ts, w.temperature, w.humidity,
+                   w.condition, w.wind_speed
+            FROM (
+                SELECT MAX(w.rowid) AS id
+                FROM (
+                    SELECT location_id, MAX(last_ts) AS ts FROM new_hourly
+                    GROUP BY location_id
+                ) AS new
+                JOIN weather w ON w.location_id = new.location_id AND w.ts = new.ts
+                WHERE w.rowid > ? AND w.rowid <= ?
+                GROUP BY new.location_id
+            ) AS newest
+            JOIN weather w ON w.rowid = newest.id
+            WHERE true
+            ON CONFLICT(location_id) DO UPDATE SET
+                timestamp = excluded.timestamp,
+                ts = excluded.ts,
+                temperature = excluded.temperature,
+                humidity = excluded.humidity,
+                condition = excluded.condition,
+                wind_speed = excluded.wind_speed
+            WHERE excluded.ts >= weather_latest.ts
+        """, (after_rowid, last_rowid))
+
+        # Coarser buckets are rolled up from the hourly summaries
+        for granularity, size in ROLLUP_GRANULARITIES.items():
+            conn.execute(f"""
+                INSERT INTO weather_rollup
+                (location_id, granularity, bucket_ts, count, {names})
+                SELECT location_id, ?, bucket_ts - bucket_ts % {size}, SUM(count), {rollups}
+                FROM new_hourly
+                GROUP BY location_id, bucket_ts - bucket_ts % {size}
+                ON CONFLICT(location_id, granularity, bucket_ts) DO UPDATE SET
+                    count = count + excluded.count,
+                    {updates}
+            """, (granularity,))
+            conn.execute(f"""
+                INSERT INTO weather_rollup_condition
+                (location_id, granularity, bucket_ts, condition, count)
+                SELECT location_id, ?, bucket_ts - bucket_ts % {size}, condition, SUM(count)
+                FROM new_conditions
+                GROUP BY location_id, bucket_ts - bucket_ts % {size}, condition
+                ON CONFLICT(location_id, granularity, bucket_ts, condition) DO UPDATE SET
+                    count = count + excluded.count
+            """, (granularity,))
+
+        conn.execute("DROP TABLE temp.new_hourly")
+        conn.execute("DROP TABLE temp.new_conditions")
+
+    def _check_external_writes(self, conn: sqlite3.Connection) -> None:
+        """
+        Clear cached reads if another connection committed since last check.
+
+        PRAGMA data_version changes whenever a different connection (in
+        this or another process) commits, and costs no table access.
+        Only locations whose version moved are then invalidated, so a
+        write to one location keeps the others cached.
+
+        Args:
+            conn: Calling thread's pooled connection
+        """
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if getattr(self._local, "data_version", None) == version:
+            return
+        self._local.data_version = version
+
+        # Small dimension table: one row per location
+        current = dict(conn.execute("SELECT name, version FROM locations"))
+        known, self._known_versions = self._known_versions, current
+        if known is None:
+            self._invalidate_cached()
+            return
+        for name, location_version in current.items():
+            if known.get(name) != location_version:
+                self._invalidate_cached(name)
+        # Rows may also have been removed from locations entirely
+        for name in known.keys() - current.keys():
+            self._invalidate_cached(name)
+
+    def _invalidate_cached(self, location: Optional[str] = None) -> None:
+        """
+        Drop cached reads for one location, or all of them.
+
+        Bumping the generation stops a read that raced with this write
+        from caching the result it fetched before the write.
+
+        Args:
+            location: Location to drop (optional, defaults to all)
+        """
+        self._cache_generation += 1
+        self._query_cache.invalidate(location)
+        if location is None:
+            self._version_cache.clear()
+        else:
+            self._version_cache.pop(location, None)
+            # The all-locations version covers every location
+            self._version_cache.pop(None, None)
+
+    def _cache_result(
+            self,
+            key: tuple,
+            value,
+            location: Optional[str],
+            generation: int
+    ) -> None:
+        """
+        Cache a query result unless a write happened while it was read.
+
+        Args:
+            key: Normalized query key
+            value: Result to cache
+            location: Location the result depends on (None for all)
+            generation: Cache generation seen before the query ran
+        """
+        if generation == self._cache_generation:
+            self._query_cache.put(key, value, location)
+
+    def cache_stats(self) -> dict:
+        """
+        Get query cache counters for monitoring.
+
+        Returns:
+            Dictionary with size, entry count and hit/miss/eviction counters
+        """
+        return self._query_cache.stats()
+
+    def add_write_listener(self, callback: Callable[[], None]) -> None:
+        """
+        Register a callback to run after each committed write.
+
+        Callbacks run on the writing thread, so they should only signal
+        other work (e.g. wake a poller), not do it.
+
+        Args:
+            callback: Function called with no arguments
+        """
+        self._write_listeners.append(callback)
+
+    def _notify_write(self) -> None:
+        """
+        Run write listeners; a failing listener never fails the write.
+        """
+        for callback in self._write_listeners:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Write listener failed")
+
+    def _find_location_id(self, conn: sqlite3.Connection, location: str) -> Optional[int]:
+        """
+        Look up a location's id without creating it.
+
+        Args:
+            conn: Calling thread's pooled connection
+            location: City or region name
+
+        Returns:
+            locations.id or None if the location was never stored
+        """
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            row = conn.execute(
+                "SELECT id FROM locations WHERE name = ?", (location,)
+            ).fetchone()
+            if row is None:
+                return None
+            location_id = self._location_ids[location] = row[0]
+        return location_id
+
+    def _get_location_id(self, conn: sqlite3.Connection, location: str) -> int:
+        """
+        Get a location's id, inserting it into locations on first use.
+
+        Must be called inside the write transaction; the caller clears the
+        id map if that transaction rolls back.
+
+        Args:
+            conn: Calling thread's pooled connection
+            location: City or region name
+
+        Returns:
+            locations.id for the name
+        """
+        location_id = self._find_location_id(conn, location)
+        if location_id is None:
+            location_id = conn.execute("""
+                INSERT INTO locations (name) VALUES (?)
+                ON CONFLICT(name) DO UPDATE SET name = excluded.name
+                RETURNING id
+            """, (location,)).fetchone()[0]
+            self._location_ids[location] = location_id
+        return location_id
+
+    def _to_row(self, conn: sqlite3.Connection, weather: WeatherData) -> tuple:
+        """
+        Convert WeatherData to INSERT_WEATHER_SQL parameters.
+        """
+        return (
+            weather.timestamp.isoformat(),  # Convert datetime to string
+            to_epoch_ms(weather.timestamp),  # Sortable numeric timestamp
+            self._get_location_id(conn, weather.location),
+            weather.temperature,
+            weather.humidity,
+            weather.condition,
+            weather.wind_speed
+        )
+
+    @timed(rows=lambda _: 1)
+    def save(self, weather: WeatherData) -> None:
+        """
+        Save weather data to database.
+
+        Args:
+            weather: WeatherData object to save
+        """
+        conn = self._get_connection()
+        try:
+            # Connection context manager wraps the insert in a transaction
+            with conn:
+                # Use parameterized query to prevent SQL injection
+                conn.execute(INSERT_WEATHER_SQL, self._to_row(conn, weather))
+        except Exception:
+            # A new location id may have been rolled back with the insert
+            self._location_ids.clear()
+            raise
+        self._invalidate_cached(weather.location)
+        self._notify_write()
+
+    @timed()
+    def save_many(
+            self,
+            weather_list: Iterable[WeatherData],
+            chunk_size: int = DEFAULT_CHUNK_SIZE,
+            bulk: bool = False
+    ) -> int:
+        """
+        Save many weather readings in a single transaction.
+
+        Rows are streamed through executemany in chunks, so any iterable
+        (including generators) can be stored without building one big list.
+
+        Args:
+            weather_list: WeatherData objects to save
+            chunk_size: Number of rows passed to each executemany call
+            bulk: Suspend per-row triggers and update derived tables
+                set-based after the insert; several times faster for
+                thousands of rows, slower for a handful
+
+        Returns:
+            Number of rows saved
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        saved = 0
+        conn = self._get_connection()
+        written = set()
+
+        def to_rows():
+            # Convert objects to parameter tuples lazily, noting which
+            # locations need their cached reads dropped
+            for weather in weather_list:
+                written.add(weather.location)
+                yield self._to_row(conn, weather)
+
+        rows = to_rows()
+
+        try:
+            # One transaction (and one commit) for the whole batch;
+            # any failure rolls back every chunk
+            with conn:
+                if bulk:
+                    # _bulk_load relies on no other writer adding rows
+                    conn.execute("BEGIN IMMEDIATE")
+                with self._bulk_load(conn) if bulk else nullcontext():
+                    while True:
+                        chunk = list(islice(rows, chunk_size))
+                        if not chunk:
+                            break
+                        conn.executemany(INSERT_WEATHER_SQL, chunk)
+                        saved += len(chunk)
+        except Exception:
+            # New location ids may have been rolled back with the batch
+            self._location_ids.clear()
+            raise
+        for location in written:
+            self._invalidate_cached(location)
+        if saved:
+            self._notify_write()
+        return saved
+
+    @timed()
+    def save_columns(
+            self,
+            columns: WeatherColumns,
+            chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> int:
+        """
+        Save a column-oriented batch in a single transaction.
+
+        Timestamps are formatted and codes mapped to ids once per chunk
+        with NumPy/list operations, so no WeatherData objects are built,
+        and derived tables are updated set-based after the insert instead
+        of by per-row triggers.
+
+        Args:
+            columns: Batch from WeatherGenerator.generate_columns
+            chunk_size: Number of rows passed to each executemany call
+
+        Returns:
+            Number of rows saved
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        conn = self._get_connection()
+        try:
+            with conn:
+                # Take the write lock up front; _bulk_load relies on no
+                # other writer adding rows until commit
+                conn.execute("BEGIN IMMEDIATE")
+
+                # Resolve each distinct name once instead of once per row
+                location_ids = [
+                    self._get_location_id(conn, name) for name in columns.locations
+                ]
+
+                with self._bulk_load(conn):
+                    self._insert_columns(conn, columns, location_ids, chunk_size)
+        except Exception:
+            # New location ids may have been rolled back with the batch
+            self._location_ids.clear()
+            raise
+        for location in columns.locations:
+            self._invalidate_cached(location)
+        self._notify_write()
+        return len(columns)
+
+    @staticmethod
+    def _insert_columns(
+            conn: sqlite3.Connection,
+            columns: WeatherColumns,
+            location_ids: List[int],
+            chunk_size: int
+    ) -> None:
+        """
+        Insert a column batch through executemany, one chunk at a time.
+
+        Args:
+            conn: Connection holding the write transaction
+            columns: Batch to insert
+            location_ids: locations.id for each entry of columns.locations
+            chunk_size: Number of rows passed to each executemany call
+        """
+        import numpy as np
+
+        for first in range(0, len(columns), chunk_size):
+            window = slice(first, first + chunk_size)
+            ts = columns.ts[window]
+            timestamps = np.datetime_as_string(
+                ts.astype("datetime64[ms]"), unit="us"
+            ).tolist()
+            rows = zip(
+                timestamps,
+                ts.tolist(),
+                [location_ids[code] for code in columns.location_codes[window].tolist()],
+                columns.temperature[window].tolist(),
+                columns.humidity[window].tolist(),
+                [columns.conditions[code] for code in columns.condition_codes[window].tolist()],
+                columns.wind_speed[window].tolist()
+            )
+            conn.executemany(INSERT_WEATHER_SQL, rows)
+
+    @timed()
+    def get_latest(self, location: str) -> Optional[WeatherData]:
+        """
+        Get most recent weather reading for a location.
+
+        Args:
+            location: City or region name
+
+        Returns:
+            Most recent WeatherData or None if no data exists
+        """
+        # Pooled connections use sqlite3.Row, so rows act like dicts
+        conn = self._get_connection()
+
+        # Serve from cache unless the database changed underneath us
+        self._check_external_writes(conn)
+        key = ('latest', location)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        location_id = self._find_location_id(conn, location)
+        if location_id is None:
+            return None
+
+        # Primary-key lookup, independent of history size
+        # Row factory converts the database row to a WeatherData object
+        cursor = self._weather_cursor(conn)
+        cursor.execute(f"""
+            SELECT {WEATHER_COLUMNS} FROM weather_latest
+            WHERE location_id = ?
+        """, (location, location_id))
+
+        weather = cursor.fetchone()
+
+        # Return None if no data found
+        # Handling of missing data
+        if weather is None:
+            return None
+
+        self._cache_result(key, weather, location, generation)
+        return weather
+
+    @timed()
+    def get_latest_many(
+            self,
+            locations: Optional[List[str]] = None
+    ) -> Dict[str, WeatherData]:
+        """
+        Get the most recent reading for several locations at once.
+
+        Cached readings are reused and every remaining location is
+        fetched from weather_latest with a single query.
+
+        Args:
+            locations: City or region names (optional, defaults to all)
+
+        Returns:
+            Dictionary of location name to latest WeatherData, in request
+            order (name order for all locations); locations without data
+            are left out
+        """
+        conn = self._get_connection()
+        self._check_external_writes(conn)
+        generation = self._cache_generation
+
+        query = """
+            SELECT w.timestamp, l.name, w.temperature, w.humidity,
+                   w.condition, w.wind_speed
+            FROM weather_latest w JOIN locations l ON l.id = w.location_id
+        """
+
+        if locations is None:
+            key = ('latest_all',)
+            cached = self._query_cache.get(key)
+            if cached is not None:
+                return cached
+            cursor = self._weather_cursor(conn)
+            latest = {
+                weather.location: weather
+                for weather in cursor.execute(query + " ORDER BY l.name")
+            }
+            self._cache_result(key, latest, None, generation)
+            return latest
+
+        # Preserve request order and drop duplicate names
+        found = {}
+        missing = []
+        for location in dict.fromkeys(locations):
+            cached = self._query_cache.get(('latest', location))
+            if cached is not None:
+                found[location] = cached
+            else:
+                missing.append(location)
+
+        if missing:
+            # One indexed lookup per name on locations, then a
+            # primary-key lookup on weather_latest
+            placeholders = ", ".join("?" * len(missing))
+            cursor = self._weather_cursor(conn)
+            cursor.execute(query + f" WHERE l.name IN ({placeholders})", missing)
+            for weather in cursor:
+                found[weather.location] = weather
+                self._cache_result(
+                    ('latest', weather.location), weather, weather.location, generation
+                )
+
+        return {location: found[location] for location in dict.fromkeys(locations)
+                if location in found}
+
+    def get_historical(
+            self,
+            location: str,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            limit: int = 100,
+            cursor: Optional[str] = None
+    ) -> List[WeatherData]:
+        """
+        Get historical weather readings for a location.
+
+        Args:
+            location: City or region name
+            start: Start datetime (optional)
+            end: End datetime (optional)
+            limit: Maximum number of records to return
+            cursor: Continue after the page this token came from (optional)
+
+        Returns:
+            List of WeatherData objects, newest first
+        """
+        weather_list, _ = self.get_historical_page(location, start, end, limit, cursor)
+        return weather_list
+
+    @timed(rows=lambda page: len(page[0]))
+    def get_historical_page(
+            self,
+            location: str,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            limit: int = 100,
+            cursor: Optional[str] = None
+    ) -> Tuple[List[WeatherData], Optional[str]]:
+        """
+        Get one page of historical weather readings using keyset pagination.
+
+        The cursor records the (ts, rowid) of the last row returned, so the
+        next page starts with an index seek rather than skipping rows, and
+        deep pages cost the same as the first one.
+
+        Args:
+            location: City or region name
+            start: Start datetime (optional)
+            end: End datetime (optional)
+            limit: Maximum number of records to return
+            cursor: Continue after the page this token came from (optional)
+
+        Returns:
+            Tuple of (WeatherData list newest first, cursor for the next page
+            or None when there are no more rows)
+
+        Raises:
+            InvalidCursorError: If cursor is malformed
+        """
+        # Validate the cursor before touching the database
+        after = decode_cursor(cursor) if cursor else None
+
+        conn = self._get_connection()
+
+        # Key on epoch ms so equal datetimes in any timezone share an entry
+        start_ms = to_epoch_ms(start) if start else None
+        end_ms = to_epoch_ms(end) if end else None
+        self._check_external_writes(conn)
+        key = ('historical', location, start_ms, end_ms, limit, after)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        location_id = self._find_location_id(conn, location)
+        if location_id is None:
+            return [], None
+
+        # Build query dynamically based on parameters
+
+        query = f"SELECT {WEATHER_COLUMNS}, ts, rowid FROM weather WHERE location_id = ?"
+        params = [location, location_id]
+
+        # Add date filters if provided
+        # Range bounds on ts keep the query inside idx_location_ts
+
+        if start_ms is not None:
+            query += " AND ts >= ?"
+            params.append(start_ms)
+
+        if end_ms is not None:
+            query += " AND ts <= ?"
+            params.append(end_ms)
+
+        # Resume strictly after the previous page's last row
+        if after:
+            query += " AND (ts < ? OR (ts = ? AND rowid < ?))"
+            params.extend([after[0], after[0], after[1]])
+
+        # Order by newest first and limit results
+        # rowid breaks ties between readings in the same millisecond
+
+        query += " ORDER BY ts DESC, rowid DESC LIMIT ?"
+        params.append(limit)
+
+        # Plain tuples: from_row reads the first six columns and the
+        # trailing ts, rowid pair feeds the next cursor
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(query, params).fetchall()
+
+        # A full page means there may be more rows after it
+        next_cursor = None
+        if rows and len(rows) == limit:
+            next_cursor = encode_cursor(rows[-1][6], rows[-1][7])
+
+        # Convert all rows to WeatherData objects
+
+        page = [WeatherData.from_row(row) for row in rows], next_cursor
+        self._cache_result(key, page, location, generation)
+        return page
+
+    def iter_historical(
+            self,
+            location: str,
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            fetch_size: int = EXPORT_FETCH_SIZE
+    ) -> Iterator[WeatherData]:
+        """
+        Stream all historical readings for a location, newest first.
+
+        Rows are pulled from the SQLite cursor with fetchmany, so memory
+        use stays constant regardless of how many rows match. The rows
+        are read through a private connection, closed with the generator,
+        so the consumer may advance it from any thread (the ASGI adapter
+        pulls each chunk on whichever pool thread is free) without
+        touching another thread's pooled connection.
+
+        Args:
+            location: City or region name
+            start: Start datetime (optional)
+            end: End datetime (optional)
+            fetch_size: Rows fetched from SQLite at a time
+
+        Yields:
+            WeatherData objects
+        """
+        conn = self._connect()
+        try:
+            location_id = self._find_location_id(conn, location)
+            if location_id is None:
+                return
+
+            query = f"SELECT {WEATHER_COLUMNS} FROM weather WHERE location_id = ?"
+            params = [location, location_id]
+
+            if start:
+                query += " AND ts >= ?"
+                params.append(to_epoch_ms(start))
+
+            if end:
+                query += " AND ts <= ?"
+                params.append(to_epoch_ms(end))
+
+            query += " ORDER BY ts DESC, rowid DESC"
+
+            cursor = self._weather_cursor(conn)
+            cursor.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                # Release the read snapshot even if the consumer stops early
+                cursor.close()
+        finally:
+            conn.close()
+
+    @timed()
+    def get_data_version(
+            self,
+            location: Optional[str] = None
+    ) -> Optional[Tuple[str, datetime]]:
+        """
+        Get a validator for the current data of one or all locations.
+
+        Served from an in-process cache that is only refreshed after a
+        write, so polling clients can be answered without a table read.
+
+        Args:
+            location: City or region name (optional, defaults to all)
+
+        Returns:
+            Tuple of (version tag, last modification time in UTC), or None
+            if the location has no data
+        """
+        conn = self._get_connection()
+
+        self._check_external_writes(conn)
+        cached = self._version_cache.get(location)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        if location is None:
+            # Every insert or delete bumps one location's version and
+            # location rows are never removed, so the total over all rows
+            # only ever grows, even when retention empties a location
+            row = conn.execute("""
+                SELECT TOTAL(reading_count > 0), TOTAL(version), MAX(modified_ms)
+                FROM locations
+            """).fetchone()
+            if not row[0]:
+                return None
+            tag = f"{int(row[0])}-{int(row[1])}"
+            modified_ms = row[2]
+        else:
+            location_id = self._find_location_id(conn, location)
+            if location_id is None:
+                return None
+            row = conn.execute("""
+                SELECT version, modified_ms FROM locations
+                WHERE id = ? AND reading_count > 0
+            """, (location_id,)).fetchone()
+            if row is None:
+                return None
+            tag = f"{location_id}-{row[0]}"
+            modified_ms = row[1]
+
+        modified = from_epoch_ms(modified_ms).replace(tzinfo=timezone.utc)
+        if generation == self._cache_generation:
+            self._version_cache[location] = (tag, modified)
+        return tag, modified
+
+    def get_high_water_mark(self) -> int:
+        """
+        Get the rowid of the newest stored reading.
+
+        Rowids are assigned in commit order, so readings with a larger
+        rowid were written after this call.
+
+        Returns:
+            Largest weather rowid, 0 when there is no data
+        """
+        conn = self._get_connection()
+        return self._max_rowid(conn)
+
+    @timed()
+    def get_readings_since(
+            self,
+            after_id: int,
+            location: Optional[str] = None,
+            limit: int = 1000
+    ) -> List[Tuple[int, WeatherData]]:
+        """
+        Get readings written after a high-water mark, oldest first.
+
+        Args:
+            after_id: Return readings with a larger rowid than this
+            location: City or region name (optional, defaults to all)
+            limit: Maximum number of readings to return
+
+        Returns:
+            List of (rowid, WeatherData) tuples
+        """
+        conn = self._get_connection()
+
+        query = """
+            SELECT w.rowid, w.timestamp, l.name, w.temperature, w.humidity,
+                   w.condition, w.wind_speed
+            FROM weather w JOIN locations l ON l.id = w.location_id
+            WHERE w.rowid > ?
+        """
+        params = [after_id]
+        if location is not None:
+            location_id = self._find_location_id(conn, location)
+            if location_id is None:
+                return []
+            query += " AND w.location_id = ?"
+            params.append(location_id)
+        # Rowid range scan on the table itself, no index needed
+        query += " ORDER BY w.rowid LIMIT ?"
+        params.append(limit)
+
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return [
+            (row[0], WeatherData.from_row(row[1:]))
+            for row in cursor.execute(query, params)
+        ]
+
+    @timed()
+    def get_all_locations(self) -> List[str]:
+        """
+        Get list of all locations with weather data.
+
+        Returns:
+            List of unique location names
+        """
+        conn = self._get_connection()
+
+        self._check_external_writes(conn)
+        key = ('locations',)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        # Dimension table is tiny compared to weather; its UNIQUE
+        # index on name already returns names in order
+        cursor = conn.execute("""
+            SELECT name FROM locations
+            WHERE reading_count > 0
+            ORDER BY name
+        """)
+        # Extract first column from each row
+
+        locations = [row[0] for row in cursor.fetchall()]
+        self._cache_result(key, locations, None, generation)
+        return locations
+
+    @timed()
+    def get_location_stats(self) -> List[dict]:
+        """
+        Get reading counts and first/last-seen times for all locations.
+
+        Returns:
+            List of dicts with location, count, first_seen and last_seen
+        """
+        conn = self._get_connection()
+
+        self._check_external_writes(conn)
+        key = ('location_stats',)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        cursor = conn.execute("""
+            SELECT name, reading_count, first_ts, last_ts FROM locations
+            WHERE reading_count > 0
+            ORDER BY name
+        """)
+        stats = [
+            {
+                'location': name,
+                'count': count,
+                'first_seen': from_epoch_ms(first_ts).isoformat(),
+                'last_seen': from_epoch_ms(last_ts).isoformat()
+            }
+            for name, count, first_ts, last_ts in cursor.fetchall()
+        ]
+        self._cache_result(key, stats, None, generation)
+        return stats
+
+    @timed()
+    def delete_old_readings(
+            self,
+            location: str,
+            older_than: Optional[datetime] = None,
+            keep_rows: Optional[int] = None,
+            chunk_size: int = RETENTION_CHUNK_SIZE,
+            should_stop: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Delete a location's oldest readings, a small transaction at a time.
+
+        Each chunk is deleted oldest first in its own short write
+        transaction, together with its effect on the derived tables: the
+        location's count and first/last-seen times, the affected rollup
+        days (rebuilt from the remaining readings) and, once nothing is
+        left, the latest reading. Writers only ever wait for one chunk.
+
+        Args:
+            location: City or region name
+            older_than: Delete readings before this time (optional)
+            keep_rows: Keep only this many newest readings (optional)
+            chunk_size: Readings deleted per transaction
+            should_stop: Checked between chunks; True stops early
+
+        Returns:
+            Number of readings deleted
+
+        Raises:
+            ValueError: If neither limit is given or keep_rows is below 1
+        """
+        if older_than is None and keep_rows is None:
+            raise ValueError("older_than or keep_rows is required")
+        if keep_rows is not None and keep_rows < 1:
+            raise ValueError("keep_rows must be at least 1")
+
+        conn = self._get_connection()
+        location_id = self._find_location_id(conn, location)
+        if location_id is None:
+            return 0
+
+        # Everything ordered before (ts, rowid) = cut goes; an age limit
+        # cuts at (ts, 0), and the stricter of both limits wins
+        cut = (to_epoch_ms(older_than), 0) if older_than is not None else None
+        if keep_rows is not None:
+            row = conn.execute("""
+                SELECT ts, rowid FROM weather WHERE location_id = ?
+                ORDER BY ts DESC, rowid DESC LIMIT 1 OFFSET ?
+            """, (location_id, keep_rows - 1)).fetchone()
+            if row is not None:
+                cut = max(cut, tuple(row)) if cut is not None else tuple(row)
+        if cut is None:
+            return 0
+
+        deleted = 0
+        while True:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                rows = conn.execute("""
+                    SELECT rowid, ts FROM weather
+                    WHERE location_id = ? AND (ts < ? OR (ts = ? AND rowid < ?))
+                    ORDER BY ts, rowid LIMIT ?
+                """, (location_id, cut[0], cut[0], cut[1], chunk_size)).fetchall()
+                if not rows:
+                    break
+                conn.executemany("DELETE FROM weather WHERE rowid = ?", [(row[0],) for row in rows])
+
+                self._trim_rollups(conn, location_id, rows[-1][1])
+
+                remaining_first = conn.execute(
+                    "SELECT MIN(ts) FROM weather WHERE location_id = ?", (location_id,)
+                ).fetchone()[0]
+                conn.execute(f"""
+                    UPDATE locations SET
+                        reading_count = reading_count - ?,
+                        first_ts = ?,
+                        last_ts = CASE WHEN ? IS NULL THEN NULL ELSE last_ts END,
+                        version = version + 1,
+                        modified_ms = {NOW_MS_SQL}
+                    WHERE id = ?
+                """, (len(rows), remaining_first, remaining_first, location_id))
+                if remaining_first is None:
+                    conn.execute("DELETE FROM weather_latest WHERE location_id = ?", (location_id,))
+
+            deleted += len(rows)
+            self._invalidate_cached(location)
+            if len(rows) < chunk_size or (should_stop is not None and should_stop()):
+                break
+        return deleted
+
+    def incremental_vacuum(self, max_pages: Optional[int] = None) -> int:
+        """
+        Return free pages at the end of the file to the operating system.
+
+        Only has an effect when the file uses auto_vacuum=INCREMENTAL
+        (see enable_incremental_vacuum()).
+
+        Args:
+            max_pages: Most pages to release (optional, defaults to all)
+
+        Returns:
+            Number of pages released
+
+        Raises:
+            ValueError: If max_pages is negative
+        """
+        if max_pages is not None and max_pages < 0:
+            raise ValueError("max_pages must not be negative")
+        if max_pages == 0:
+            # SQLite reads incremental_vacuum(0) as "every free page"
+            return 0
+
+        conn = self._get_connection()
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        # execute() would step the pragma once and free a single page;
+        # executescript() runs it to completion
+        limit = f"({int(max_pages)})" if max_pages is not None else ""
+        conn.executescript(f"PRAGMA incremental_vacuum{limit}")
+        # The file only shrinks once the WAL is checkpointed
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def analyze(self) -> None:
+        """
+        Refresh the query planner's statistics.
+
+        Samples at most ANALYZE_LIMIT rows per index, so it stays fast on
+        large files.
+        """
+        conn = self._get_connection()
+        conn.execute(f"PRAGMA analysis_limit={ANALYZE_LIMIT}")
+        try:
+            conn.execute("ANALYZE")
+        finally:
+            conn.execute("PRAGMA analysis_limit=0")
+
+    def get_storage_stats(self) -> dict:
+        """
+        Get the database file's size and free space.
+
+        Returns:
+            Dictionary with page size and counts, file and WAL sizes in
+            bytes, and the auto_vacuum mode
+        """
+        conn = self._get_connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        wal_path = self.db_path + "-wal"
+        return {
+            'page_size': page_size,
+            'page_count': page_count,
+            'freelist_count': conn.execute("PRAGMA freelist_count").fetchone()[0],
+            'size_bytes': page_size * page_count,
+            'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+            'auto_vacuum': AUTO_VACUUM_MODES[conn.execute("PRAGMA auto_vacuum").fetchone()[0]]
+        }
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Convert an existing file to auto_vacuum=INCREMENTAL.
+
+        Rewrites the whole file with VACUUM, which needs free disk space
+        about the size of the database and blocks all writers until it
+        finishes; run it while the API and scheduler are stopped. Files
+        created by this version already use incremental mode.
+
+        Returns:
+            True if the file was converted, False if it already was
+        """
+        conn = self._get_connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        # VACUUM writes the whole file into the WAL; fold it back in
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def create_job(self, job_id: str, kind: str, params: dict, total: int) -> None:
+        """
+        Record a new queued job.
+
+        Args:
+            job_id: Unique job identifier
+            kind: Type of work (e.g. "seed")
+            params: JSON-serializable job arguments
+            total: Units of work (e.g. readings) the job will process
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(f"""
+                INSERT INTO jobs (id, kind, params, status, total, created_ms)
+                VALUES (?, ?, ?, 'queued', ?, {NOW_MS_SQL})
+            """, (job_id, kind, json.dumps(params), total))
+
+    def start_job(self, job_id: str) -> bool:
+        """
+        Mark a queued job as running.
+
+        Returns:
+            False if the job was cancelled before it started
+        """
+        conn = self._get_connection()
+        with conn:
+            row = conn.execute(f"""
+                UPDATE jobs SET status = 'running', started_ms = {NOW_MS_SQL}
+                WHERE id = ? AND status = 'queued' AND NOT cancel_requested
+                RETURNING id
+            """, (job_id,)).fetchone()
+        return row is not None
+
+    def update_job_progress(self, job_id: str, done: int) -> bool:
+        """
+        Record how much of a running job is finished.
+
+        Args:
+            job_id: Job identifier
+            done: Units of work completed so far
+
+        Returns:
+            True if cancellation has been requested (from any process)
+        """
+        conn = self._get_connection()
+        with conn:
+            row = conn.execute("""
+                UPDATE jobs SET done = ? WHERE id = ?
+                RETURNING cancel_requested
+            """, (done, job_id)).fetchone()
+        return bool(row and row[0])
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        """
+        Record that a job stopped.
+
+        Args:
+            job_id: Job identifier
+            status: "completed", "failed" or "cancelled"
+            error: Failure or cancellation reason (optional)
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(f"""
+                UPDATE jobs SET status = ?, error = ?, finished_ms = {NOW_MS_SQL}
+                WHERE id = ?
+            """, (status, error, job_id))
+
+    def request_job_cancel(self, job_id: str) -> bool:
+        """
+        Ask a queued or running job to stop.
+
+        The worker running it notices at its next progress update.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            True if the job was still queued or running
+        """
+        conn = self._get_connection()
+        with conn:
+            cursor = conn.execute("""
+                UPDATE jobs SET cancel_requested = 1
+                WHERE id = ? AND status IN ('queued', 'running')
+            """, (job_id,))
+        return cursor.rowcount > 0
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """
+        Get a job's stored state.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Dictionary of the jobs row with params decoded and times as
+            epoch milliseconds, or None if the job doesn't exist
+        """
+        conn = self._get_connection()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    @timed()
+    def get_aggregates(
+            self,
+            location: str,
+            granularity: str = "hour",
+            start: Optional[datetime] = None,
+            end: Optional[datetime] = None,
+            limit: int = 1000
+    ) -> List[WeatherAggregate]:
+        """
+        Get precomputed hourly or daily summaries for a location.
+
+        Reads only the rollup tables, never the raw readings.
+
+        Args:
+            location: City or region name
+            granularity: "hour" or "day"
+            start: Include buckets containing or after this datetime (optional)
+            end: Include buckets starting at or before this datetime (optional)
+            limit: Maximum number of buckets to return
+
+        Returns:
+            List of WeatherAggregate objects, newest bucket first
+        """
+        if granularity not in ROLLUP_GRANULARITIES:
+            raise ValueError(
+                f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}"
+            )
+        size = ROLLUP_GRANULARITIES[granularity]
+
+        conn = self._get_connection()
+
+        location_id = self._find_location_id(conn, location)
+        if location_id is None:
+            return []
+
+        # Same filters apply to both rollup tables
+        where = "location_id = ? AND granularity = ?"
+        params = [location_id, granularity]
+
+        if start:
+            # Round down so the bucket containing start is included
+            start_ms = to_epoch_ms(start)
+            where += " AND bucket_ts >= ?"
+            params.append(start_ms - start_ms % size)
+
+        if end:
+            where += " AND bucket_ts <= ?"
+            params.append(to_epoch_ms(end))
+
+        columns = ", ".join(
+            f"{name}_min, {name}_max, {name}_sum" for name in ROLLUP_MEASURES
+        )
+        rows = conn.execute(f"""
+            SELECT bucket_ts, count, {columns} FROM weather_rollup
+            WHERE {where}
+            ORDER BY bucket_ts DESC
+            LIMIT ?
+        """, params + [limit]).fetchall()
+
+        if not rows:
+            return []
+
+        # Fetch condition histograms for just the returned buckets
+        histograms: Dict[int, dict] = {row["bucket_ts"]: {} for row in rows}
+        cursor = conn.execute(f"""
+            SELECT bucket_ts, condition, count FROM weather_rollup_condition
+            WHERE {where} AND bucket_ts >= ?
+        """, params + [rows[-1]["bucket_ts"]])
+        for bucket_ts, condition, count in cursor:
+            if bucket_ts in histograms:
+                histograms[bucket_ts][condition] = count
+
+        aggregates = []
+        for row in rows:
+            count = row["count"]
+            values = {}
+            for name in ROLLUP_MEASURES:
+                values[f"{name}_min"] = row[f"{name}_min"]
+                values[f"{name}_max"] = row[f"{name}_max"]
+                values[f"{name}_mean"] = round(row[f"{name}_sum"] / count, 2)
+            aggregates.append(WeatherAggregate(
+                location=location,
+                granularity=granularity,
+                bucket_start=from_epoch_ms(row["bucket_ts"]),
+                count=count,
+                conditions=histograms[row["bucket_ts"]],
+                **values
+            ))
+        return aggregates
+
+    @staticmethod
+    def _weather_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+        """
+        Create a cursor that returns WEATHER_COLUMNS rows as WeatherData.
+
+        Args:
+            conn: Calling thread's pooled connection
+
+        Returns:
+            Cursor using weather_row_factory
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = weather_row_factory
+        return cursor
@@ -0,0 +1,257 @@
+"""
+Live fan-out of newly stored weather readings.
+"""
+
+import logging
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from .data_model import WeatherData
+from .database import WeatherRepository
+from .threads import ForkSafeThreads
+
+
+logger = logging.getLogger(__name__)
+
+
+# (weather rowid, reading); the rowid doubles as the SSE event id
+ReadingEvent = Tuple[int, WeatherData]
+
+
+class Subscription:
+    """
+    One listener's bounded buffer of new readings.
+
+    A subscriber that lets its buffer fill up is dropped by the broker
+    rather than slowing down delivery to everyone else.
+    """
+
+    def __init__(self, location: Optional[str], max_queued: int, start_id: int):
+        """
+        Initialize an empty subscription.
+
+        Args:
+            location: Location to receive readings for (None for all)
+            max_queued: Readings buffered before the subscriber is dropped
+            start_id: High-water mark when subscribing; every reading with a
+                larger rowid is delivered through this subscription
+        """
+        self.location = location
+        self.start_id = start_id
+        self.dropped = False
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queued)
+
+        # Called from the broker thread after each delivery and on drop,
+        # for consumers that wait without blocking a thread (e.g. asyncio)
+        self.on_event: Optional[Callable[[], None]] = None
+
+    def get(self, timeout: float) -> Optional[ReadingEvent]:
+        """
+        Wait for the next reading.
+
+        Args:
+            timeout: Seconds to wait
+
+        Returns:
+            Next (rowid, WeatherData) event, or None if none arrived in time
+            or the subscription was dropped and its buffer is drained
+        """
+        try:
+            # Once dropped nothing new arrives, so don't wait for it
+            if self.dropped:
+                return self._queue.get_nowait()
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _offer(self, event: ReadingEvent) -> bool:
+        """Buffer an event without blocking; False when the buffer is full."""
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            return False
+        self._notify()
+        return True
+
+    def _notify(self) -> None:
+        """Run the on_event callback, if any."""
+        if self.on_event is not None:
+            self.on_event()
+
+
+class ReadingBroker:
+    """
+    Publishes newly stored readings to in-process subscribers.
+
+    A single background thread per process tails the weather table by
+    rowid (a high-water mark), so readings written by other gunicorn
+    workers or scripts are delivered too. Writes made through the
+    repository in this process wake the thread immediately instead of
+    waiting for the next poll. The thread only runs while there are
+    subscribers.
+    """
+
+    def __init__(
+            self,
+            repository: WeatherRepository,
+            poll_interval: float = 1.0,
+            batch_size: int = 1000,
+            max_backlog: int = 10000
+    ):
+        """
+        Initialize broker and register it for repository write notifications.
+
+        Args:
+            repository: Repository whose readings are published
+            poll_interval: Seconds between checks for other processes' writes
+            batch_size: Readings read from the database per query
+            max_backlog: Most readings delivered after a burst (e.g. a bulk
+                load); older unread ones are skipped
+        """
+        self.repository = repository
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_backlog = max_backlog
+
+        # Subscriptions by location (None = all locations)
+        self._subscribers: Dict[Optional[str], Set[Subscription]] = {}
+        self._high_water = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._poller = ForkSafeThreads(self._run, "weather-stream", on_start=self._reset)
+
+        # Counters for monitoring
+        self.published = 0
+        self.dropped = 0
+        self.skipped = 0
+
+        repository.add_write_listener(self._wake.set)
+
+    @property
+    def subscriber_count(self) -> int:
+        """Number of active subscriptions."""
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def stats(self) -> dict:
+        """
+        Get broker counters for monitoring.
+
+        Returns:
+            Dictionary with subscriber count, high-water mark and counters
+        """
+        return {
+            'subscribers': self.subscriber_count,
+            'high_water': self._high_water,
+            'published': self.published,
+            'dropped_subscribers': self.dropped,
+            'skipped': self.skipped
+        }
+
+    def subscribe(self, location: Optional[str] = None, max_queued: int = 1000) -> Subscription:
+        """
+        Start receiving readings stored from now on.
+
+        Args:
+            location: City or region name (optional, defaults to all)
+            max_queued: Readings buffered before the subscriber is dropped
+
+        Returns:
+            Subscription to read events from; pass it to unsubscribe() when done
+        """
+        with self._lock:
+            self._poller.ensure_started()
+            subscription = Subscription(location, max_queued, self._high_water)
+            self._subscribers.setdefault(location, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Stop delivering readings to a subscription.
+
+        Args:
+            subscription: Subscription returned by subscribe()
+        """
+        with self._lock:
+            self._discard(subscription)
+
+    def _discard(self, subscription: Subscription) -> None:
+        """Remove a subscription; caller holds the lock."""
+        subs = self._subscribers.get(subscription.location)
+        if subs is not None:
+            subs.discard(subscription)
+            if not subs:
+                del self._subscribers[subscription.location]
+
+    def _reset(self) -> None:
+        """Start polling from the newest reading; caller holds the lock."""
+        self._high_water = self.repository.get_high_water_mark()
+        self._wake.clear()
+
+    def _run(self) -> None:
+        """
+        Poller loop: publish new readings until nobody is subscribed.
+        """
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # The next subscribe() starts a fresh thread
+                    self._poller.discard()
+                    return
+            try:
+                self._poll()
+            except Exception:
+                # Keep streaming; the next poll retries from the same mark
+                logger.exception("Failed to read new readings for streams")
+
+    def _poll(self) -> None:
+        """
+        Read every reading past the high-water mark and publish it.
+        """
+        while True:
+            events = self.repository.get_readings_since(
+                self._high_water, limit=self.batch_size
+            )
+            if not events:
+                return
+
+            with self._lock:
+                # Publishing under the lock means a new subscription
+                # sees exactly the readings after its start_id
+                self._high_water = events[-1][0]
+                self._publish(events)
+
+            if len(events) < self.batch_size:
+                return
+
+            # A bulk load can add millions of rows; only the newest
+            # max_backlog are worth pushing to live listeners
+            newest = self.repository.get_high_water_mark()
+            if newest - self._high_water > self.max_backlog:
+                with self._lock:
+                    self.skipped += newest - self.max_backlog - self._high_water
+                    self._high_water = newest - self.max_backlog
+
+    def _publish(self, events: List[ReadingEvent]) -> None:
+        """
+        Hand events to matching subscribers; caller holds the lock.
+
+        Args:
+            events: (rowid, WeatherData) tuples, oldest first
+        """
+        everyone = self._subscribers.get(None, set())
+        slow = []
+        for event in events:
+            targets = self._subscribers.get(event[1].location)
+            for subscription in (everyone | targets) if targets else everyone:
+                if not subscription.dropped and not subscription._offer(event):
+                    # Full buffer: the client isn't keeping up
+                    subscription.dropped = True
+                    subscription._notify()
+                    slow.append(subscription)
+        for subscription in slow:
+            self._discard(subscription)
+        self.published += len(events)
+        self.dropped += len(slow)
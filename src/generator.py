@@ -3,8 +3,14 @@ Weather Generator - Creating random weather data.
 """
 
 from random import uniform, choice
-from datetime import datetime
-from .data_model import WeatherData
+from datetime import datetime, timedelta
+from typing import List, Optional
+from .data_model import WeatherColumns, WeatherData
+
+try:
+    import numpy as np
+except ImportError:  # Vectorized generation is unavailable without numpy
+    np = None
 
 
 class WeatherGenerator:
@@ -93,4 +99,67 @@ class WeatherGenerator:
         Returns:
             List of WeatherData objects with random locations
         """
-        return [WeatherGenerator.generate_random() for _ in range(count)]
\ No newline at end of file
+        return [WeatherGenerator.generate_random() for _ in range(count)]
+
+    @staticmethod
+    def generate_columns(
+            count: int,
+            locations: Optional[List[str]] = None,
+            seed: Optional[int] = None,
+            end: Optional[datetime] = None,
+            interval: timedelta = timedelta(0)
+    ) -> WeatherColumns:
+        """Generate a batch of readings as NumPy columns.
+
+        Draws every column in one vectorized call instead of building
+        WeatherData objects row by row.
+
+        Args:
+            count: Number of readings to generate
+            locations: Names to pick from uniformly (default: LOCATIONS)
+            seed: Seed for a reproducible numpy Generator (optional)
+            end: Timestamp of the last reading (default: now)
+            interval: Spacing between readings; readings are backdated
+                from end, so the first one is at end - (count - 1) * interval
+
+        Returns:
+            WeatherColumns batch
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for vectorized generation")
+
+        rng = np.random.default_rng(seed)
+        locations = list(locations or WeatherGenerator.LOCATIONS)
+        conditions = WeatherGenerator.CONDITIONS
+
+        # Pick random condition first, then look up its temperature range
+        condition_codes = rng.integers(0, len(conditions), size=count, dtype=np.int8)
+        temp_min = np.array([WeatherGenerator.TEMP_RANGES[c][0] for c in conditions], dtype=float)
+        temp_max = np.array([WeatherGenerator.TEMP_RANGES[c][1] for c in conditions], dtype=float)
+        temperature = rng.uniform(temp_min[condition_codes], temp_max[condition_codes])
+
+        # Same parameter ranges as generate()
+        humidity = rng.uniform(20, 100, size=count)  # 20-100% humidity
+        wind_speed = rng.uniform(0, 50, size=count)  # 0-50 km/h wind
+
+        if len(locations) == 1:
+            location_codes = np.zeros(count, dtype=np.int32)
+        else:
+            location_codes = rng.integers(0, len(locations), size=count, dtype=np.int32)
+
+        # Evenly spaced epoch-millisecond timestamps ending at `end`
+        end = end or datetime.now()
+        end_ms = (end - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+        step_ms = interval // timedelta(milliseconds=1)
+        ts = end_ms - step_ms * np.arange(count - 1, -1, -1, dtype=np.int64)
+
+        return WeatherColumns(
+            ts=ts,
+            location_codes=location_codes,
+            condition_codes=condition_codes,
+            temperature=np.round(temperature, 1),  # Round to 1 decimal
+            humidity=np.round(humidity, 1),
+            wind_speed=np.round(wind_speed, 1),
+            locations=locations,
+            conditions=list(conditions)
+        )
@@ -0,0 +1,457 @@
+"""
+Write-behind buffering and bulk ingestion of weather readings.
+"""
+
+import atexit
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from sys import intern
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+from .data_model import WeatherData
+from .database import BULK_SAVE_MIN_ROWS, WeatherRepository
+from .threads import ForkSafeThreads
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib decoder
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Queues weather readings in memory and saves them in batches.
+
+    A background thread commits queued readings through
+    WeatherRepository.save_many once a batch fills up or the flush
+    interval passes, so callers never wait on a disk commit unless
+    the queue is full.
+    """
+
+    def __init__(
+            self,
+            repository: WeatherRepository,
+            max_size: int = 10000,
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            put_timeout: float = 0.05
+    ):
+        """
+        Initialize buffer in front of a repository.
+
+        Args:
+            repository: Repository that receives the batched writes
+            max_size: Maximum number of readings waiting in memory
+            batch_size: Maximum readings committed per transaction
+            flush_interval: Seconds to wait before writing a partial batch
+            put_timeout: Seconds submit() waits for space when the queue is full
+        """
+        self.repository = repository
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self._stopping = threading.Event()
+        self._flusher = ForkSafeThreads(
+            self._run, "weather-write-behind", on_start=self._stopping.clear
+        )
+
+        # Counters for monitoring
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of readings waiting to be written."""
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """
+        Get buffer counters for monitoring.
+
+        Returns:
+            Dictionary with queue depth and write counters
+        """
+        return {
+            'queue_depth': self.queue_depth,
+            'max_size': self._queue.maxsize,
+            'written': self.written,
+            'rejected': self.rejected,
+            'failed': self.failed
+        }
+
+    def start(self) -> None:
+        """
+        Start the background flusher thread in this process if it isn't running.
+        """
+        self._flusher.ensure_started()
+
+    def submit(self, weather: WeatherData) -> bool:
+        """
+        Queue a reading for a later batched write.
+
+        Blocks for at most put_timeout seconds when the queue is full.
+
+        Args:
+            weather: WeatherData object to save
+
+        Returns:
+            True if queued, False if the queue stayed full (caller should
+            save synchronously instead)
+        """
+        self.start()
+        try:
+            self._queue.put(weather, timeout=self.put_timeout)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def flush(self) -> None:
+        """
+        Block until every queued reading has been written.
+        """
+        if self._flusher.running:
+            self._queue.join()
+
+    def close(self) -> None:
+        """
+        Write remaining readings and stop the flusher thread.
+        """
+        if not self._flusher.running:
+            return
+        self._stopping.set()
+        self._flusher.join()
+
+    def _run(self) -> None:
+        """
+        Flusher loop: collect batches and write them until stopped.
+        """
+        while True:
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+            elif self._stopping.is_set():
+                # Queue drained after close() was requested
+                return
+
+    def _collect(self) -> List[WeatherData]:
+        """
+        Wait for the next batch of readings.
+
+        Returns:
+            Up to batch_size readings, or an empty list if none arrived
+        """
+        # While shutting down, take whatever is left without waiting
+        if self._stopping.is_set():
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            return batch
+
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        # Fill the batch until it is full or the time window closes
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[WeatherData]) -> None:
+        """
+        Commit one batch and mark its queue entries as done.
+
+        Args:
+            batch: Readings to save
+        """
+        try:
+            self.written += self.repository.save_many(batch)
+        except Exception:
+            # Keep the flusher alive; the batch is lost but counted
+            self.failed += len(batch)
+            logger.exception("Failed to write %d buffered readings", len(batch))
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+
+def create_buffer_from_env(repository: WeatherRepository) -> Optional[WriteBehindBuffer]:
+    """
+    Create a write-behind buffer if enabled by environment variables.
+
+    WEATHER_WRITE_BEHIND=1 enables the buffer; WEATHER_WRITE_BEHIND_MAX_SIZE,
+    WEATHER_WRITE_BEHIND_BATCH_SIZE and WEATHER_WRITE_BEHIND_INTERVAL tune it.
+
+    Args:
+        repository: Repository that receives the batched writes
+
+    Returns:
+        Buffer that flushes on interpreter exit, or None when disabled
+    """
+    if os.environ.get('WEATHER_WRITE_BEHIND', '0').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    buffer = WriteBehindBuffer(
+        repository,
+        max_size=int(os.environ.get('WEATHER_WRITE_BEHIND_MAX_SIZE', 10000)),
+        batch_size=int(os.environ.get('WEATHER_WRITE_BEHIND_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('WEATHER_WRITE_BEHIND_INTERVAL', 1.0))
+    )
+    # Flush on shutdown so queued readings aren't lost
+    atexit.register(buffer.close)
+    return buffer
+
+
+# Readings validated and committed per ingest transaction
+INGEST_BATCH_SIZE = 5000
+
+# Rejected records described per batch in ingest results
+MAX_REPORTED_ERRORS = 10
+
+# Fields every ingested record must carry, in CSV header order
+INGEST_FIELDS = ('timestamp', 'location', 'temperature', 'humidity', 'condition', 'wind_speed')
+
+# Accepted (min, max) for numeric fields
+VALUE_RANGES = {
+    'temperature': (-100.0, 100.0),  # Celsius
+    'humidity': (0.0, 100.0),  # Percentage
+    'wind_speed': (0.0, 500.0),  # km/h
+}
+
+# Longest accepted location or condition name
+MAX_NAME_LENGTH = 100
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# (line number, reading) for valid records, (line number, error) otherwise
+ParsedRecord = Tuple[int, Union[WeatherData, str]]
+
+
+class IngestFormatError(ValueError):
+    """Raised when an ingest body can't be parsed at all (e.g. bad CSV header)."""
+
+
+def _parse_timestamp(value) -> datetime:
+    """
+    Parse an ISO timestamp, normalizing aware values to naive UTC.
+    """
+    if value.__class__ is not str:
+        raise ValueError("timestamp must be an ISO 8601 string")
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        # Stored timestamps are naive UTC wall-clock time
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _parse_name(value, name: str) -> str:
+    """
+    Check a required non-empty string field.
+    """
+    if value.__class__ is not str or not value or len(value) > MAX_NAME_LENGTH:
+        raise ValueError(f"{name} must be a non-empty string of at most "
+                         f"{MAX_NAME_LENGTH} characters")
+    if value[0].isspace() or value[-1].isspace():
+        value = value.strip()
+        if not value:
+            raise ValueError(f"{name} must be a non-empty string")
+    return value
+
+
+def _parse_number(value, name: str) -> float:
+    """
+    Check a required numeric field against VALUE_RANGES.
+    """
+    # Exact type checks keep JSON numbers on the fast path; bool is an
+    # int subclass but never a valid reading
+    if value.__class__ is not float and value.__class__ is not int:
+        if value.__class__ is not str:
+            raise ValueError(f"{name} must be a number")
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+    low, high = VALUE_RANGES[name]
+    # NaN fails both comparisons, so it is rejected here too
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return value
+
+
+def validate_record(record) -> WeatherData:
+    """
+    Convert one decoded record to a WeatherData object.
+
+    Args:
+        record: Mapping with the INGEST_FIELDS keys; numbers may be
+            strings (as in CSV)
+
+    Returns:
+        Validated WeatherData
+
+    Raises:
+        ValueError: If a field is missing, mistyped or out of range
+    """
+    if record.__class__ is not dict:
+        raise ValueError("record must be a JSON object")
+    try:
+        return WeatherData(
+            _parse_timestamp(record['timestamp']),
+            _parse_name(record['location'], 'location'),
+            _parse_number(record['temperature'], 'temperature'),
+            _parse_number(record['humidity'], 'humidity'),
+            intern(_parse_name(record['condition'], 'condition')),
+            _parse_number(record['wind_speed'], 'wind_speed')
+        )
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}") from None
+
+
+def parse_ndjson(lines: Iterable[bytes]) -> Iterator[ParsedRecord]:
+    """
+    Parse newline-delimited JSON records one line at a time.
+
+    Blank lines are skipped.
+
+    Args:
+        lines: Raw body lines (e.g. a request stream)
+
+    Yields:
+        (line number, WeatherData) or (line number, error message)
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, validate_record(_json_loads(line))
+        except ValueError as e:
+            # JSONDecodeError and orjson.JSONDecodeError are ValueErrors
+            yield number, str(e)
+
+
+def parse_csv(lines: Iterable[bytes]) -> Iterator[ParsedRecord]:
+    """
+    Parse CSV records with a header row one line at a time.
+
+    The header must name every INGEST_FIELDS column, in any order.
+
+    Args:
+        lines: Raw body lines (e.g. a request stream)
+
+    Yields:
+        (line number, WeatherData) or (line number, error message)
+
+    Raises:
+        IngestFormatError: If the header is missing required columns
+    """
+    reader = csv.reader(line.decode('utf-8') for line in lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip() for name in header]
+    missing = [name for name in INGEST_FIELDS if name not in header]
+    if missing:
+        raise IngestFormatError(f"CSV header is missing columns: {', '.join(missing)}")
+
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            yield reader.line_num, f"expected {len(header)} columns, got {len(row)}"
+            continue
+        try:
+            yield reader.line_num, validate_record(dict(zip(header, row)))
+        except ValueError as e:
+            yield reader.line_num, str(e)
+
+
+INGEST_PARSERS = {
+    'ndjson': parse_ndjson,
+    'csv': parse_csv,
+}
+
+
+def ingest_records(
+        repository: WeatherRepository,
+        records: Iterable[ParsedRecord],
+        batch_size: int = INGEST_BATCH_SIZE,
+        on_batch: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Save parsed records in chunked transactions.
+
+    Each batch of valid readings is committed on its own, so a large
+    upload never holds the write lock for long and memory use stays
+    bounded by batch_size.
+
+    Args:
+        repository: Repository that receives the readings
+        records: Output of parse_ndjson or parse_csv
+        batch_size: Records (valid or not) per transaction
+        on_batch: Called with each batch result after its commit (optional)
+
+    Returns:
+        Dictionary with accepted/rejected totals and per-batch results
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    records = iter(records)
+    batches = []
+    accepted = rejected = 0
+
+    while True:
+        chunk = list(islice(records, batch_size))
+        if not chunk:
+            break
+
+        readings = []
+        errors = []
+        for number, result in chunk:
+            if isinstance(result, WeatherData):
+                readings.append(result)
+            else:
+                errors.append({'line': number, 'error': result})
+
+        if readings:
+            repository.save_many(readings, bulk=len(readings) >= BULK_SAVE_MIN_ROWS)
+
+        batch = {
+            'batch': len(batches) + 1,
+            'first_line': chunk[0][0],
+            'last_line': chunk[-1][0],
+            'accepted': len(readings),
+            'rejected': len(errors),
+            'errors': errors[:MAX_REPORTED_ERRORS]
+        }
+        batches.append(batch)
+        accepted += len(readings)
+        rejected += len(errors)
+        if on_batch is not None:
+            on_batch(batch)
+
+    return {'accepted': accepted, 'rejected': rejected, 'batches': batches}
@@ -0,0 +1,181 @@
+"""
+Background jobs for long-running work such as large seeds.
+"""
+
+import logging
+import queue
+import threading
+import time
+import uuid
+from typing import Optional
+from .database import BULK_SAVE_MIN_ROWS, WeatherRepository
+from .generator import WeatherGenerator
+from .threads import ForkSafeThreads
+
+
+logger = logging.getLogger(__name__)
+
+
+# Readings generated and committed per transaction by seed jobs
+SEED_CHUNK_SIZE = 10000
+
+
+class JobManager:
+    """
+    Runs queued jobs on a small pool of background threads.
+
+    Job state is stored through the repository, so progress can be read
+    and cancellation requested from any process; the work itself runs in
+    the process that accepted the job. Jobs check for cancellation after
+    every chunk, so they stop within one chunk of the request.
+    """
+
+    def __init__(
+            self,
+            repository: WeatherRepository,
+            workers: int = 2,
+            chunk_size: int = SEED_CHUNK_SIZE
+    ):
+        """
+        Initialize manager in front of a repository.
+
+        Args:
+            repository: Repository that stores job state and readings
+            workers: Number of jobs run at the same time
+            chunk_size: Readings per transaction
+        """
+        self.repository = repository
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+        self._queue: queue.Queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._workers = ForkSafeThreads(
+            self._run, "weather-jobs", count=workers, on_start=self._stopping.clear
+        )
+
+    def start(self) -> None:
+        """
+        Start the worker threads in this process if they aren't running.
+        """
+        self._workers.ensure_started()
+
+    def submit_seed(self, location: Optional[str], count: int) -> dict:
+        """
+        Queue a job that generates and saves readings.
+
+        Args:
+            location: City or region name (None picks random locations)
+            count: Number of readings to generate
+
+        Returns:
+            Job description (see get())
+        """
+        job_id = uuid.uuid4().hex
+        self.repository.create_job(job_id, 'seed', {'location': location, 'count': count}, count)
+        self.start()
+        self._queue.put((job_id, location, count))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Describe a job's progress.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Stored job state plus progress (0-1), elapsed_seconds and
+            rows_per_sec, or None if the job doesn't exist
+        """
+        job = self.repository.get_job(job_id)
+        if job is None:
+            return None
+
+        elapsed = None
+        if job['started_ms'] is not None:
+            end_ms = job['finished_ms'] or int(time.time() * 1000)
+            elapsed = max(end_ms - job['started_ms'], 0) / 1000
+
+        job['progress'] = job['done'] / job['total'] if job['total'] else 1.0
+        job['elapsed_seconds'] = elapsed
+        job['rows_per_sec'] = round(job['done'] / elapsed) if elapsed else None
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Ask a job to stop after its current chunk.
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            Job description, or None if the job doesn't exist
+        """
+        self.repository.request_job_cancel(job_id)
+        return self.get(job_id)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the workers, cancelling running and queued jobs.
+
+        Args:
+            timeout: Seconds to wait for each running job to stop
+        """
+        self._stopping.set()
+        self._workers.join(timeout)
+
+        # Jobs nobody picked up would otherwise stay queued forever
+        while True:
+            try:
+                job_id = self._queue.get_nowait()[0]
+            except queue.Empty:
+                break
+            self.repository.finish_job(job_id, 'cancelled', 'Server shut down')
+
+    def _run(self) -> None:
+        """
+        Worker loop: run queued jobs until stopped.
+        """
+        while not self._stopping.is_set():
+            try:
+                job_id, location, count = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self._run_seed(job_id, location, count)
+            except Exception as e:
+                logger.exception("Seed job %s failed", job_id)
+                self.repository.finish_job(job_id, 'failed', str(e))
+
+    def _run_seed(self, job_id: str, location: Optional[str], count: int) -> None:
+        """
+        Generate and save readings chunk by chunk.
+
+        Args:
+            job_id: Job identifier
+            location: City or region name (None picks random locations)
+            count: Number of readings to generate
+        """
+        if not self.repository.start_job(job_id):
+            self.repository.finish_job(job_id, 'cancelled', 'Cancelled before start')
+            return
+
+        done = 0
+        while done < count:
+            size = min(self.chunk_size, count - done)
+            if location is None:
+                batch = WeatherGenerator.generate_random_batch(size)
+            else:
+                batch = WeatherGenerator.generate_batch(location, size)
+
+            # Large chunks take the trigger-free bulk path
+            done += self.repository.save_many(batch, bulk=size >= BULK_SAVE_MIN_ROWS)
+
+            cancelled = self.repository.update_job_progress(job_id, done)
+            if cancelled or self._stopping.is_set():
+                reason = 'Cancelled' if cancelled else 'Server shut down'
+                self.repository.finish_job(job_id, 'cancelled', reason)
+                return
+
+        self.repository.finish_job(job_id, 'completed')
@@ -0,0 +1,353 @@
+"""
+Prometheus metrics shared across worker processes.
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: archiving dead workers' files is unlocked
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Histogram upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Metric name -> (type, help text)
+METRICS = {
+    'weather_http_requests_total': (
+        'counter', 'HTTP requests handled, by route, method and status'),
+    'weather_http_request_duration_seconds': (
+        'histogram', 'Time until the response is returned, by route and method'),
+    'weather_http_requests_in_progress': (
+        'gauge', 'HTTP requests currently being handled, by route and method'),
+    'weather_db_query_duration_seconds': (
+        'histogram', 'WeatherRepository call duration, by method'),
+    'weather_db_query_rows_total': (
+        'counter', 'Rows returned or written by WeatherRepository calls, by method'),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Sorted (name, value) label pairs
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms aggregated across processes.
+
+    Updates only touch in-memory dictionaries. A background thread writes
+    each process's values to {directory}/{pid}.json about once a second,
+    and render() merges every process's file, so a scrape answered by any
+    gunicorn worker reports totals for all of them. Files left by exited
+    workers are folded into archive.json so their counts are kept.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 1.0, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize an empty registry.
+
+        Args:
+            directory: Directory shared by all workers for snapshot files
+            flush_interval: Seconds between snapshot writes
+            buckets: Histogram upper bounds, ascending
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+
+        self._counters: Dict[MetricKey, float] = {}
+        self._gauges: Dict[MetricKey, float] = {}
+        # key -> per-bucket counts (last one is +Inf), then sum
+        self._histograms: Dict[MetricKey, list] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def inc(self, name: str, labels: Labels, value: float = 1.0) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name: Metric name from METRICS
+            labels: Sorted (name, value) label pairs
+            value: Amount to add
+        """
+        self._ensure_flusher()
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+            self._dirty = True
+
+    def add(self, name: str, labels: Labels, delta: float) -> None:
+        """
+        Move a gauge up or down.
+
+        Args:
+            name: Metric name from METRICS
+            labels: Sorted (name, value) label pairs
+            delta: Amount to add (negative to subtract)
+        """
+        self._ensure_flusher()
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + delta
+            self._dirty = True
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        """
+        Record one histogram sample.
+
+        Args:
+            name: Metric name from METRICS
+            labels: Sorted (name, value) label pairs
+            value: Sample, e.g. seconds
+        """
+        self._ensure_flusher()
+        key = (name, labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+            self._dirty = True
+
+    def render(self) -> str:
+        """
+        Render every process's metrics in Prometheus text format.
+
+        Returns:
+            Exposition text
+        """
+        self.flush()
+        counters: Dict[MetricKey, float] = {}
+        gauges: Dict[MetricKey, float] = {}
+        histograms: Dict[MetricKey, list] = {}
+
+        for snapshot in self._load_snapshots():
+            _merge(counters, snapshot['counters'])
+            _merge(gauges, snapshot.get('gauges', []))
+            for name, labels, values in snapshot['histograms']:
+                key = (name, _labels(labels))
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+                else:
+                    histograms[key] = list(values)
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'histogram':
+                for (metric, labels), values in sorted(histograms.items()):
+                    if metric == name:
+                        lines.extend(self._histogram_lines(name, labels, values))
+            else:
+                values = counters if kind == 'counter' else gauges
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        """
+        Write this process's values to its snapshot file if they changed.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = {
+                    'counters': [[k[0], k[1], v] for k, v in self._counters.items()],
+                    'gauges': [[k[0], k[1], v] for k, v in self._gauges.items()],
+                    'histograms': [[k[0], k[1], v] for k, v in self._histograms.items()],
+                }
+                self._dirty = False
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.json")
+            # Write then rename, so readers never see a partial file
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
+
+    def _ensure_flusher(self) -> None:
+        """Start the snapshot thread in this process if needed."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        if self._pid is not None:
+            # A forked worker inherits the parent's values (and possibly
+            # held locks); start from zero so nothing is counted twice
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            self._counters, self._gauges, self._histograms = {}, {}, {}
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name="weather-metrics", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        """Snapshot loop."""
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("Failed to write metrics snapshot")
+
+    def _load_snapshots(self) -> list:
+        """
+        Read every process's snapshot, archiving those of exited processes.
+        """
+        snapshots = []
+        with self._archive_lock():
+            archive_path = os.path.join(self.directory, "archive.json")
+            archive = _read_json(archive_path) or {'counters': [], 'histograms': []}
+            archived = False
+
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                stem = os.path.basename(path)[:-len(".json")]
+                if not stem.isdigit():
+                    continue
+                snapshot = _read_json(path)
+                if snapshot is None:
+                    continue
+                if _pid_alive(int(stem)):
+                    snapshots.append(snapshot)
+                    continue
+                # Keep an exited worker's counts, but not its gauges
+                archive['counters'].extend(snapshot['counters'])
+                archive['histograms'].extend(snapshot['histograms'])
+                os.remove(path)
+                archived = True
+
+            if archived:
+                archive = _compact(archive)
+                with open(archive_path + ".tmp", "w") as f:
+                    json.dump(archive, f)
+                os.replace(archive_path + ".tmp", archive_path)
+
+        snapshots.append(archive)
+        return snapshots
+
+    @contextmanager
+    def _archive_lock(self):
+        """Serialize archiving between workers rendering at the same time."""
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _histogram_lines(self, name: str, labels: Labels, values: list) -> list:
+        """Format one histogram as cumulative buckets, sum and count."""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), values[:-1]):
+            cumulative += count
+            le = "+Inf" if bound == float('inf') else _format_value(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+def _labels(pairs) -> Labels:
+    """Labels decoded from JSON lists back to hashable tuples."""
+    return tuple(tuple(pair) for pair in pairs)
+
+
+def _merge(target: Dict[MetricKey, float], entries) -> None:
+    """Add [name, labels, value] entries into target."""
+    for name, labels, value in entries:
+        key = (name, _labels(labels))
+        target[key] = target.get(key, 0.0) + value
+
+
+def _compact(archive: dict) -> dict:
+    """Combine duplicate archive entries into one per metric and labels."""
+    counters: Dict[MetricKey, float] = {}
+    _merge(counters, archive['counters'])
+    histograms: Dict[MetricKey, list] = {}
+    for name, labels, values in archive['histograms']:
+        key = (name, _labels(labels))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = list(values)
+    return {
+        'counters': [[k[0], k[1], v] for k, v in counters.items()],
+        'histograms': [[k[0], k[1], v] for k, v in histograms.items()],
+    }
+
+
+def _read_json(path: str) -> Optional[dict]:
+    """Load a snapshot file, or None if it vanished or is unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid is still running."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists but belongs to another user
+        return True
+    return True
+
+
+def _format_labels(labels: Labels) -> str:
+    """Format label pairs as {name="value",...}, escaped for Prometheus."""
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value, dropping a redundant .0."""
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
@@ -0,0 +1,151 @@
+"""
+On-demand cProfile profiling of individual requests.
+"""
+
+import cProfile
+import glob
+import hmac
+import os
+import pstats
+import random
+import re
+import time
+from typing import Optional
+
+
+# Profiles kept per route; older ones are deleted as new ones are written
+DEFAULT_MAX_PROFILES = 100
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and stores their profiles by route.
+
+    A request is profiled when it carries the configured token in the
+    profile header, or when it is picked by the sampling rate. Each
+    profile is written as a pstats file to {directory}/{route}/, where it
+    can be opened with pstats, snakeviz or flameprof, or merged with
+    load_profiles().
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            token: Optional[str] = None,
+            sample_rate: float = 0.0,
+            max_profiles: int = DEFAULT_MAX_PROFILES
+    ):
+        """
+        Initialize profiler.
+
+        Args:
+            directory: Directory receiving one subdirectory per route
+            token: Header value that requests a profile (None ignores the
+                header, so clients cannot trigger profiling)
+            sample_rate: Fraction of all requests profiled (0 disables sampling)
+            max_profiles: Profiles kept per route
+        """
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_profiles = max_profiles
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any request can be profiled at all."""
+        return bool(self.token) or self.sample_rate > 0
+
+    def wants(self, header_value: Optional[str]) -> bool:
+        """
+        Decide whether to profile a request.
+
+        Args:
+            header_value: Value of the request's profile header, if any
+
+        Returns:
+            True if the header carries the token or the request is sampled
+        """
+        if header_value and self.token and hmac.compare_digest(header_value, self.token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def start() -> Optional[cProfile.Profile]:
+        """
+        Start profiling the calling thread.
+
+        Returns:
+            Running profiler, or None if another profile is already active
+            where only one can run at a time (Python 3.12+)
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return None
+        return profile
+
+    def save(self, profile: cProfile.Profile, method: str, route: str) -> str:
+        """
+        Stop a profile and write it under its route's directory.
+
+        Args:
+            profile: Profiler returned by start()
+            method: HTTP method
+            route: URL rule of the request, e.g. /weather/historical/<location>
+
+        Returns:
+            Path of the written pstats file
+        """
+        profile.disable()
+        route_dir = os.path.join(self.directory, route_slug(method, route))
+        os.makedirs(route_dir, exist_ok=True)
+        path = os.path.join(route_dir, f"{time.time_ns()}-{os.getpid()}.pstats")
+        profile.dump_stats(path)
+        self._prune(route_dir)
+        return path
+
+    def _prune(self, route_dir: str) -> None:
+        """Delete the oldest profiles beyond max_profiles."""
+        # Names start with a nanosecond timestamp, so they sort by age
+        paths = sorted(glob.glob(os.path.join(route_dir, "*.pstats")))
+        for path in paths[:max(len(paths) - self.max_profiles, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Pruned concurrently by another worker
+                pass
+
+
+def route_slug(method: str, route: str) -> str:
+    """
+    Directory name for a route, e.g. GET_weather_historical_location.
+
+    Args:
+        method: HTTP method
+        route: URL rule
+
+    Returns:
+        Filesystem-safe name
+    """
+    # Drop converter names such as int: from <int:count>
+    route = re.sub(r"<(?:[^:<>]+:)?([^<>]+)>", r"\1", route)
+    return re.sub(r"[^A-Za-z0-9]+", "_", f"{method} {route}").strip("_")
+
+
+def load_profiles(directory: str, route: Optional[str] = None) -> Optional[pstats.Stats]:
+    """
+    Merge stored profiles into one set of statistics.
+
+    Args:
+        directory: Profiler directory
+        route: Route directory name from route_slug() (optional, defaults
+            to every route)
+
+    Returns:
+        Combined statistics, or None if no profiles are stored
+    """
+    paths = sorted(glob.glob(os.path.join(directory, route or "*", "*.pstats")))
+    if not paths:
+        return None
+    return pstats.Stats(*paths)
@@ -0,0 +1,253 @@
+"""
+Retention policies: deleting old readings and compacting the database.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from .database import RETENTION_CHUNK_SIZE, WeatherRepository
+from .threads import ForkSafeThreads
+
+
+logger = logging.getLogger(__name__)
+
+
+# Policy location that applies to every location without its own policy
+ALL_LOCATIONS = "*"
+
+# Age units accepted in policy specs
+AGE_UNITS = {
+    "m": timedelta(minutes=1),
+    "h": timedelta(hours=1),
+    "d": timedelta(days=1),
+    "w": timedelta(weeks=1),
+}
+
+POLICY_LIMIT = re.compile(r"^(\d+)(m|h|d|w|rows)$")
+
+
+@dataclass
+class RetentionPolicy:
+    """
+    Limits on how much history to keep for one location.
+    """
+    location: str  # Location name, or ALL_LOCATIONS
+    max_age: Optional[timedelta] = None
+    max_rows: Optional[int] = None
+
+
+def parse_policies(spec: str) -> Dict[str, RetentionPolicy]:
+    """
+    Parse a policy spec such as "*=30d,London=365d,Paris=100000rows".
+
+    Each entry is location=limit, where limit is an age (m, h, d or w)
+    or a row count (rows). A location listed twice gets both limits.
+
+    Args:
+        spec: Comma-separated entries
+
+    Returns:
+        Policies by location name ("*" for the default)
+
+    Raises:
+        ValueError: If an entry is malformed
+    """
+    policies: Dict[str, RetentionPolicy] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        location, _, limit = entry.rpartition("=")
+        location = location.strip()
+        match = POLICY_LIMIT.match(limit.strip())
+        if not location or match is None:
+            raise ValueError(
+                f"Invalid retention entry {entry!r}; expected location=<n>[m|h|d|w|rows]"
+            )
+        amount, unit = int(match.group(1)), match.group(2)
+        if amount < 1:
+            raise ValueError(f"Retention limit must be positive in {entry!r}")
+
+        policy = policies.setdefault(location, RetentionPolicy(location))
+        if unit == "rows":
+            policy.max_rows = amount
+        else:
+            policy.max_age = amount * AGE_UNITS[unit]
+    return policies
+
+
+class RetentionManager:
+    """
+    Enforces retention policies from a background thread.
+
+    Each run deletes expired readings location by location in small
+    transactions, then releases the freed pages with incremental_vacuum
+    and refreshes planner statistics with ANALYZE if anything was
+    deleted. Running in several worker processes is harmless: whoever
+    comes second finds nothing left to delete.
+    """
+
+    def __init__(
+            self,
+            repository: WeatherRepository,
+            policies: Dict[str, RetentionPolicy],
+            interval: float = 3600.0,
+            chunk_size: int = RETENTION_CHUNK_SIZE
+    ):
+        """
+        Initialize manager.
+
+        Args:
+            repository: Repository to delete readings from
+            policies: Policies by location name ("*" for the default)
+            interval: Seconds between runs
+            chunk_size: Readings deleted per transaction
+        """
+        self.repository = repository
+        self.policies = policies
+        self.interval = interval
+        self.chunk_size = chunk_size
+
+        self._stopping = threading.Event()
+        self._worker = ForkSafeThreads(
+            self._run, "weather-retention", on_start=self._stopping.clear
+        )
+
+        # Counters for monitoring
+        self.runs = 0
+        self.rows_deleted = 0
+        self.rows_deleted_by_location: Dict[str, int] = {}
+        self.pages_reclaimed = 0
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self) -> None:
+        """
+        Start the background thread in this process if it isn't running.
+
+        Cheap once running, so it can be called on every request.
+        """
+        self._worker.ensure_started()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stop the background thread after its current chunk.
+
+        Args:
+            timeout: Seconds to wait for it to stop
+        """
+        self._stopping.set()
+        self._worker.join(timeout)
+
+    def stats(self) -> dict:
+        """
+        Get retention counters and storage statistics for monitoring.
+
+        Returns:
+            Dictionary with run counts, rows deleted (in total and by
+            location), pages reclaimed, last run details and storage stats
+        """
+        return {
+            'policies': {
+                name: {
+                    'max_age_seconds': policy.max_age.total_seconds() if policy.max_age else None,
+                    'max_rows': policy.max_rows
+                }
+                for name, policy in self.policies.items()
+            },
+            'runs': self.runs,
+            'rows_deleted': self.rows_deleted,
+            'rows_deleted_by_location': dict(self.rows_deleted_by_location),
+            'pages_reclaimed': self.pages_reclaimed,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_duration_seconds': self.last_duration,
+            'last_error': self.last_error,
+            'storage': self.repository.get_storage_stats()
+        }
+
+    def run_once(self) -> dict:
+        """
+        Apply every policy once, then vacuum and analyze.
+
+        Returns:
+            Dictionary with rows deleted by location and pages reclaimed
+        """
+        started = time.perf_counter()
+        now = datetime.now()
+        deleted: Dict[str, int] = {}
+
+        for location in self.repository.get_all_locations():
+            policy = self.policies.get(location) or self.policies.get(ALL_LOCATIONS)
+            if policy is None:
+                continue
+            if self._stopping.is_set():
+                break
+            count = self.repository.delete_old_readings(
+                location,
+                older_than=now - policy.max_age if policy.max_age else None,
+                keep_rows=policy.max_rows,
+                chunk_size=self.chunk_size,
+                should_stop=self._stopping.is_set
+            )
+            if count:
+                deleted[location] = count
+
+        pages = self.repository.incremental_vacuum()
+        if deleted:
+            self.repository.analyze()
+
+        self.runs += 1
+        self.rows_deleted += sum(deleted.values())
+        for location, count in deleted.items():
+            self.rows_deleted_by_location[location] = (
+                self.rows_deleted_by_location.get(location, 0) + count
+            )
+        self.pages_reclaimed += pages
+        self.last_run = now
+        self.last_duration = round(time.perf_counter() - started, 3)
+        return {'rows_deleted': deleted, 'pages_reclaimed': pages}
+
+    def _run(self) -> None:
+        """
+        Background loop: run, then wait for the next interval.
+        """
+        while not self._stopping.is_set():
+            try:
+                result = self.run_once()
+                self.last_error = None
+                if result['rows_deleted']:
+                    logger.info(
+                        "Retention deleted %d readings, reclaimed %d pages",
+                        sum(result['rows_deleted'].values()), result['pages_reclaimed']
+                    )
+            except Exception as e:
+                # Keep the schedule; the next run retries
+                self.last_error = str(e)
+                logger.exception("Retention run failed")
+            self._stopping.wait(self.interval)
+
+
+def create_retention_from_env(repository: WeatherRepository) -> Optional[RetentionManager]:
+    """
+    Create a retention manager if enabled by environment variables.
+
+    WEATHER_RETENTION holds the policy spec (see parse_policies());
+    WEATHER_RETENTION_INTERVAL sets the seconds between runs.
+
+    Args:
+        repository: Repository to delete readings from
+
+    Returns:
+        Manager (not yet started), or None when no policy is configured
+    """
+    spec = os.environ.get('WEATHER_RETENTION', '').strip()
+    if not spec:
+        return None
+    return RetentionManager(
+        repository,
+        parse_policies(spec),
+        interval=float(os.environ.get('WEATHER_RETENTION_INTERVAL', 3600))
+    )
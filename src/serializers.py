@@ -0,0 +1,103 @@
+"""
+JSON serializers for API responses.
+"""
+
+import json
+import os
+from dataclasses import fields, is_dataclass
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+
+class StdlibSerializer:
+    """
+    Encodes responses with the standard library json module.
+
+    Model objects are converted through their to_dict() method.
+    """
+
+    name = "json"
+
+    @staticmethod
+    def _default(obj):
+        """Encode objects json doesn't handle natively."""
+        if hasattr(obj, "to_dict"):
+            return obj.to_dict()
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        if is_dataclass(obj):
+            return {f.name: getattr(obj, f.name) for f in fields(obj)}
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def dumps(self, obj) -> bytes:
+        """
+        Serialize an object to JSON bytes.
+
+        Args:
+            obj: Value to encode; may contain WeatherData and other models
+
+        Returns:
+            UTF-8 encoded JSON
+        """
+        return json.dumps(
+            obj, default=self._default, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+
+
+class OrjsonSerializer:
+    """
+    Encodes responses with orjson.
+
+    orjson serializes dataclasses and datetimes natively, so WeatherData
+    lists go straight to bytes without intermediate dicts. Datetimes use
+    the same ISO format as WeatherData.to_dict().
+    """
+
+    name = "orjson"
+
+    def dumps(self, obj) -> bytes:
+        """
+        Serialize an object to JSON bytes.
+
+        Args:
+            obj: Value to encode; may contain WeatherData and other models
+
+        Returns:
+            UTF-8 encoded JSON
+        """
+        return orjson.dumps(obj)
+
+
+SERIALIZERS = {
+    StdlibSerializer.name: StdlibSerializer,
+    OrjsonSerializer.name: OrjsonSerializer,
+}
+
+
+def get_serializer(name: str = None):
+    """
+    Create the configured serializer.
+
+    Args:
+        name: "json", "orjson" or "auto" (default: WEATHER_JSON_SERIALIZER
+            environment variable, else "auto")
+
+    Returns:
+        orjson serializer when requested or available in auto mode,
+        otherwise the stdlib serializer
+    """
+    name = name or os.environ.get("WEATHER_JSON_SERIALIZER", "auto")
+
+    if name == "auto":
+        name = OrjsonSerializer.name if orjson is not None else StdlibSerializer.name
+
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer: {name}")
+    if name == OrjsonSerializer.name and orjson is None:
+        raise RuntimeError("orjson is not installed")
+
+    return SERIALIZERS[name]()
@@ -0,0 +1,98 @@
+"""
+Background threads that are started lazily in each process.
+"""
+
+import os
+import threading
+from typing import Callable, List, Optional
+
+
+class ForkSafeThreads:
+    """
+    A small set of daemon threads running one target, started on demand.
+
+    Threads don't survive fork(): a gunicorn worker forked from a master
+    that already started them inherits this object but not the running
+    threads. The owning process is recorded with the threads, so the
+    first ensure_started() in each worker starts its own.
+    """
+
+    def __init__(
+            self,
+            target: Callable[[], None],
+            name: str,
+            count: int = 1,
+            on_start: Optional[Callable[[], None]] = None
+    ):
+        """
+        Initialize without starting anything.
+
+        Args:
+            target: Function each thread runs
+            name: Thread name (numbered when count > 1)
+            count: Number of threads
+            on_start: Called just before new threads start, e.g. to reset
+                a stop flag left over from close()
+        """
+        self.target = target
+        self.name = name
+        self.count = count
+        self.on_start = on_start
+
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether the threads were started in this process and not discarded."""
+        return bool(self._threads) and self._pid == os.getpid()
+
+    def ensure_started(self) -> bool:
+        """
+        Start the threads in this process if they aren't running.
+
+        Cheap once running, so it can be called on every use.
+
+        Returns:
+            True if new threads were started
+        """
+        if self.running:
+            return False
+        with self._lock:
+            if self.running:
+                return False
+            if self.on_start is not None:
+                self.on_start()
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(
+                    target=self.target,
+                    name=self.name if self.count == 1 else f"{self.name}-{i}",
+                    daemon=True
+                )
+                for i in range(self.count)
+            ]
+            for thread in self._threads:
+                thread.start()
+            return True
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the threads to finish, then forget them.
+
+        The caller must already have told them to stop.
+
+        Args:
+            timeout: Seconds to wait for each thread (None waits forever)
+        """
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def discard(self) -> None:
+        """
+        Forget the threads without waiting, e.g. from a thread that is
+        about to exit on its own, so the next ensure_started() starts new ones.
+        """
+        self._threads = []
@@ -3,10 +3,47 @@ Example usage and testing script.
 
 """
 
-from datetime import datetime
-from src.generator import WeatherGenerator
+import asyncio
+import io
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from itertools import islice
+from urllib.parse import quote
+from werkzeug.test import EnvironBuilder
+from src.generator import WeatherGenerator, np
 from src.database import WeatherRepository
+from src.cache import estimate_size
 from src.data_model import WeatherData
+from src.events import ReadingBroker
+from src.ingest import (
+    IngestFormatError, WriteBehindBuffer, ingest_records, parse_csv, parse_ndjson
+)
+from src.jobs import JobManager
+from src.metrics import MetricsRegistry
+from src.profiling import RequestProfiler, load_profiles, route_slug
+from src.retention import RetentionManager, parse_policies
+from src.serializers import SERIALIZERS, orjson
+from src.threads import ForkSafeThreads
+
+
+def load_api():
+    """
+    Import the Flask app, pointed at a throwaway database.
+
+    The app's database, metrics and profile paths are read from the
+    environment on first import, so it must not happen at module level.
+    """
+    if "src.api" not in sys.modules:
+        os.environ["WEATHER_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "api.db")
+    from src import api
+    return api
 
 
 def test_models():
@@ -44,6 +81,14 @@ def test_models():
         wind_speed=20.5
     )
     print(f"weather == weather2: {weather == weather2}")
+
+    # Round trip through a database-shaped row
+    row = (weather.timestamp.isoformat(), "London", 15.5, 70.0, "Rainy", 20.5)
+    assert WeatherData.from_row(row) == weather
+    assert WeatherData.from_dict(weather.to_dict()) == weather
+    assert list(weather.to_dict()) == [
+        'timestamp', 'location', 'temperature', 'humidity', 'condition', 'wind_speed'
+    ]
     print()
 
 
@@ -86,7 +131,7 @@ def test_repository():
     print("=" * 50)
 
     # Create repository with test database
-    repo = WeatherRepository("test_weather.db")
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "test_weather.db"))
 
     # Generate and save some data
     print("Saving weather data...")
@@ -110,6 +155,1513 @@ def test_repository():
     print()
 
 
+def test_connection_pool():
+    """
+    Test pooled per-thread connections in WeatherRepository.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository connection pool")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "pool.db"))
+
+    # Same thread reuses one connection
+    conn = repo._get_connection()
+    assert repo._get_connection() is conn
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    print(f"Journal mode: {journal_mode}")
+    assert journal_mode == "wal"
+
+    # Other threads get their own connection
+    other = []
+    thread = threading.Thread(target=lambda: other.append(repo._get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    print(f"Open connections: {len(repo._connections)}")
+
+    # Data written on one thread is visible to the others
+    repo.save(WeatherGenerator.generate("Oslo"))
+    assert repo.get_latest("Oslo") is not None
+
+    repo.close()
+    assert repo._connections == []
+    print()
+
+
+def test_save_many():
+    """
+    Test bulk inserts through WeatherRepository.save_many.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository.save_many")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "bulk.db"))
+
+    # Generators are consumed in chunks smaller than the input
+    batch = (WeatherGenerator.generate("Lisbon") for _ in range(25))
+    saved = repo.save_many(batch, chunk_size=10)
+    print(f"Saved {saved} readings")
+    assert saved == 25
+    assert len(repo.get_historical("Lisbon", limit=100)) == 25
+
+    # Empty input is a no-op
+    assert repo.save_many([]) == 0
+    repo.close()
+    print()
+
+
+def test_write_behind():
+    """
+    Test batched writes through WriteBehindBuffer.
+    """
+    print("=" * 50)
+    print("Testing WriteBehindBuffer")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "buffer.db"))
+    buffer = WriteBehindBuffer(repo, max_size=100, batch_size=20, flush_interval=0.05)
+
+    for _ in range(50):
+        assert buffer.submit(WeatherGenerator.generate("Dublin"))
+    buffer.flush()
+    print(f"Buffer stats: {buffer.stats()}")
+    assert buffer.queue_depth == 0
+    assert len(repo.get_historical("Dublin", limit=100)) == 50
+
+    # Closing writes anything still queued
+    buffer.submit(WeatherGenerator.generate("Dublin"))
+    buffer.close()
+    assert buffer.written == 51
+    repo.close()
+    print()
+
+
+def test_schema_migration():
+    """
+    Test upgrading a database created before schema versioning.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository schema migration")
+    print("=" * 50)
+
+    # Build a legacy database with only the original table and index
+    db_path = os.path.join(tempfile.mkdtemp(), "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE weather (
+            timestamp TEXT NOT NULL,
+            location TEXT NOT NULL,
+            temperature REAL NOT NULL,
+            humidity REAL NOT NULL,
+            condition TEXT NOT NULL,
+            wind_speed REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_location ON weather(location)")
+    conn.executemany(
+        "INSERT INTO weather VALUES (?, 'Rome', 20.0, 50.0, 'Sunny', 5.0)",
+        [(f"2024-01-{day:02d}T12:00:00",) for day in range(1, 11)]
+    )
+    conn.commit()
+    conn.close()
+
+    # Opening the repository migrates in place
+    repo = WeatherRepository(db_path)
+    conn = repo._get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    print(f"Schema version: {version}")
+    assert version == len(repo._migrations())
+    assert conn.execute("SELECT COUNT(*) FROM weather WHERE ts IS NULL").fetchone()[0] == 0
+
+    # Queries use the numeric timestamp
+    assert repo.get_latest("Rome").timestamp == datetime(2024, 1, 10, 12)
+    week = repo.get_historical("Rome", datetime(2024, 1, 3), datetime(2024, 1, 9), limit=100)
+    print(f"Readings in range: {len(week)}")
+    assert len(week) == 6
+
+    # Location names moved into the dimension table with statistics
+    assert repo.get_all_locations() == ["Rome"]
+    stats = repo.get_location_stats()[0]
+    print(f"Location stats: {stats}")
+    assert stats['count'] == 10
+    assert stats['first_seen'] == "2024-01-01T12:00:00"
+    assert stats['last_seen'] == "2024-01-10T12:00:00"
+
+    # Deleting the newest reading must not free its rowid for reuse: SSE
+    # clients resume from it with Last-Event-ID
+    assert repo.get_high_water_mark() == 10
+    assert repo.delete_old_readings("Rome", older_than=datetime(2025, 1, 1)) == 10
+    repo.save(WeatherData(datetime(2024, 2, 1), "Rome", 18.0, 55.0, "Cloudy", 4.0))
+    assert repo.get_high_water_mark() == 11
+    # Triggers survived the table rebuild
+    assert repo.get_latest("Rome").timestamp == datetime(2024, 2, 1)
+    assert repo.get_location_stats()[0]['count'] == 1
+    repo.close()
+    print()
+
+
+def test_latest_table():
+    """
+    Test weather_latest maintenance and the latest-reading cache.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository latest readings")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "latest.db")
+    repo = WeatherRepository(db_path)
+
+    # Backdated readings don't replace a newer one
+    newest = WeatherData(datetime(2024, 6, 1), "Vienna", 25.0, 40.0, "Sunny", 10.0)
+    older = WeatherData(datetime(2024, 5, 1), "Vienna", 12.0, 80.0, "Rainy", 20.0)
+    repo.save(newest)
+    repo.save_many([older])
+    assert repo.get_latest("Vienna") == newest
+
+    # Writes from this repository invalidate the cache
+    newer = WeatherData(datetime(2024, 7, 1), "Vienna", 30.0, 30.0, "Sunny", 5.0)
+    repo.save(newer)
+    assert repo.get_latest("Vienna") == newer
+
+    # Writes from another connection (e.g. another worker) are seen too
+    other = WeatherRepository(db_path)
+    newest = WeatherData(datetime(2024, 8, 1), "Vienna", 28.0, 35.0, "Cloudy", 8.0)
+    other.save(newest)
+    print(f"Latest after external write: {repo.get_latest('Vienna')}")
+    assert repo.get_latest("Vienna") == newest
+
+    other.close()
+    repo.close()
+    print()
+
+
+def test_rollups():
+    """
+    Test hourly/daily rollups maintained on insert and by backfill.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository rollups")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "rollup.db"))
+
+    readings = [
+        WeatherData(datetime(2024, 3, 1, 9, 15), "Madrid", 10.0, 60.0, "Sunny", 5.0),
+        WeatherData(datetime(2024, 3, 1, 9, 45), "Madrid", 20.0, 40.0, "Rainy", 15.0),
+        WeatherData(datetime(2024, 3, 1, 14, 0), "Madrid", 30.0, 20.0, "Sunny", 10.0),
+    ]
+    repo.save_many(readings)
+
+    hours = repo.get_aggregates("Madrid", "hour")
+    print(f"Hourly buckets: {[h.to_dict() for h in hours]}")
+    assert [h.count for h in hours] == [1, 2]
+    assert hours[1].temperature_min == 10.0
+    assert hours[1].temperature_max == 20.0
+    assert hours[1].temperature_mean == 15.0
+    assert hours[1].conditions == {"Sunny": 1, "Rainy": 1}
+
+    days = repo.get_aggregates("Madrid", "day", start=datetime(2024, 3, 1, 12))
+    assert len(days) == 1
+    assert days[0].count == 3
+    assert days[0].conditions == {"Sunny": 2, "Rainy": 1}
+
+    # Backfill rebuilds identical rollups from the raw readings
+    assert repo.backfill_rollups() == 3
+    assert repo.get_aggregates("Madrid", "hour") == hours
+    repo.close()
+    print()
+
+
+def test_historical_pagination():
+    """
+    Test keyset cursor pagination of historical readings.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository cursor pagination")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "pages.db"))
+
+    # Duplicate timestamps must not be skipped or repeated across pages
+    stamp = datetime(2024, 2, 1)
+    repo.save_many(
+        WeatherData(stamp.replace(hour=i // 2), "Athens", float(i), 50.0, "Sunny", 1.0)
+        for i in range(25)
+    )
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = repo.get_historical_page("Athens", limit=10, cursor=cursor)
+        seen.extend(w.temperature for w in page)
+        print(f"Page of {len(page)}, next cursor: {cursor}")
+        if cursor is None:
+            break
+
+    assert len(seen) == 25
+    assert sorted(seen) == [float(i) for i in range(25)]
+    assert repo.get_historical("Athens", limit=100) == repo.get_historical_page("Athens", limit=100)[0]
+
+    # Streaming export yields the same rows in the same order
+    streamed = list(repo.iter_historical("Athens", fetch_size=7))
+    assert streamed == repo.get_historical("Athens", limit=100)
+
+    # An export may be advanced from other threads while this thread
+    # keeps writing; it never uses this thread's pooled connection
+    connections = len(repo._connections)
+    export = repo.iter_historical("Athens", fetch_size=5)
+    first = next(export)
+    repo.save(WeatherGenerator.generate("Athens"))
+    rest = []
+    for _ in range(3):
+        worker = threading.Thread(target=lambda: rest.extend(islice(export, 8)))
+        worker.start()
+        worker.join()
+    export.close()
+    assert [first] + rest == streamed
+    assert len(repo._connections) == connections
+    repo.close()
+    print()
+
+
+def test_columnar_batches():
+    """
+    Test vectorized generation and the columnar save path.
+    """
+    print("=" * 50)
+    print("Testing columnar batches")
+    print("=" * 50)
+
+    if np is None:
+        print("numpy not installed, skipping")
+        return
+
+    # Same seed, same batch
+    end = datetime(2024, 4, 1)
+    columns = WeatherGenerator.generate_columns(
+        500, ["Lima", "Quito"], seed=42, end=end, interval=timedelta(minutes=10)
+    )
+    again = WeatherGenerator.generate_columns(
+        500, ["Lima", "Quito"], seed=42, end=end, interval=timedelta(minutes=10)
+    )
+    assert columns.to_weather_list() == again.to_weather_list()
+    assert columns.to_weather_list()[-1].timestamp == end
+
+    # Bulk path must leave derived tables exactly as per-row triggers do
+    tmp_dir = tempfile.mkdtemp()
+    bulk = WeatherRepository(os.path.join(tmp_dir, "columns.db"))
+    rows = WeatherRepository(os.path.join(tmp_dir, "rows.db"))
+    assert bulk.save_columns(columns, chunk_size=128) == 500
+    rows.save_many(columns.to_weather_list())
+
+    print(f"Location stats: {bulk.get_location_stats()}")
+    assert bulk.get_location_stats() == rows.get_location_stats()
+    for location in ["Lima", "Quito"]:
+        assert bulk.get_latest(location) == rows.get_latest(location)
+        assert bulk.get_aggregates(location, "hour") == rows.get_aggregates(location, "hour")
+        assert bulk.get_aggregates(location, "day") == rows.get_aggregates(location, "day")
+        assert bulk.get_historical(location, limit=10) == rows.get_historical(location, limit=10)
+
+    # A load killed mid-way leaves the triggers and indexes dropped; the
+    # next repository opened on the file must rebuild them
+    bulk.close()
+    killed = subprocess.run([sys.executable, "-c", f"""
+import os
+from datetime import datetime
+from src.database import WeatherRepository
+from src.generator import WeatherGenerator
+
+def batches():
+    yield WeatherGenerator.generate_columns(10, ["Lima"], seed=7, end=datetime(2024, 5, 1))
+    os._exit(9)
+
+WeatherRepository({bulk.db_path!r}).bulk_load(batches())
+"""], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert killed.returncode == 9
+    conn = sqlite3.connect(bulk.db_path)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    conn.close()
+    assert "idx_location_ts" not in names and "trg_weather_latest" not in names
+
+    bulk = WeatherRepository(bulk.db_path)
+    conn = sqlite3.connect(bulk.db_path)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    conn.close()
+    assert {"idx_location_ts", "trg_weather_latest", "trg_weather_rollup",
+            "trg_weather_version"} <= names
+    bulk.save(WeatherData(datetime(2024, 6, 1), "Lima", 20.0, 80.0, "Cloudy", 3.0))
+    assert bulk.get_latest("Lima").timestamp == datetime(2024, 6, 1)
+
+    bulk.close()
+    rows.close()
+    print()
+
+
+def test_serializers():
+    """
+    Test that every serializer matches the to_dict() response shape.
+    """
+    print("=" * 50)
+    print("Testing JSON serializers")
+    print("=" * 50)
+
+    readings = WeatherGenerator.generate_batch("Zürich", 3)
+    readings.append(WeatherData(datetime(2024, 1, 1), "Oslo", -3.0, 80.0, "Snowy", 12.5))
+    payload = {'status': 'success', 'count': len(readings), 'data': readings}
+    expected = {'status': 'success', 'count': len(readings), 'data': [w.to_dict() for w in readings]}
+
+    for name, serializer_class in SERIALIZERS.items():
+        if name == "orjson" and orjson is None:
+            print("orjson not installed, skipping")
+            continue
+        body = serializer_class().dumps(payload)
+        print(f"{name}: {len(body)} bytes")
+        assert json.loads(body) == expected
+    print()
+
+
+def test_data_versions():
+    """
+    Test per-location data versions used for HTTP validators.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository data versions")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "versions.db")
+    repo = WeatherRepository(db_path)
+    assert repo.get_data_version("Seoul") is None
+    assert repo.get_data_version() is None
+
+    repo.save(WeatherGenerator.generate("Seoul"))
+    seoul = repo.get_data_version("Seoul")
+    everything = repo.get_data_version()
+    print(f"Seoul version: {seoul}, all locations: {everything}")
+
+    # Unrelated writes leave a location's version alone
+    repo.save_many(WeatherGenerator.generate_batch("Busan", 3))
+    assert repo.get_data_version("Seoul") == seoul
+    assert repo.get_data_version() != everything
+
+    # Writes through another connection are picked up
+    other = WeatherRepository(db_path)
+    other.save(WeatherGenerator.generate("Seoul"))
+    assert repo.get_data_version("Seoul")[0] != seoul[0]
+
+    # Emptying a location must not bring back a tag clients already hold
+    fresh = WeatherRepository(os.path.join(tempfile.mkdtemp(), "emptied.db"))
+    fresh.save(WeatherGenerator.generate("Busan"))
+    busan_only = fresh.get_data_version()
+    fresh.save(WeatherGenerator.generate("Seoul"))
+    assert fresh.delete_old_readings("Seoul", older_than=datetime.now() + timedelta(days=1)) == 1
+    assert fresh.get_data_version("Seoul") is None
+    assert fresh.get_data_version()[0] != busan_only[0]
+    fresh.close()
+
+    other.close()
+    repo.close()
+    print()
+
+
+def test_query_cache():
+    """
+    Test cached reads, per-location invalidation and the byte budget.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository query cache")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "cache.db")
+    repo = WeatherRepository(db_path)
+    repo.save_many(WeatherGenerator.generate_batch("Lima", 5))
+    repo.save_many(WeatherGenerator.generate_batch("Quito", 5))
+
+    lima = repo.get_historical("Lima", limit=3)
+    quito = repo.get_historical("Quito", limit=3)
+    assert repo.get_historical("Lima", limit=3) == lima
+    assert repo.cache_stats()['hits'] == 1
+
+    # Hits are copies, so callers can't change what's cached
+    lima.clear()
+    assert len(repo.get_historical("Lima", limit=3)) == 3
+    stats = repo.get_location_stats()
+    stats[0]['count'] = -1
+    assert repo.get_location_stats()[0]['count'] == 5
+    lima = repo.get_historical("Lima", limit=3)
+
+    # Writing one location keeps the other's results cached
+    hits = repo.cache_stats()['hits']
+    repo.save(WeatherGenerator.generate("Lima"))
+    assert repo.get_historical("Quito", limit=3) == quito
+    assert repo.cache_stats()['hits'] == hits + 1
+    assert repo.get_historical("Lima", limit=3) != lima
+    assert len(repo.get_historical("Lima", limit=10)) == 6
+
+    # Writes through another connection invalidate just that location
+    locations = repo.get_all_locations()
+    other = WeatherRepository(db_path)
+    other.save(WeatherGenerator.generate("Quito"))
+    assert repo.get_latest("Quito") == other.get_latest("Quito")
+    repo.get_historical("Lima", limit=10)
+    hits = repo.cache_stats()['hits']
+    repo.get_historical("Lima", limit=10)
+    assert repo.cache_stats()['hits'] == hits + 1
+    misses = repo.cache_stats()['misses']
+    assert repo.get_all_locations() == locations
+    assert repo.cache_stats()['misses'] == misses + 1
+    other.close()
+
+    stats = repo.cache_stats()
+    print(f"Cache stats: {stats}")
+    assert stats['invalidations'] > 0 and stats['size_bytes'] <= stats['max_bytes']
+    repo.close()
+
+    # A tiny budget evicts least recently used results
+    small = WeatherRepository(db_path, cache_max_bytes=4096)
+    small.get_historical("Lima", limit=10)
+    small.get_historical("Quito", limit=10)
+    small.get_historical("Lima", limit=5)
+    assert small.cache_stats()['evictions'] > 0
+    assert small.cache_stats()['size_bytes'] <= 4096
+    small.close()
+
+    # A (readings, cursor) page is sized once, not once per tuple item
+    readings = WeatherGenerator.generate_batch("Lima", 100)
+    assert estimate_size((readings, None)) < 1.5 * estimate_size(readings)
+    print()
+
+
+def test_latest_many():
+    """
+    Test fetching the latest reading of several locations at once.
+    """
+    print("=" * 50)
+    print("Testing WeatherRepository.get_latest_many")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "latest_many.db")
+    repo = WeatherRepository(db_path)
+    for location in ("Oslo", "Bergen", "Tromso"):
+        repo.save_many(WeatherGenerator.generate_batch(location, 4))
+
+    # Warm one entry so the rest come from a single query
+    repo.get_latest("Bergen")
+    latest = repo.get_latest_many(["Tromso", "Nowhere", "Bergen", "Tromso"])
+    print(f"Latest: {list(latest)}")
+    assert list(latest) == ["Tromso", "Bergen"]
+    assert latest["Tromso"] == repo.get_latest("Tromso")
+
+    everything = repo.get_latest_many()
+    assert list(everything) == ["Bergen", "Oslo", "Tromso"]
+
+    # A new reading replaces that location's entry
+    weather = WeatherGenerator.generate("Oslo")
+    repo.save(weather)
+    assert repo.get_latest_many()["Oslo"] == weather
+    assert repo.get_latest_many(["Oslo"])["Oslo"] == weather
+
+    repo.close()
+    print()
+
+
+def test_ingest():
+    """
+    Test parsing, validating and batching pushed NDJSON/CSV readings.
+    """
+    print("=" * 50)
+    print("Testing bulk ingest")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "ingest.db")
+    repo = WeatherRepository(db_path)
+
+    ndjson = [
+        b'{"timestamp": "2024-05-01T12:00:00", "location": "Accra", "temperature": 31.5,'
+        b' "humidity": 70, "condition": "Sunny", "wind_speed": 12.0}\n',
+        b'\n',
+        b'{"timestamp": "2024-05-01T13:00:00+02:00", "location": "Accra", "temperature": 30.1,'
+        b' "humidity": 72.5, "condition": "Cloudy", "wind_speed": 8.5}\n',
+        b'{"timestamp": "2024-05-01T14:00:00", "location": "Accra", "temperature": 30.0,'
+        b' "humidity": 140, "condition": "Sunny", "wind_speed": 5.0}\n',
+        b'{"location": "Accra"}\n',
+        b'not json\n',
+    ]
+    result = ingest_records(repo, parse_ndjson(ndjson), batch_size=3)
+    print(f"NDJSON result: {result}")
+    assert result['accepted'] == 2 and result['rejected'] == 3
+    assert [b['accepted'] for b in result['batches']] == [2, 0]
+    assert result['batches'][0]['errors'][0]['line'] == 4
+
+    # Aware timestamps are stored as naive UTC
+    oldest = repo.get_historical("Accra")[-1]
+    assert oldest.timestamp == datetime(2024, 5, 1, 11, 0) and oldest.condition == "Cloudy"
+
+    csv_body = [
+        b'location,timestamp,temperature,humidity,condition,wind_speed\n',
+        b'Nairobi,2024-05-01T12:00:00,22.0,55.0,Rainy,3.2\n',
+        b'Nairobi,2024-05-01T13:00:00,abc,55.0,Rainy,3.2\n',
+        b'Nairobi,2024-05-01T14:00:00,23.0\n',
+    ]
+    result = ingest_records(repo, parse_csv(csv_body))
+    assert result['accepted'] == 1 and result['rejected'] == 2
+    assert repo.get_latest("Nairobi").temperature == 22.0
+
+    try:
+        list(parse_csv([b'location,temperature\n']))
+        assert False, "expected IngestFormatError"
+    except IngestFormatError as e:
+        print(f"Bad header rejected: {e}")
+
+    repo.close()
+    print()
+
+
+def test_reading_broker():
+    """
+    Test live fan-out of new readings to subscribers.
+    """
+    print("=" * 50)
+    print("Testing ReadingBroker")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "broker.db")
+    repo = WeatherRepository(db_path)
+    repo.save(WeatherGenerator.generate("Lisbon"))
+    broker = ReadingBroker(repo, poll_interval=0.05)
+
+    lisbon = broker.subscribe("Lisbon")
+    everything = broker.subscribe()
+    slow = broker.subscribe(max_queued=2)
+    assert lisbon.start_id == 1
+
+    # Writes in this process wake the broker
+    repo.save(WeatherGenerator.generate("Porto"))
+    repo.save(WeatherGenerator.generate("Lisbon"))
+    assert everything.get(2.0)[1].location == "Porto"
+    event_id, weather = lisbon.get(2.0)
+    assert event_id == 3 and weather.location == "Lisbon"
+
+    # Writes from another connection (e.g. another worker) are polled
+    other = WeatherRepository(db_path)
+    other.save_many(WeatherGenerator.generate_batch("Lisbon", 3))
+    received = [lisbon.get(2.0)[0] for _ in range(3)]
+    print(f"Received event ids: {received}")
+    assert received == [4, 5, 6]
+    other.close()
+
+    # A consumer that never reads is dropped once its buffer is full
+    assert slow.dropped
+    assert [slow.get(0.1) is not None for _ in range(3)] == [True, True, False]
+    print(f"Broker stats: {broker.stats()}")
+    assert broker.stats()['dropped_subscribers'] == 1
+
+    broker.unsubscribe(lisbon)
+    broker.unsubscribe(everything)
+    assert broker.subscriber_count == 0
+    repo.close()
+    print()
+
+
+def test_seed_jobs():
+    """
+    Test background seed jobs, progress reporting and cancellation.
+    """
+    print("=" * 50)
+    print("Testing JobManager")
+    print("=" * 50)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "jobs.db")
+    repo = WeatherRepository(db_path)
+    jobs = JobManager(repo, workers=1, chunk_size=500)
+
+    job = jobs.submit_seed("Havana", 2000)
+    assert job['status'] == 'queued' and job['total'] == 2000
+
+    # Queued behind the first job, so it is cancelled before starting
+    doomed = jobs.submit_seed(None, 100000)
+    assert jobs.cancel(doomed['id'])['cancel_requested']
+
+    deadline = datetime.now() + timedelta(seconds=10)
+    while jobs.get(doomed['id'])['status'] in ('queued', 'running'):
+        assert datetime.now() < deadline, "jobs did not finish"
+        threading.Event().wait(0.05)
+
+    job = jobs.get(job['id'])
+    print(f"Finished job: {job}")
+    assert job['status'] == 'completed' and job['progress'] == 1.0
+    assert job['rows_per_sec'] > 0
+    assert repo.get_location_stats()[0]['count'] == 2000
+
+    doomed = jobs.get(doomed['id'])
+    assert doomed['status'] == 'cancelled' and doomed['done'] == 0
+
+    # Other processes see the same state through the database
+    other = WeatherRepository(db_path)
+    assert other.get_job(job['id'])['done'] == 2000
+    assert not other.request_job_cancel(job['id'])
+    assert jobs.get("missing") is None
+    other.close()
+
+    jobs.close()
+    repo.close()
+    print()
+
+
+def test_seed_job_routes():
+    """
+    Test the 202 seed response and the /weather/jobs/<id> endpoints.
+    """
+    print("=" * 50)
+    print("Testing seed job routes")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+
+    def wait_for_job(job_id):
+        deadline = datetime.now() + timedelta(seconds=20)
+        while True:
+            job = client.get(f"/weather/jobs/{job_id}").get_json()['job']
+            if job['status'] not in ('queued', 'running'):
+                return job
+            assert datetime.now() < deadline, "job did not finish"
+            threading.Event().wait(0.05)
+
+    # Small seeds still run inside the request
+    assert client.post("/weather/seed/Jobtown/10").status_code == 201
+
+    response = client.post("/weather/seed/Jobtown/2500")
+    body = response.get_json()
+    print(f"202 body: {body}")
+    assert response.status_code == 202
+    assert body['status'] == 'accepted' and body['job']['total'] == 2500
+    assert response.headers['Location'] == f"/weather/jobs/{body['job']['id']}"
+
+    job = wait_for_job(body['job']['id'])
+    assert job['status'] == 'completed' and job['done'] == 2500
+    assert len(api.repository.get_historical("Jobtown", limit=5000)) == 2510
+
+    # Unknown ids
+    assert client.get("/weather/jobs/missing").status_code == 404
+    assert client.delete("/weather/jobs/missing").status_code == 404
+
+    # Cancelling stops a running job after its current chunk
+    chunk_size, api.jobs.chunk_size = api.jobs.chunk_size, 1000
+    try:
+        job_id = client.post("/weather/seed/Canceltown/1000000").get_json()['job']['id']
+        deadline = datetime.now() + timedelta(seconds=10)
+        while client.get(f"/weather/jobs/{job_id}").get_json()['job']['done'] == 0:
+            assert datetime.now() < deadline, "job did not start"
+            threading.Event().wait(0.01)
+
+        response = client.delete(f"/weather/jobs/{job_id}")
+        assert response.status_code == 200
+        assert response.get_json()['job']['cancel_requested']
+        job = wait_for_job(job_id)
+    finally:
+        api.jobs.chunk_size = chunk_size
+    print(f"Cancelled job: {job}")
+    assert job['status'] == 'cancelled' and 0 < job['done'] < 1000000
+
+    # Nothing is written after the job stops
+    stored = api.repository.get_location_stats()
+    count = next(row['count'] for row in stored if row['location'] == 'Canceltown')
+    assert count == job['done']
+    threading.Event().wait(0.2)
+    assert client.get(f"/weather/jobs/{job_id}").get_json()['job']['done'] == job['done']
+    print()
+
+
+def asgi_request(adapter, method, path, query=b"", headers=(), body=(b"",)):
+    """
+    Drive an ASGI app through one request with a fake server.
+
+    Returns:
+        (status, headers dict, body bytes, number of body messages)
+    """
+    incoming = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(body) - 1}
+        for i, chunk in enumerate(body)
+    ]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": method, "path": path, "query_string": query,
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "http_version": "1.1",
+    }
+    asyncio.run(asyncio.wait_for(adapter(scope, receive, send), 10))
+    start, chunks = sent[0], sent[1:]
+    assert start["type"] == "http.response.start"
+    assert not chunks[-1].get("more_body")
+    return (
+        start["status"],
+        {name.decode(): value.decode() for name, value in start["headers"]},
+        b"".join(chunk["body"] for chunk in chunks),
+        len(chunks)
+    )
+
+
+def test_asgi_adapter():
+    """
+    Test the ASGI adapter: thread pool, request bodies, streams and SSE.
+    """
+    print("=" * 50)
+    print("Testing AsgiAdapter")
+    print("=" * 50)
+
+    api = load_api()
+    from src.asgi import AsgiAdapter
+    adapter = AsgiAdapter(api.app, max_threads=2)
+    assert adapter.executor._max_workers == 2
+    api.repository.save_many(WeatherGenerator.generate_batch("Asgiville", 2500))
+
+    # Fixed-length JSON response
+    status, headers, body, _ = asgi_request(adapter, "GET", "/weather/current/Asgiville")
+    assert status == 200 and headers["content-type"] == "application/json"
+    assert int(headers["content-length"]) == len(body)
+    assert json.loads(body)["data"]["location"] == "Asgiville"
+
+    # Chunked upload, split mid-record, with no Content-Length
+    lines = "".join(
+        json.dumps(w.to_dict()) + "\n" for w in WeatherGenerator.generate_batch("Asgiingest", 50)
+    ).encode()
+    status, _, body, _ = asgi_request(
+        adapter, "POST", "/weather/ingest", b"format=ndjson&batch_size=20",
+        headers=[("content-type", "application/x-ndjson")],
+        body=[lines[i:i + 777] for i in range(0, len(lines), 777)]
+    )
+    result = json.loads(body)
+    print(f"Chunked ingest: {status} {result['accepted']} accepted")
+    assert status == 200 and result["accepted"] == 50 and len(result["batches"]) == 3
+
+    # Streamed export arrives in several body messages
+    status, headers, body, messages = asgi_request(
+        adapter, "GET", "/weather/export/Asgiville", b"format=ndjson"
+    )
+    assert status == 200 and "content-length" not in headers
+    assert len(body.splitlines()) == 2500 and messages > 2
+
+    # SSE on the event loop: a reading arrives, then the client leaves
+    subscribers = api.broker.subscriber_count
+    gone = asyncio.Event()
+    sent = []
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        body = message.get("body", b"")
+        if body.startswith(b"retry:"):
+            # Subscribed; write one reading elsewhere, then one here
+            api.repository.save(WeatherGenerator.generate("Elsewhere"))
+            api.repository.save(WeatherGenerator.generate("Asgiville"))
+        elif b"event: reading" in body:
+            gone.set()
+
+    scope = {"type": "http", "method": "GET", "path": "/weather/stream/Asgiville",
+             "query_string": b"", "headers": [], "http_version": "1.1"}
+    asyncio.run(asyncio.wait_for(adapter(scope, receive, send), 10))
+
+    assert sent[0]["status"] == 200
+    assert dict(sent[0]["headers"])[b"content-type"].startswith(b"text/event-stream")
+    events = [m["body"] for m in sent[1:] if b"event: reading" in m.get("body", b"")]
+    print(f"SSE event: {events[0][:60]}...")
+    assert len(events) == 1 and b'"location":"Asgiville"' in events[0].replace(b" ", b"")
+    assert api.broker.subscriber_count == subscribers
+    adapter.executor.shutdown()
+    print()
+
+
+class TrickleStream(io.BytesIO):
+    """Request body that hands out at most 100 bytes per read."""
+
+    def read(self, size=-1):
+        return super().read(100 if size is None or size < 0 else min(size, 100))
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def test_ingest_route():
+    """
+    Test POST /weather/ingest through the Flask app.
+    """
+    print("=" * 50)
+    print("Testing /weather/ingest")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+
+    # Bad parameters are rejected before reading the body
+    response = client.post("/weather/ingest?format=xml", data="")
+    assert response.status_code == 400 and "Invalid format" in response.get_json()['message']
+    for batch_size in ("0", "50001", "many"):
+        response = client.post(f"/weather/ingest?batch_size={batch_size}", data="")
+        assert response.status_code == 400, batch_size
+
+    # A CSV body with only a header stores nothing
+    header = "timestamp,location,temperature,humidity,condition,wind_speed\n"
+    response = client.post("/weather/ingest", data=header, content_type="text/csv")
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'status': 'success', 'accepted': 0, 'rejected': 0, 'batches': []
+    }
+
+    # A bad CSV header is a client error
+    response = client.post("/weather/ingest?format=csv", data="when,where\n")
+    assert response.status_code == 400 and "missing columns" in response.get_json()['message']
+
+    # Invalid records are skipped and reported per batch
+    good = [json.dumps(w.to_dict()) for w in WeatherGenerator.generate_batch("Ingestburg", 3)]
+    body = "\n".join([good[0], "not json", good[1], good[2], '{"location": "Ingestburg"}'])
+    response = client.post("/weather/ingest?format=ndjson&batch_size=3", data=body)
+    result = response.get_json()
+    print(f"Mixed batches: {[(b['accepted'], b['rejected']) for b in result['batches']]}")
+    assert response.status_code == 200
+    assert (result['accepted'], result['rejected']) == (3, 2)
+    assert [(b['accepted'], b['rejected']) for b in result['batches']] == [(2, 1), (1, 1)]
+    assert [e['line'] for b in result['batches'] for e in b['errors']] == [2, 5]
+
+    # Chunked transfer encoding: no Content-Length, body in small pieces
+    lines = "".join(
+        json.dumps(w.to_dict()) + "\n" for w in WeatherGenerator.generate_batch("Ingestburg", 30)
+    ).encode()
+    response = client.post(
+        "/weather/ingest?format=ndjson&batch_size=7",
+        input_stream=TrickleStream(lines),
+        headers={"Transfer-Encoding": "chunked"},
+        environ_overrides={"wsgi.input_terminated": True}
+    )
+    result = response.get_json()
+    assert response.status_code == 200
+    assert result['accepted'] == 30 and len(result['batches']) == 5
+    assert len(api.repository.get_historical("Ingestburg", limit=100)) == 33
+    print()
+
+
+def test_export_route():
+    """
+    Test GET /weather/export/<location> in both formats.
+    """
+    print("=" * 50)
+    print("Testing /weather/export")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    readings = [
+        WeatherData(datetime(2024, 5, day), "Exportville", 10.0 + day, 50.0, "Sunny", 5.0)
+        for day in range(1, 6)
+    ]
+    api.repository.save_many(readings)
+
+    response = client.get("/weather/export/Exportville?format=ndjson")
+    assert response.status_code == 200 and response.mimetype == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="Exportville.ndjson"'
+    rows = [json.loads(line) for line in response.get_data().splitlines()]
+    # Newest first, like /weather/historical
+    assert [WeatherData.from_dict(row) for row in rows] == readings[::-1]
+
+    # Default format is NDJSON; start/end are inclusive
+    response = client.get("/weather/export/Exportville?start=2024-05-02&end=2024-05-04")
+    rows = [json.loads(line) for line in response.get_data().splitlines()]
+    assert [row['timestamp'][:10] for row in rows] == ["2024-05-04", "2024-05-03", "2024-05-02"]
+
+    response = client.get("/weather/export/Exportville?format=csv&start=2024-05-04")
+    lines = response.get_data(as_text=True).splitlines()
+    print(f"CSV export: {lines}")
+    assert response.mimetype == "text/csv"
+    assert lines[0] == "timestamp,location,temperature,humidity,condition,wind_speed"
+    assert lines[1:] == [
+        "2024-05-05T00:00:00,Exportville,15.0,50.0,Sunny,5.0",
+        "2024-05-04T00:00:00,Exportville,14.0,50.0,Sunny,5.0",
+    ]
+
+    # No rows: CSV still has its header, NDJSON is empty
+    response = client.get("/weather/export/Nowhere?format=csv")
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).splitlines() == [lines[0]]
+    assert client.get("/weather/export/Nowhere").get_data() == b""
+
+    # Names that can't go into a plain quoted filename
+    for name, filename, encoded in (
+        ("東京", 'filename="export.csv"', "filename*=UTF-8''%E6%9D%B1%E4%BA%AC.csv"),
+        ('Pa"ris; x=1', 'filename="Pa_ris_ x_1.csv"', "filename*=UTF-8''Pa%22ris%3B%20x%3D1.csv"),
+        ("São Paulo", 'filename="Sao Paulo.csv"', "filename*=UTF-8''S%C3%A3o%20Paulo.csv"),
+    ):
+        api.repository.save(WeatherGenerator.generate(name))
+        response = client.get(f"/weather/export/{quote(name)}?format=csv")
+        disposition = response.headers["Content-Disposition"]
+        print(f"{name}: {disposition}")
+        assert response.status_code == 200
+        assert len(response.get_data(as_text=True).splitlines()) == 2
+        assert disposition == f"attachment; {filename}; {encoded}"
+
+    assert client.get("/weather/export/Exportville?format=xml").status_code == 400
+    assert client.get("/weather/export/Exportville?start=yesterday").status_code == 400
+    print()
+
+
+def test_stream_routes():
+    """
+    Test /weather/stream Server-Sent Events through the Flask app.
+    """
+    print("=" * 50)
+    print("Testing /weather/stream")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    repo = api.repository
+
+    def next_event(chunks):
+        # Skip keep-alive comments
+        for chunk in chunks:
+            if chunk != api.SSE_KEEPALIVE:
+                return chunk
+        return None
+
+    assert client.get("/weather/stream", headers={"Last-Event-ID": "x"}).status_code == 400
+
+    keepalive, max_queued = api.STREAM_KEEPALIVE, api.STREAM_MAX_QUEUED
+    api.STREAM_KEEPALIVE = 0.1
+    subscribers = api.broker.subscriber_count
+    try:
+        # Reconnecting with Last-Event-ID replays missed readings for
+        # this location only, then continues live
+        mark = repo.get_high_water_mark()
+        repo.save(WeatherGenerator.generate("Streamtown"))
+        repo.save(WeatherGenerator.generate("Elsewhere"))
+        repo.save(WeatherGenerator.generate("Streamtown"))
+
+        response = client.get("/weather/stream/Streamtown",
+                              headers={"Last-Event-ID": str(mark)}, buffered=False)
+        assert response.status_code == 200 and response.mimetype == "text/event-stream"
+        chunks = iter(response.response)
+        assert next(chunks) == api.SSE_RETRY
+        replayed = [next_event(chunks).split(b"\n")[0] for _ in range(2)]
+        print(f"Replayed: {replayed}")
+        assert replayed == [
+            b"id: %d" % (mark + 1), b"id: %d" % (mark + 3)
+        ]
+
+        repo.save(WeatherGenerator.generate("Elsewhere"))
+        repo.save(WeatherGenerator.generate("Streamtown"))
+        live = next_event(chunks)
+        assert live.startswith(b"id: %d\nevent: reading\n" % (mark + 5))
+        assert json.loads(live.split(b"data: ")[1])["location"] == "Streamtown"
+
+        # Closing the response ends the subscription
+        response.close()
+        assert api.broker.subscriber_count == subscribers
+
+        # A client that falls behind gets a dropped event and the stream ends
+        api.STREAM_MAX_QUEUED = 2
+        response = client.get("/weather/stream", buffered=False)
+        chunks = iter(response.response)
+        assert next(chunks) == api.SSE_RETRY
+        repo.save_many(WeatherGenerator.generate_batch("Streamtown", 50))
+        events = [chunk for chunk in chunks if chunk != api.SSE_KEEPALIVE]
+        print(f"Slow client got {len(events) - 1} readings before being dropped")
+        assert events[-1] == api.SSE_DROPPED and len(events) < 50
+        response.close()
+        assert api.broker.subscriber_count == subscribers
+
+        # Also when the client is gone before the body is ever read (the
+        # test client always reads the first chunk, so call the app directly)
+        body = api.app.wsgi_app(EnvironBuilder("/weather/stream").get_environ(),
+                                lambda status, headers: None)
+        assert api.broker.subscriber_count == subscribers + 1
+        body.close()
+        assert api.broker.subscriber_count == subscribers
+    finally:
+        api.STREAM_KEEPALIVE, api.STREAM_MAX_QUEUED = keepalive, max_queued
+    print()
+
+
+def test_current_many_route():
+    """
+    Test GET /weather/current?locations= through the Flask app.
+    """
+    print("=" * 50)
+    print("Testing /weather/current?locations=")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    for name in ("Currentia", "Currentburg", "Currentham"):
+        api.repository.save(WeatherGenerator.generate(name))
+
+    response = client.get("/weather/current?locations=Currentia,Currentburg,Currentham")
+    body = response.get_json()
+    print(f"Three locations: {[w['location'] for w in body['data']]}")
+    assert response.status_code == 200
+    assert body['count'] == 3 and body['missing'] == []
+    assert [w['location'] for w in body['data']] == ["Currentia", "Currentburg", "Currentham"]
+
+    # Unknown names are listed as missing; duplicates and blanks are ignored
+    body = client.get(
+        "/weather/current?locations=Currentham, Atlantis,,Currentham"
+    ).get_json()
+    assert [w['location'] for w in body['data']] == ["Currentham"]
+    assert body['missing'] == ["Atlantis"]
+
+    body = client.get("/weather/current?locations=ALL").get_json()
+    assert body['count'] == len(api.repository.get_all_locations())
+    assert {"Currentia", "Currentburg", "Currentham"} <= {w['location'] for w in body['data']}
+
+    for query in ("", "?locations=", "?locations=%20"):
+        response = client.get(f"/weather/current{query}")
+        assert response.status_code == 400, query
+    too_many = ",".join(f"Place{i}" for i in range(api.MAX_CURRENT_LOCATIONS + 1))
+    assert client.get(f"/weather/current?locations={too_many}").status_code == 400
+    print()
+
+
+def test_metrics():
+    """
+    Test metrics rendering, cross-process aggregation and query timing.
+    """
+    print("=" * 50)
+    print("Testing MetricsRegistry")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    metrics = MetricsRegistry(directory)
+    labels = (('method', 'GET'), ('route', '/weather/current/<location>'))
+    metrics.inc('weather_http_requests_total', labels + (('status', '200'),))
+    metrics.inc('weather_http_requests_total', labels + (('status', '200'),))
+    metrics.add('weather_http_requests_in_progress', labels, 1)
+    metrics.observe('weather_http_request_duration_seconds', labels, 0.003)
+
+    # Snapshot left behind by a worker that has exited
+    with open(os.path.join(directory, "999999999.json"), "w") as f:
+        json.dump({
+            'counters': [['weather_http_requests_total', [list(p) for p in labels] + [['status', '200']], 3]],
+            'gauges': [['weather_http_requests_in_progress', [list(p) for p in labels], 5]],
+            'histograms': []
+        }, f)
+
+    text = metrics.render()
+    print(text)
+    series = 'method="GET",route="/weather/current/<location>"'
+    assert f'weather_http_requests_total{{{series},status="200"}} 5' in text
+    # Dead workers' counts are kept, their gauges are not
+    assert f'weather_http_requests_in_progress{{{series}}} 1' in text
+    assert f'weather_http_request_duration_seconds_bucket{{{series},le="0.0025"}} 0' in text
+    assert f'weather_http_request_duration_seconds_bucket{{{series},le="0.005"}} 1' in text
+    assert f'weather_http_request_duration_seconds_count{{{series}}} 1' in text
+    assert not os.path.exists(os.path.join(directory, "999999999.json"))
+    assert metrics.render() == text
+
+    # Repository calls report their duration and rows
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "metrics.db"))
+    calls = []
+    repo.query_observer = lambda method, seconds, rows: calls.append((method, rows))
+    repo.save_many(WeatherGenerator.generate_batch("Lima", 20))
+    repo.get_historical_page("Lima", limit=5)
+    repo.get_latest("Nowhere")
+    print(f"Observed: {calls}")
+    assert calls == [('save_many', 20), ('get_historical_page', 5), ('get_latest', 0)]
+    repo.close()
+    print()
+
+
+def test_metrics_route():
+    """
+    Test that requests and repository calls show up in /metrics.
+    """
+    print("=" * 50)
+    print("Testing /metrics")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    api.repository.save_many(WeatherGenerator.generate_batch("Metricton", 3))
+    route = 'method="GET",route="/weather/historical/<location>"'
+    query = 'method="get_historical_page"'
+
+    def scrape():
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.content_type == "text/plain; version=0.0.4; charset=utf-8"
+        samples = {}
+        for line in response.get_data(as_text=True).splitlines():
+            if line and not line.startswith("#"):
+                name, value = line.rsplit(" ", 1)
+                samples[name] = float(value)
+        return samples
+
+    before = scrape()
+    assert client.get("/weather/historical/Metricton?limit=2").status_code == 200
+    after = scrape()
+
+    def delta(name):
+        return after.get(name, 0) - before.get(name, 0)
+
+    requests_total = f'weather_http_requests_total{{{route},status="200"}}'
+    print(f"{requests_total} {after[requests_total]}")
+    assert delta(requests_total) == 1
+    assert delta(f'weather_http_request_duration_seconds_count{{{route}}}') == 1
+    assert delta(f'weather_http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 1
+    assert after[f'weather_http_requests_in_progress{{{route}}}'] == 0
+
+    # Buckets are cumulative
+    buckets = [
+        value for name, value in after.items()
+        if name.startswith(f'weather_http_request_duration_seconds_bucket{{{route},')
+    ]
+    assert len(buckets) > 2 and buckets == sorted(buckets)
+
+    # The repository call behind the route is timed, with its row count
+    assert delta(f'weather_db_query_duration_seconds_count{{{query}}}') == 1
+    assert delta(f'weather_db_query_rows_total{{{query}}}') == 2
+    print()
+
+
+def test_profiling():
+    """
+    Test request profiling triggers, profile storage and slow-query logs.
+    """
+    print("=" * 50)
+    print("Testing RequestProfiler")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    profiler = RequestProfiler(directory, token="s3cret", max_profiles=2)
+    assert profiler.wants("s3cret")
+    assert not profiler.wants("guess") and not profiler.wants(None)
+    assert not RequestProfiler(directory).enabled
+    assert RequestProfiler(directory, sample_rate=1.0).wants(None)
+
+    route = route_slug("GET", "/weather/seed/<location>/<int:count>")
+    print(f"Route directory: {route}")
+    assert route == "GET_weather_seed_location_count"
+
+    for _ in range(3):
+        profile = profiler.start()
+        WeatherGenerator.generate_batch("Oslo", 10)
+        path = profiler.save(profile, "GET", "/weather/seed/<location>/<int:count>")
+        assert os.path.exists(path)
+    # Only the newest max_profiles are kept
+    assert len(os.listdir(os.path.join(directory, route))) == 2
+    stats = load_profiles(directory, route)
+    assert any(func[2] == "generate_batch" for func in stats.stats)
+    assert load_profiles(directory, "missing") is None
+
+    # Calls over the threshold are logged with their query plans
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger("src.database")
+    logger.addHandler(handler)
+    try:
+        repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "slow.db"), slow_query_ms=0)
+        repo.save_many(WeatherGenerator.generate_batch("Oslo", 5))
+        repo.get_historical("Oslo", limit=3)
+        repo.close()
+    finally:
+        logger.removeHandler(handler)
+
+    messages = [record.getMessage() for record in records]
+    print(messages[-1])
+    assert messages[0].startswith("Slow query: save_many")
+    assert messages[-1].startswith("Slow query: get_historical_page")
+    assert "USING INDEX idx_location_ts" in messages[-1]
+    print()
+
+
+def test_profiling_route():
+    """
+    Test profiling requests through the app with the X-Weather-Profile header.
+    """
+    print("=" * 50)
+    print("Testing X-Weather-Profile")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    api.repository.save(WeatherGenerator.generate("Profiletown"))
+
+    directory = tempfile.mkdtemp()
+    profiler, api.profiler = api.profiler, RequestProfiler(directory, token="s3cret", max_profiles=3)
+    route_dir = os.path.join(directory, "GET_weather_current_location")
+    try:
+        # Without the right token nothing is profiled
+        for headers in ({}, {"X-Weather-Profile": "guess"}):
+            response = client.get("/weather/current/Profiletown", headers=headers)
+            assert response.status_code == 200
+            assert "X-Weather-Profile-File" not in response.headers
+        assert not os.path.exists(route_dir)
+
+        names = []
+        for _ in range(5):
+            response = client.get("/weather/current/Profiletown",
+                                  headers={"X-Weather-Profile": "s3cret"})
+            assert response.status_code == 200
+            names.append(response.headers["X-Weather-Profile-File"])
+        print(f"Profile files: {names}")
+        assert all(os.path.isfile(os.path.join(directory, name)) for name in names[-3:])
+    finally:
+        api.profiler = profiler
+
+    # Only the newest max_profiles are kept
+    kept = sorted(os.path.join("GET_weather_current_location", name) for name in os.listdir(route_dir))
+    assert kept == sorted(names[-3:])
+    stats = load_profiles(directory, "GET_weather_current_location")
+    assert any(func[2] == "get_current_weather" for func in stats.stats)
+    print()
+
+
+def test_retention():
+    """
+    Test chunked retention deletes, derived table upkeep and compaction.
+    """
+    print("=" * 50)
+    print("Testing retention")
+    print("=" * 50)
+
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "retention.db"))
+    # New files can hand freed pages back to the OS
+    assert repo.get_storage_stats()['auto_vacuum'] == 'incremental'
+
+    end = datetime(2024, 1, 10, 12)
+    step = timedelta(minutes=10)
+    repo.bulk_load([
+        WeatherGenerator.generate_columns(2000, ["Oslo"], seed=1, end=end, interval=step),
+        WeatherGenerator.generate_columns(500, ["Lima"], seed=2, end=end, interval=step),
+        WeatherGenerator.generate_columns(300, ["Quito"], seed=3, end=end - timedelta(days=30),
+                                          interval=step),
+    ])
+    latest = repo.get_latest("Oslo")
+    assert len(repo.get_historical("Oslo", limit=5000)) == 2000  # Cached
+
+    def rollups(location, granularity):
+        # Means rounded: summing in another order may change the last bits
+        return [
+            (a.bucket_start, a.count, a.conditions, a.temperature_min, a.temperature_max,
+             round(a.temperature_mean, 6))
+            for a in repo.get_aggregates(location, granularity, limit=10000)
+        ]
+
+    # By age: readings every 10 minutes, 5 days kept = 721 readings
+    cutoff = end - timedelta(days=5)
+    assert repo.delete_old_readings("Oslo", older_than=cutoff, chunk_size=100) == 1279
+    assert repo.get_latest("Oslo") == latest
+    assert len(repo.get_historical("Oslo", limit=5000)) == 721
+    stats = {s['location']: s for s in repo.get_location_stats()}
+    print(f"Oslo after age limit: {stats['Oslo']}")
+    assert stats['Oslo']['count'] == 721
+    assert stats['Oslo']['first_seen'] == cutoff.isoformat()
+
+    # Rollups match a rebuild from the remaining readings
+    hourly, daily = rollups("Oslo", "hour"), rollups("Oslo", "day")
+    assert sum(bucket[1] for bucket in daily) == 721
+    repo.backfill_rollups("Oslo")
+    assert rollups("Oslo", "hour") == hourly and rollups("Oslo", "day") == daily
+
+    # By row count
+    assert repo.delete_old_readings("Lima", keep_rows=100) == 400
+    assert len(repo.get_historical("Lima", limit=1000)) == 100
+
+    # A location whose readings all expired disappears
+    assert repo.delete_old_readings("Quito", older_than=end) == 300
+    assert "Quito" not in repo.get_all_locations()
+    assert repo.get_latest("Quito") is None
+    assert repo.get_aggregates("Quito", "day") == []
+
+    policies = parse_policies("*=50rows, Lima=20rows")
+    assert policies["Lima"].max_rows == 20 and policies["*"].max_age is None
+    assert parse_policies("London=2d,London=1000rows")["London"].max_age == timedelta(days=2)
+    for bad in ("London", "London=5y", "=5d", "London=0d"):
+        try:
+            parse_policies(bad)
+            assert False, f"accepted {bad!r}"
+        except ValueError:
+            pass
+
+    # max_pages bounds the pages released; 0 releases none
+    free = repo.get_storage_stats()['freelist_count']
+    print(f"Free pages before vacuum: {free}")
+    assert free > 1
+    assert repo.incremental_vacuum(0) == 0
+    assert repo.get_storage_stats()['freelist_count'] == free
+    assert repo.incremental_vacuum(1) == 1
+    try:
+        repo.incremental_vacuum(-1)
+        assert False, "accepted a negative max_pages"
+    except ValueError:
+        pass
+
+    manager = RetentionManager(repo, policies, chunk_size=100)
+    result = manager.run_once()
+    stats = manager.stats()
+    print(f"Retention run: {result}, storage: {stats['storage']}")
+    assert result['rows_deleted'] == {'Oslo': 671, 'Lima': 80}
+    assert stats['rows_deleted'] == 751 and stats['runs'] == 1
+    # Free pages were released, not just kept for reuse
+    assert result['pages_reclaimed'] > 0
+    assert stats['storage']['freelist_count'] == 0
+
+    # Other processes see the deletes
+    other = WeatherRepository(repo.db_path)
+    assert other.get_location_stats()[0]['count'] == 20
+    other.close()
+    repo.close()
+
+    # The API starts retention on a worker's first request, not at import
+    # (which under gunicorn --preload happens in the master only)
+    api = load_api()
+    configured = api.retention
+    api.retention = RetentionManager(api.repository, {}, interval=3600)
+    try:
+        assert not api.retention._worker.running
+        client = api.app.test_client()
+        client.get("/health")
+        assert api.retention._worker.running
+        client.get("/health")
+        names = [thread.name for thread in threading.enumerate()]
+        assert names.count("weather-retention") == 1
+    finally:
+        api.retention.close()
+        api.retention = configured
+    print()
+
+
+def test_fork_safe_threads():
+    """
+    Test lazily started background threads across fork().
+    """
+    print("=" * 50)
+    print("Testing ForkSafeThreads")
+    print("=" * 50)
+
+    stop = threading.Event()
+    starts = []
+    threads = ForkSafeThreads(stop.wait, "weather-test", count=2,
+                              on_start=lambda: starts.append(os.getpid()))
+    assert not threads.running
+    assert threads.ensure_started()
+    assert not threads.ensure_started()
+    assert threads.running and starts == [os.getpid()]
+    assert [t.name for t in threading.enumerate()].count("weather-test-0") == 1
+
+    if hasattr(os, "fork"):
+        # A forked worker inherits the object but not the threads
+        pid = os.fork()
+        if pid == 0:
+            ok = not threads.running and threads.ensure_started() and threads.running
+            stop.set()
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+
+    stop.set()
+    threads.join(1.0)
+    assert not threads.running
+    print()
+
+
+def test_conditional_get():
+    """
+    Test ETag/Last-Modified validators on the read endpoints.
+    """
+    print("=" * 50)
+    print("Testing conditional GET (ETag / Last-Modified)")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    api.repository.save_many(WeatherGenerator.generate_batch("Etagville", 3))
+
+    first = client.get("/weather/current/Etagville")
+    etag, modified = first.headers["ETag"], first.headers["Last-Modified"]
+    print(f"ETag: {etag}, Last-Modified: {modified}")
+    assert first.status_code == 200
+
+    # Still-current validators skip the view
+    assert client.get("/weather/current/Etagville",
+                      headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/weather/current/Etagville",
+                      headers={"If-Modified-Since": modified}).status_code == 304
+    assert client.get("/weather/historical/Etagville",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+    # A write to the location makes the old ETag stale
+    api.repository.save(WeatherGenerator.generate("Etagville"))
+    fresh = client.get("/weather/current/Etagville", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+
+    # Backfilling rollups changes the aggregates, so it must too
+    db_path = api.repository.db_path
+    conn = sqlite3.connect(db_path)
+    location_id = conn.execute(
+        "SELECT id FROM locations WHERE name = 'Etagville'"
+    ).fetchone()[0]
+    with conn:
+        conn.execute("DELETE FROM weather_rollup WHERE location_id = ?", (location_id,))
+    conn.close()
+    other = WeatherRepository(db_path)
+    empty = client.get("/weather/aggregate/Etagville?granularity=day")
+    assert empty.get_json()["count"] == 0
+
+    other.backfill_rollups("Etagville")
+    other.close()
+    rebuilt = client.get("/weather/aggregate/Etagville?granularity=day",
+                         headers={"If-None-Match": empty.headers["ETag"]})
+    print(f"After backfill: {rebuilt.status_code}")
+    assert rebuilt.status_code == 200
+    assert rebuilt.get_json()["count"] == 1
+    print()
+
+
+def test_aggregate_route():
+    """
+    Test GET /weather/aggregate/<location> and its parameter errors.
+    """
+    print("=" * 50)
+    print("Testing /weather/aggregate")
+    print("=" * 50)
+
+    api = load_api()
+    client = api.app.test_client()
+    api.repository.save_many([
+        WeatherData(datetime(2024, 6, 1, 9, 10), "Aggregatia", 10.0, 50.0, "Sunny", 5.0),
+        WeatherData(datetime(2024, 6, 1, 9, 50), "Aggregatia", 20.0, 70.0, "Rainy", 7.0),
+        WeatherData(datetime(2024, 6, 2, 12, 0), "Aggregatia", 30.0, 30.0, "Sunny", 9.0),
+    ])
+
+    body = client.get("/weather/aggregate/Aggregatia").get_json()
+    print(f"Hourly: {[(b['bucket_start'], b['count']) for b in body['data']]}")
+    assert body['granularity'] == 'hour' and body['count'] == 2
+
+    body = client.get(
+        "/weather/aggregate/Aggregatia?granularity=day&start=2024-06-02&end=2024-06-03"
+    ).get_json()
+    assert body['count'] == 1 and body['data'][0]['temperature_mean'] == 30.0
+
+    for query in ("granularity=week", "granularity=", "start=June", "end=2024-13-01"):
+        response = client.get(f"/weather/aggregate/Aggregatia?{query}")
+        assert response.status_code == 400, query
+        assert response.get_json()['status'] == 'error'
+    print()
+
+
 def test_integration():
     """
     Test all components working together.
@@ -120,7 +1672,7 @@ def test_integration():
     print("=" * 50)
 
     # Initialize components
-    repo = WeatherRepository("integration_test.db")
+    repo = WeatherRepository(os.path.join(tempfile.mkdtemp(), "integration_test.db"))
 
     # Simulate API flow: generate live weather
     print("Simulating: GET /weather/live/Madrid")
@@ -137,8 +1689,7 @@ def test_integration():
     # This is what happens when user calls POST /weather/seed/<location>/<count>
     print("\nSimulating: POST /weather/seed/Madrid/10")
     batch = WeatherGenerator.generate_batch("Madrid", 10)
-    for w in batch:
-        repo.save(w)
+    repo.save_many(batch)
     print(f"Response: Generated 10 readings")
 
     # Simulate API flow: get historical
@@ -164,6 +1715,35 @@ if __name__ == "__main__":
     test_models()
     test_generator()
     test_repository()
+    test_connection_pool()
+    test_save_many()
+    test_write_behind()
+    test_schema_migration()
+    test_latest_table()
+    test_rollups()
+    test_historical_pagination()
+    test_columnar_batches()
+    test_serializers()
+    test_data_versions()
+    test_query_cache()
+    test_latest_many()
+    test_ingest()
+    test_reading_broker()
+    test_seed_jobs()
+    test_seed_job_routes()
+    test_asgi_adapter()
+    test_ingest_route()
+    test_export_route()
+    test_stream_routes()
+    test_current_many_route()
+    test_metrics()
+    test_metrics_route()
+    test_profiling()
+    test_profiling_route()
+    test_retention()
+    test_fork_safe_threads()
+    test_conditional_get()
+    test_aggregate_route()
     test_integration()
 
     print("=" * 50)